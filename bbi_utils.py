@@ -0,0 +1,349 @@
+"""
+    Writer of the UCSC big binary indexed (BBI) formats read by IGV: bigWig with zoom levels (pre-computed summaries
+    which IGV selects depending on the visible region) and bigBed (BED records in compressed blocks indexed by an
+    R-tree)
+"""
+import struct
+import zlib
+
+"""
+magic numbers of the file, the chromosome B+ tree and the R-tree index
+"""
+BIGWIG_MAGIC = 0x888FFC26
+BIGBED_MAGIC = 0x8789F2EB
+CHROMOSOME_TREE_MAGIC = 0x78CA8C91
+RTREE_MAGIC = 0x2468ACE0
+BBI_VERSION = 4
+
+"""
+maximal number of items (data records or zoom records) which are compressed as one block
+"""
+ITEMS_PER_SLOT = 1024
+
+"""
+maximal number of children of an R-tree node
+"""
+RTREE_BLOCK_SIZE = 256
+
+"""
+binary layout: file header, zoom level header, total summary, R-tree header/items, bigWig section header and zoom
+record
+"""
+HEADER = struct.Struct("<IHHQQQHHQQIQ")
+ZOOM_HEADER = struct.Struct("<IIQQ")
+TOTAL_SUMMARY = struct.Struct("<Qdddd")
+RTREE_HEADER = struct.Struct("<IIQIIIIQII")
+RTREE_NODE_HEADER = struct.Struct("<BBH")
+RTREE_LEAF_ITEM = struct.Struct("<IIIIQQ")
+RTREE_CHILD_ITEM = struct.Struct("<IIIIQ")
+SECTION_HEADER = struct.Struct("<IIIIIBBH")
+ZOOM_RECORD = struct.Struct("<IIIIffff")
+BED_RECORD = struct.Struct("<III")
+
+"""
+bigWig section type with one value per fixed step
+"""
+FIXED_STEP_SECTION = 3
+
+
+class Summary:
+    """
+                summary statistics of values covering a number of bases (zoom records and total summary)
+    """
+
+    def __init__(self):
+        self.valid_count = 0
+        self.min_value = float("inf")
+        self.max_value = float("-inf")
+        self.sum_data = 0.0
+        self.sum_squares = 0.0
+
+    def add(self, value, n_bases):
+        """
+                adds a value covering n_bases bases
+        """
+        self.valid_count += n_bases
+        self.min_value = min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+        self.sum_data += value * n_bases
+        self.sum_squares += value * value * n_bases
+
+    def pack(self):
+        """
+        :return:    total summary (bytes)
+        """
+        if self.valid_count == 0:
+            return TOTAL_SUMMARY.pack(0, 0.0, 0.0, 0.0, 0.0)
+        return TOTAL_SUMMARY.pack(self.valid_count, self.min_value, self.max_value, self.sum_data, self.sum_squares)
+
+
+def add_coverage(summary, intervals):
+    """
+                adds the coverage of intervals of one chromosome to a summary (the value of a base is the number of
+                intervals covering it, uncovered bases are not counted)
+
+    :param summary:     Summary
+    :param intervals:   iterable of tuples (start, end)
+    """
+    events = []
+    for start, end in intervals:
+        events.append((start, 1))
+        events.append((end, -1))
+    events.sort()
+    depth = 0
+    position = 0
+    for event_position, change in events:
+        if depth > 0 and event_position > position:
+            summary.add(float(depth), event_position - position)
+        depth += change
+        position = event_position
+
+
+def write_header(output_file, magic, zoom_headers, chromosome_tree_offset, full_data_offset, full_index_offset,
+                 field_count, defined_field_count, autosql_offset, total_summary_offset, total_summary, max_block_size):
+    """
+                writes the file header, the zoom headers (following the header) and the total summary (the space has
+                to be reserved before the other parts are written)
+
+    :param output_file:             binary file object
+    :param magic:                   BIGWIG_MAGIC or BIGBED_MAGIC
+    :param zoom_headers:            list of packed zoom headers (bytes)
+    :param total_summary_offset:    offset of the total summary (readers expect it directly after the autoSql)
+    :param total_summary:           Summary of all data
+    :param max_block_size:          maximal uncompressed block size
+    """
+    output_file.seek(0)
+    output_file.write(HEADER.pack(magic, BBI_VERSION, len(zoom_headers), chromosome_tree_offset, full_data_offset,
+                                  full_index_offset, field_count, defined_field_count, autosql_offset,
+                                  total_summary_offset, max_block_size, 0))
+    output_file.write(b"".join(zoom_headers))
+    output_file.seek(total_summary_offset)
+    output_file.write(total_summary.pack())
+
+
+def write_chromosome_tree(output_file, chromosomes):
+    """
+                writes the chromosome B+ tree (a single leaf node mapping the names to ids and sizes)
+
+    :param output_file:     binary file object
+    :param chromosomes:     list of tuples (name (bytes), size), the id of a chromosome is its index in the list
+    """
+    if len(chromosomes) > 0xffff:
+        raise ValueError("Too many chromosomes for a single B+ tree node!")
+    key_size = max([len(name) for name, _ in chromosomes] + [1])
+    output_file.write(struct.pack("<IIIIQQ", CHROMOSOME_TREE_MAGIC, max(len(chromosomes), 1), key_size, 8,
+                                  len(chromosomes), 0))
+    output_file.write(RTREE_NODE_HEADER.pack(1, 0, len(chromosomes)))
+    # keys have to be sorted
+    for chromosome_id, (name, size) in sorted(enumerate(chromosomes), key=lambda item: item[1][0]):
+        output_file.write(name.ljust(key_size, b"\0") + struct.pack("<II", chromosome_id, size))
+
+
+def write_blocks(output_file, blocks):
+    """
+                writes zlib compressed data blocks
+
+    :param output_file:     binary file object
+    :param blocks:          iterable of tuples (chromosome id, start, end, uncompressed data)
+    :return:                tuple (list of R-tree items (chromosome id, start, end, offset, size), maximal uncompressed
+                            block size)
+    """
+    items = []
+    max_block_size = 0
+    for chromosome_id, start, end, data in blocks:
+        offset = output_file.tell()
+        output_file.write(zlib.compress(data))
+        items.append((chromosome_id, start, end, offset, output_file.tell() - offset))
+        max_block_size = max(max_block_size, len(data))
+    return items, max_block_size
+
+
+def write_rtree_index(output_file, items):
+    """
+                writes the R-tree index of the data blocks (nodes of up to RTREE_BLOCK_SIZE children, root first)
+
+    :param output_file:     binary file object
+    :param items:           R-tree items (chromosome id, start, end, offset, size) sorted by chromosome and start
+    """
+    end_file_offset = output_file.tell()
+    # bounds of the nodes of each level: (start chromosome, start, end chromosome, end, children), leaves first
+    levels = [[(item[0], item[1], item[0], item[2], item) for item in items]]
+    while len(levels) == 1 or len(levels[-1]) > RTREE_BLOCK_SIZE:
+        children = levels[-1]
+        nodes = []
+        for index in range(0, max(len(children), 1), RTREE_BLOCK_SIZE):
+            group = children[index:index + RTREE_BLOCK_SIZE]
+            start = min(((child[0], child[1]) for child in group), default=(0, 0))
+            end = max(((child[2], child[3]) for child in group), default=(0, 0))
+            nodes.append((start[0], start[1], end[0], end[1], group))
+        levels.append(nodes)
+    root = levels[-1]
+
+    start = min(((node[0], node[1]) for node in root), default=(0, 0))
+    end = max(((node[2], node[3]) for node in root), default=(0, 0))
+    output_file.write(RTREE_HEADER.pack(RTREE_MAGIC, RTREE_BLOCK_SIZE, len(items), start[0], start[1], end[0], end[1],
+                                        end_file_offset, ITEMS_PER_SLOT, 0))
+
+    # nodes are written level by level (root first), the offsets of the child nodes follow from the sizes of the nodes
+    # written before them
+    node_levels = [levels[level] for level in range(len(levels) - 1, 0, -1)]
+    if len(root) > 1:
+        node_levels.insert(0, [(None, None, None, None, root)])
+    offset = output_file.tell()
+    offsets = []
+    for level, nodes in enumerate(node_levels):
+        level_offsets = []
+        for node in nodes:
+            level_offsets.append(offset)
+            is_leaf = level == len(node_levels) - 1
+            offset += RTREE_NODE_HEADER.size + len(node[4]) * (RTREE_LEAF_ITEM.size if is_leaf else
+                                                               RTREE_CHILD_ITEM.size)
+        offsets.append(level_offsets)
+
+    for level, nodes in enumerate(node_levels):
+        is_leaf = level == len(node_levels) - 1
+        child_index = 0
+        for node in nodes:
+            output_file.write(RTREE_NODE_HEADER.pack(1 if is_leaf else 0, 0, len(node[4])))
+            for child in node[4]:
+                if is_leaf:
+                    chromosome_id, child_start, child_end, data_offset, data_size = child[4]
+                    output_file.write(RTREE_LEAF_ITEM.pack(chromosome_id, child_start, chromosome_id, child_end,
+                                                           data_offset, data_size))
+                else:
+                    output_file.write(RTREE_CHILD_ITEM.pack(child[0], child[1], child[2], child[3],
+                                                            offsets[level + 1][child_index]))
+                    child_index += 1
+
+
+def zoom_records(chromosome_id, values, bin_size, reduction):
+    """
+                summarizes fixed step values to zoom records (values weighted by their number of bases)
+
+    :param chromosome_id:   id of the chromosome
+    :param values:          values of consecutive bins of bin_size bases starting at 0
+    :param bin_size:        number of bases per value
+    :param reduction:       number of bases per zoom record (multiple of bin_size)
+    :return:                generator of packed zoom records (bytes)
+    """
+    bins_per_record = reduction // bin_size
+    for index in range(0, len(values), bins_per_record):
+        summary = Summary()
+        record_values = values[index:index + bins_per_record]
+        for value in record_values:
+            summary.add(value, bin_size)
+        yield ZOOM_RECORD.pack(chromosome_id, index * bin_size, (index + len(record_values)) * bin_size,
+                               summary.valid_count, summary.min_value, summary.max_value, summary.sum_data,
+                               summary.sum_squares)
+
+
+def write_bigwig(file_path, chromosomes, bin_size, reductions=()):
+    """
+                writes a bigWig file with one value per fixed size bin and pre-computed zoom levels
+
+    :param file_path:   file path of the bigWig file
+    :param chromosomes: list of tuples (name (bytes), size, values of the consecutive bins starting at 0), the size
+                        has to be at least the number of values times bin_size
+    :param bin_size:    number of bases per value
+    :param reductions:  number of bases per zoom record of each zoom level (multiples of bin_size, ascending)
+    """
+    with open(file_path, 'wb') as output_file:
+        # header, zoom headers and total summary are written at the end
+        output_file.write(b"\0" * (HEADER.size + ZOOM_HEADER.size * len(reductions) + TOTAL_SUMMARY.size))
+        chromosome_tree_offset = output_file.tell()
+        write_chromosome_tree(output_file, [(name, size) for name, size, _ in chromosomes])
+
+        # data: fixed step sections of up to ITEMS_PER_SLOT values
+        total_summary = Summary()
+        blocks = []
+        for chromosome_id, (name, size, values) in enumerate(chromosomes):
+            if size < len(values) * bin_size:
+                raise ValueError("Bins exceed the size of chromosome '" + name.decode() + "'!")
+            for index in range(0, len(values), ITEMS_PER_SLOT):
+                section_values = values[index:index + ITEMS_PER_SLOT]
+                start = index * bin_size
+                end = start + len(section_values) * bin_size
+                for value in section_values:
+                    total_summary.add(value, bin_size)
+                blocks.append((chromosome_id, start, end,
+                               SECTION_HEADER.pack(chromosome_id, start, end, bin_size, bin_size, FIXED_STEP_SECTION, 0,
+                                                   len(section_values))
+                               + struct.pack("<" + str(len(section_values)) + "f", *section_values)))
+        full_data_offset = output_file.tell()
+        output_file.write(struct.pack("<Q", len(blocks)))
+        items, max_block_size = write_blocks(output_file, blocks)
+        full_index_offset = output_file.tell()
+        write_rtree_index(output_file, items)
+
+        # zoom levels: blocks of up to ITEMS_PER_SLOT records
+        zoom_headers = []
+        for reduction in reductions:
+            blocks = []
+            n_records = 0
+            for chromosome_id, (name, size, values) in enumerate(chromosomes):
+                records = list(zoom_records(chromosome_id, values, bin_size, reduction))
+                n_records += len(records)
+                for index in range(0, len(records), ITEMS_PER_SLOT):
+                    block_records = records[index:index + ITEMS_PER_SLOT]
+                    start = ZOOM_RECORD.unpack(block_records[0])[1]
+                    end = ZOOM_RECORD.unpack(block_records[-1])[2]
+                    blocks.append((chromosome_id, start, end, b"".join(block_records)))
+            zoom_data_offset = output_file.tell()
+            output_file.write(struct.pack("<I", n_records))
+            zoom_items, zoom_block_size = write_blocks(output_file, blocks)
+            max_block_size = max(max_block_size, zoom_block_size)
+            zoom_index_offset = output_file.tell()
+            write_rtree_index(output_file, zoom_items)
+            zoom_headers.append(ZOOM_HEADER.pack(reduction, 0, zoom_data_offset, zoom_index_offset))
+
+        write_header(output_file, BIGWIG_MAGIC, zoom_headers, chromosome_tree_offset, full_data_offset,
+                     full_index_offset, 0, 0, 0, HEADER.size + ZOOM_HEADER.size * len(reductions), total_summary,
+                     max_block_size)
+
+
+def write_bigbed(file_path, chromosomes, records, autosql, field_count, defined_field_count):
+    """
+                writes a bigBed file (without zoom levels)
+
+    :param file_path:           file path of the bigBed file
+    :param chromosomes:         list of tuples (name (bytes), size)
+    :param records:             list of tuples (chromosome id, start (0-based), end, remaining BED fields (bytes, tab
+                                separated)) sorted by chromosome id and start
+    :param autosql:             autoSql definition of the fields (bytes)
+    :param field_count:         number of fields
+    :param defined_field_count: number of standard BED fields (the other ones are described only by the autoSql)
+    :return:                    number of records
+    """
+    with open(file_path, 'wb') as output_file:
+        # header and total summary (following the autoSql) are written at the end
+        output_file.write(b"\0" * HEADER.size)
+        autosql_offset = output_file.tell()
+        output_file.write(autosql + b"\0")
+        total_summary_offset = output_file.tell()
+        output_file.write(b"\0" * TOTAL_SUMMARY.size)
+        chromosome_tree_offset = output_file.tell()
+        write_chromosome_tree(output_file, chromosomes)
+
+        # data: blocks of up to ITEMS_PER_SLOT records of one chromosome ([chromosome id, start, end, records])
+        blocks = []
+        intervals = [[] for _ in chromosomes]
+        for chromosome_id, start, end, rest in records:
+            if not blocks or blocks[-1][0] != chromosome_id or len(blocks[-1][3]) == ITEMS_PER_SLOT:
+                blocks.append([chromosome_id, start, end, []])
+            blocks[-1][2] = max(blocks[-1][2], end)
+            blocks[-1][3].append(BED_RECORD.pack(chromosome_id, start, end) + rest + b"\0")
+            intervals[chromosome_id].append((start, end))
+        full_data_offset = output_file.tell()
+        output_file.write(struct.pack("<Q", len(records)))
+        items, max_block_size = write_blocks(output_file, ((chromosome_id, start, end, b"".join(block_records))
+                                                           for chromosome_id, start, end, block_records in blocks))
+        full_index_offset = output_file.tell()
+        write_rtree_index(output_file, items)
+
+        total_summary = Summary()
+        for chromosome_intervals in intervals:
+            add_coverage(total_summary, chromosome_intervals)
+        write_header(output_file, BIGBED_MAGIC, [], chromosome_tree_offset, full_data_offset, full_index_offset,
+                     field_count, defined_field_count, autosql_offset, total_summary_offset, total_summary,
+                     max_block_size)
+    return len(records)
@@ -0,0 +1,120 @@
+"""
+    Benchmark of the HGNC gene renaming of the gff3 lines: bytes-level fast path (update_gene_name()) compared to the
+    previous implementation splitting and re-joining every line as str
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import generate_igv_genome  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark of the HGNC gene renaming of gff3 lines')
+    parser.add_argument('--lines', type=int, default=500000, help='number of synthetic gff3 lines')
+    parser.add_argument('--hgnc-fraction', type=float, default=0.1,
+                        help='fraction of lines with HGNC reference (Ensembl GRCh38: about 10%%)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs (the best run is reported)')
+    return parser.parse_args()
+
+
+def legacy_update_gene_name(line, hgnc_mapping, stats):
+    """
+                previous (str based) implementation of update_gene_name()
+    """
+    annotation_column = line.split('\t')[8]
+    if "[Source:HGNC Symbol%3BAcc:" in annotation_column:
+        kv_list = annotation_column.split(';')
+        idx_name = -1
+        idx_description = -1
+        for idx in range(len(kv_list)):
+            if kv_list[idx].startswith("Name="):
+                idx_name = idx
+            elif kv_list[idx].startswith("description="):
+                idx_description = idx
+        if idx_description > -1:
+            hgnc_id = int(kv_list[idx_description].split('[')[1].split(']')[0].split(':')[-1])
+            if hgnc_id not in hgnc_mapping.keys():
+                stats["unmodified"] += 1
+                return line
+            if idx_name > -1:
+                kv_list[idx_name] = "Name=" + hgnc_mapping[hgnc_id]
+            else:
+                kv_list.append("Name=" + hgnc_mapping[hgnc_id])
+            split_line = line.split('\t')
+            split_line[8] = ";".join(kv_list)
+            stats["modified"] += 1
+            return "\t".join(split_line)
+        return None
+    stats["unmodified"] += 1
+    return line
+
+
+def generate_lines(n_lines, hgnc_fraction, hgnc_mapping):
+    """
+                generates gff3 lines similar to the Ensembl gff3 file
+
+    :param n_lines:         number of lines
+    :param hgnc_fraction:   fraction of gene lines with HGNC reference
+    :param hgnc_mapping:    dict mapping HGNC ids to gene symbols
+    :return:                list of gff3 lines (bytes)
+    """
+    rng = random.Random(42)
+    hgnc_ids = list(hgnc_mapping)
+    lines = []
+    for idx in range(n_lines):
+        start = rng.randint(1, 248000000)
+        if rng.random() < hgnc_fraction:
+            hgnc_id = rng.choice(hgnc_ids)
+            attributes = ("ID=gene:ENSG%011d;Name=OLD%d;biotype=protein_coding;description=synthetic gene "
+                          "[Source:HGNC Symbol%%3BAcc:HGNC:%d];gene_id=ENSG%011d;logic_name=ensembl_havana_gene;"
+                          "version=1" % (idx, idx, hgnc_id, idx))
+            feature = "gene"
+        else:
+            attributes = ("ID=transcript:ENST%011d;Parent=gene:ENSG%011d;Name=TX%d;biotype=protein_coding;"
+                          "transcript_id=ENST%011d;version=1" % (idx, idx, idx, idx))
+            feature = "mRNA"
+        line = "\t".join(["1", "ensembl_havana", feature, str(start), str(start + rng.randint(100, 100000)), ".",
+                          rng.choice("+-"), ".", attributes]) + "\n"
+        lines.append(line.encode("utf-8"))
+    return lines
+
+
+def run(function, lines, mapping, repeat):
+    best = None
+    for _ in range(repeat):
+        stats = {"unmodified": 0, "modified": 0}
+        start = time.perf_counter()
+        for line in lines:
+            function(line, mapping, stats)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    args = parse_args()
+    hgnc_mapping = {hgnc_id: "GENE" + str(hgnc_id) for hgnc_id in range(1, 50000)}
+    lines = generate_lines(args.lines, args.hgnc_fraction, hgnc_mapping)
+    n_bytes = sum(len(line) for line in lines)
+
+    # the previous implementation decoded every line
+    def legacy(line, mapping, stats):
+        return legacy_update_gene_name(line.decode("utf-8"), mapping, stats).encode("utf-8")
+
+    # both implementations produce the same lines (see tests/test_update_gene_name.py)
+    hgnc_symbols = generate_igv_genome.encode_hgnc_mapping(hgnc_mapping)
+
+    print("lines: " + str(len(lines)) + ", size: " + str(round(n_bytes / 1e6, 1)) + " MB")
+    for name, function, mapping in [("str (legacy)", legacy, hgnc_mapping),
+                                    ("bytes", generate_igv_genome.update_gene_name, hgnc_symbols)]:
+        seconds = run(function, lines, mapping, args.repeat)
+        print("{:<14}{:>10.3f} s{:>14,.0f} lines/s{:>10.1f} MB/s".format(name, seconds, len(lines) / seconds,
+                                                                           n_bytes / seconds / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,421 @@
+"""
+    Benchmark suite on synthetic Ensembl-like annotations: generates GFF3, genePred and HGNC TSV inputs at several
+    sizes (relative to a GRCh38 release), runs the main processing functions offline and records time and memory
+    curves. Results can be stored as baseline and compared against it to flag regressions.
+
+    python3 benchmarks/bench_suite.py --output baseline.json
+    python3 benchmarks/bench_suite.py --compare baseline.json
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import generate_igv_genome  # noqa: E402
+import profiling  # noqa: E402
+
+"""
+size of a GRCh38 Ensembl release (release 110: ~62,700 genes, ~44,000 approved HGNC symbols)
+"""
+GRCH38_GENES = 62700
+GRCH38_HGNC_IDS = 44000
+
+"""
+version of the data generator (generated inputs of an older version are regenerated)
+"""
+GENERATOR_VERSION = 1
+
+"""
+Ensembl chromosome names and lengths (GRCh38) and some unplaced scaffolds
+"""
+CHROMOSOMES = [("1", 248956422), ("2", 242193529), ("3", 198295559), ("4", 190214555), ("5", 181538259),
+               ("6", 170805979), ("7", 159345973), ("8", 145138636), ("9", 138394717), ("10", 133797422),
+               ("11", 135086622), ("12", 133275309), ("13", 114364328), ("14", 107043718), ("15", 101991189),
+               ("16", 90338345), ("17", 83257441), ("18", 80373285), ("19", 58617616), ("20", 64444167),
+               ("21", 46709983), ("22", 50818468), ("X", 156040895), ("Y", 57227415), ("MT", 16569),
+               ("GL000009.2", 201709), ("KI270711.1", 42210)]
+
+"""
+benchmarked functions
+"""
+BENCHMARKS = ["update_gene_file", "sort_gff3", "read_gff_file", "generate_ensg_hgnc_mapping", "modify_gene_pred_data",
+              "run_gff_converter"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark suite on synthetic Ensembl-like annotations")
+    parser.add_argument("--scales", default="1,10,100,400",
+                        help="comma separated input sizes in percent of a GRCh38 release (default: 1,10,100,400)")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS),
+                        help="comma separated benchmarks (default: " + ",".join(BENCHMARKS) + ")")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the fastest is reported (default: 3)")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+                        help="folder for the generated inputs, reused by later runs (default: benchmarks/data)")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file (e.g. as new baseline)")
+    parser.add_argument("--compare", default=None, help="compare the results with this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative increase of time or peak memory flagged as regression (default: 0.1)")
+    return parser.parse_args()
+
+
+def generate_inputs(data_dir, scale):
+    """
+                generates Ensembl-like GFF3 (gene/transcript/exon/CDS/UTR hierarchies with HGNC description tags),
+                matching genePred and HGNC TSV files
+
+    :param data_dir:    output folder
+    :param scale:       size in percent of a GRCh38 release
+    :return:            dict with the file paths
+    """
+    folder = os.path.join(data_dir, "scale_" + str(scale))
+    paths = {"gff3": os.path.join(folder, "annotation.gff3"), "gene_pred": os.path.join(folder, "annotation.genePred"),
+             "hgnc": os.path.join(folder, "hgnc_complete_set.tsv")}
+    version_file = os.path.join(folder, "VERSION")
+    if os.path.exists(version_file):
+        with open(version_file, 'r') as version:
+            if version.read().strip() == str(GENERATOR_VERSION):
+                return paths
+    os.makedirs(folder, exist_ok=True)
+    print("generating inputs (" + str(scale) + "% of GRCh38)...")
+
+    rng = random.Random(scale)
+    n_genes = max(1, GRCH38_GENES * scale // 100)
+    n_hgnc_ids = max(1, GRCH38_HGNC_IDS * scale // 100)
+
+    # HGNC table (symbols are unique, some genes have alias/previous symbols)
+    with open(paths["hgnc"], 'w') as hgnc_file:
+        hgnc_file.write("hgnc_id\tsymbol\tname\tlocus_group\tlocus_type\tstatus\tlocation\tlocation_sortable\t"
+                        "alias_symbol\talias_name\tprev_symbol\tprev_name\n")
+        for hgnc_id in range(1, n_hgnc_ids + 1):
+            aliases = "" if rng.random() < 0.5 else "\"" + "|".join("AL" + str(hgnc_id) + "X" + str(idx)
+                                                                    for idx in range(rng.randint(1, 3))) + "\""
+            previous = "" if rng.random() < 0.7 else "PREV" + str(hgnc_id)
+            hgnc_file.write("HGNC:" + str(hgnc_id) + "\tSYM" + str(hgnc_id) + "\tsynthetic gene " + str(hgnc_id)
+                            + "\tprotein-coding gene\tgene with protein product\tApproved\t1p36.33\t01p36.33\t"
+                            + aliases + "\t\t" + previous + "\t\n")
+
+    # genes distributed over the chromosomes proportional to their length
+    weights = [length for _, length in CHROMOSOMES]
+    genes = []
+    for gene_idx in range(n_genes):
+        chromosome, length = rng.choices(CHROMOSOMES, weights)[0]
+        start = rng.randint(1, max(1, length - 200000))
+        genes.append((chromosome, start, gene_idx))
+
+    with open(paths["gff3"], 'w') as gff3_file, open(paths["gene_pred"], 'w') as gene_pred_file:
+        gff3_file.write("##gff-version 3\n")
+        for chromosome, length in CHROMOSOMES:
+            gff3_file.write("##sequence-region   " + chromosome + " 1 " + str(length) + "\n")
+        transcript_idx = 0
+        exon_idx = 0
+        for chromosome, gene_start, gene_idx in genes:
+            ensg = "ENSG%011d" % gene_idx
+            strand = rng.choice("+-")
+            coding = rng.random() < 0.35
+            n_transcripts = rng.randint(1, 12) if coding else rng.randint(1, 2)
+
+            # transcripts with exons
+            transcripts = []
+            gene_end = gene_start
+            for _ in range(n_transcripts):
+                n_exons = rng.randint(1, 20) if coding else rng.randint(1, 4)
+                exons = []
+                position = gene_start + rng.randint(0, 2000)
+                for _ in range(n_exons):
+                    exon_length = rng.randint(50, 400)
+                    exons.append((position, position + exon_length))
+                    position += exon_length + rng.randint(100, 8000)
+                gene_end = max(gene_end, exons[-1][1])
+                transcripts.append(("ENST%011d" % transcript_idx, exons))
+                transcript_idx += 1
+
+            # gene line (70% with HGNC reference in the description)
+            hgnc_id = rng.randint(1, n_hgnc_ids) if rng.random() < 0.7 else None
+            description = "synthetic gene " + str(gene_idx)
+            if hgnc_id is not None:
+                description += " [Source:HGNC Symbol%3BAcc:HGNC:" + str(hgnc_id) + "]"
+            name = "SYM" + str(hgnc_id) if hgnc_id is not None else "NOVEL" + str(gene_idx)
+            biotype = "protein_coding" if coding else "lncRNA"
+            gff3_file.write("\t".join([chromosome, "ensembl_havana", "gene" if coding else "ncRNA_gene",
+                                       str(gene_start), str(gene_end), ".", strand, ".",
+                                       "ID=gene:" + ensg + ";Name=" + name + ";biotype=" + biotype + ";description="
+                                       + description + ";gene_id=" + ensg + ";logic_name=ensembl_havana_gene;"
+                                       "version=1"]) + "\n")
+
+            for enst, exons in transcripts:
+                transcript_start, transcript_end = exons[0][0], exons[-1][1]
+                gff3_file.write("\t".join([chromosome, "havana", "mRNA" if coding else "lnc_RNA",
+                                           str(transcript_start), str(transcript_end), ".", strand, ".",
+                                           "ID=transcript:" + enst + ";Parent=gene:" + ensg + ";Name=" + name + "-"
+                                           + enst[-3:] + ";biotype=" + biotype + ";tag=basic;transcript_id=" + enst
+                                           + ";version=1"]) + "\n")
+                for rank, (exon_start, exon_end) in enumerate(exons, 1):
+                    ense = "ENSE%011d" % exon_idx
+                    exon_idx += 1
+                    gff3_file.write("\t".join([chromosome, "havana", "exon", str(exon_start), str(exon_end), ".",
+                                               strand, ".", "Parent=transcript:" + enst + ";Name=" + ense
+                                               + ";constraint=1;ensembl_end_phase=-1;ensembl_phase=-1;exon_id=" + ense
+                                               + ";rank=" + str(rank) + ";version=1"]) + "\n")
+                cds_start, cds_end = transcript_end, transcript_end
+                if coding:
+                    ensp = "ENSP" + enst[4:]
+                    coding_exons = exons[1:-1] if len(exons) > 2 else exons
+                    cds_start, cds_end = coding_exons[0][0], coding_exons[-1][1]
+                    if len(exons) > 2:
+                        gff3_file.write("\t".join([chromosome, "havana", "five_prime_UTR", str(exons[0][0]),
+                                                   str(exons[0][1]), ".", strand, ".",
+                                                   "Parent=transcript:" + enst]) + "\n")
+                    for phase, (exon_start, exon_end) in enumerate(coding_exons):
+                        gff3_file.write("\t".join([chromosome, "havana", "CDS", str(exon_start), str(exon_end), ".",
+                                                   strand, str(phase % 3), "ID=CDS:" + ensp + ";Parent=transcript:"
+                                                   + enst + ";protein_id=" + ensp]) + "\n")
+                    if len(exons) > 2:
+                        gff3_file.write("\t".join([chromosome, "havana", "three_prime_UTR", str(exons[-1][0]),
+                                                   str(exons[-1][1]), ".", strand, ".",
+                                                   "Parent=transcript:" + enst]) + "\n")
+
+                # genePred line as written by gff3ToGenePred (0-based starts)
+                gene_pred_file.write("\t".join(["transcript:" + enst, chromosome, strand, str(transcript_start - 1),
+                                                str(transcript_end), str(cds_start - 1), str(cds_end),
+                                                str(len(exons)),
+                                                ",".join(str(exon_start - 1) for exon_start, _ in exons) + ",",
+                                                ",".join(str(exon_end) for _, exon_end in exons) + ",", "0",
+                                                "gene:" + ensg, "cmpl" if coding else "none",
+                                                "cmpl" if coding else "none",
+                                                ",".join("0" if coding else "-1" for _ in exons) + ","]) + "\n")
+            gff3_file.write("###\n")
+
+    with open(version_file, 'w') as version:
+        version.write(str(GENERATOR_VERSION) + "\n")
+    return paths
+
+
+def import_converter():
+    """
+                imports the genePred converter (has additional dependencies)
+
+    :return:    module
+    """
+    import gff_to_genepred_converter
+    return gff_to_genepred_converter
+
+
+def setup_benchmark(name, paths, work_dir):
+    """
+                prepares the input of a benchmark run (not timed)
+
+    :param name:        benchmark name
+    :param paths:       dict with the input file paths (see generate_inputs())
+    :param work_dir:    temporary folder of the run
+    :return:            tuple (function, arguments, number of processed lines)
+    """
+    if name == "update_gene_file":
+        with open(paths["gff3"], 'rb') as gff3_file, gzip.open(os.path.join(work_dir, "annotation.gff3.gz"), 'wb',
+                                                                compresslevel=1) as compressed_file:
+            shutil.copyfileobj(gff3_file, compressed_file)
+        genome_json = {"chromosomeOrder": [chromosome for chromosome, _ in CHROMOSOMES],
+                       "tracks": [{"format": "gff3", "url": "annotation.gff3.gz"}]}
+        ranks = generate_igv_genome.build_chromosome_ranks(genome_json, work_dir)
+        hgnc_mapping = generate_igv_genome.load_hgnc_file(paths["hgnc"])
+        return (generate_igv_genome.update_gene_file, (genome_json, hgnc_mapping, work_dir, ranks),
+                count_lines(paths["gff3"]))
+
+    if name == "sort_gff3":
+        generate_igv_genome.set_chromosome_ranks(generate_igv_genome.build_chromosome_ranks(
+            {"chromosomeOrder": [chromosome for chromosome, _ in CHROMOSOMES]}, work_dir))
+        with open(paths["gff3"], 'rb') as gff3_file:
+            content = [line for line in gff3_file if not line.startswith(b"#")]
+        return generate_igv_genome.sort_gff3, (content,), len(content)
+
+    converter = import_converter()
+    _, hgnc_to_gene, alt_gene_names = converter.read_hgnc_file(paths["hgnc"])
+    if name == "read_gff_file":
+        return converter.read_gff_file, (paths["gff3"], hgnc_to_gene.keys(), alt_gene_names), \
+            count_lines(paths["gff3"])
+
+    if name == "generate_ensg_hgnc_mapping":
+        with open(paths["gff3"], 'r') as gff3_file:
+            gene_attributes = [converter.parse_attributes(split_line[8].strip())
+                               for split_line in (line.split('\t') for line in gff3_file if not line.startswith('#'))
+                               if converter.is_gene_feature(split_line[2])]
+        return converter.generate_ensg_hgnc_mapping, (gene_attributes, hgnc_to_gene.keys(), alt_gene_names), \
+            len(gene_attributes)
+
+    if name == "modify_gene_pred_data":
+        _, _, (ensg_to_hgnc, _, ensg_to_non_hgnc_gene, _) = \
+            converter.read_gff_file(paths["gff3"], hgnc_to_gene.keys(), alt_gene_names)
+        with open(paths["gene_pred"], 'r') as gene_pred_file:
+            gene_pred_data = [line.split('\t') for line in gene_pred_file]
+
+        def modify_gene_pred_data(*arguments):
+            # the entries are modified lazily
+            for _ in converter.modify_gene_pred_data(*arguments):
+                pass
+        return modify_gene_pred_data, (gene_pred_data, ensg_to_hgnc, hgnc_to_gene, ensg_to_non_hgnc_gene), \
+            len(gene_pred_data)
+
+    if name == "run_gff_converter":
+        header, content, _ = converter.read_gff_file(paths["gff3"], hgnc_to_gene.keys(), alt_gene_names)
+        sorted_content = converter.sort_gff(content)
+        # the tool is never downloaded by the benchmarks
+        converter_path = converter.resolve_gff_converter(converter.default_converter_cache_dir, download=False)
+        if converter_path is None:
+            raise FileNotFoundError("gff3ToGenePred not found in $PATH or " + converter.default_converter_cache_dir)
+
+        def run_gff_converter(converter_path, header, content):
+            for _ in converter.read_gene_pred_file(converter.run_gff_converter(converter_path, header, content)):
+                pass
+        return run_gff_converter, (converter_path, header, sorted_content), len(sorted_content)
+
+    raise ValueError("unknown benchmark '" + name + "'")
+
+
+def count_lines(file_path):
+    with open(file_path, 'rb') as input_file:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: input_file.read(1024 * 1024), b""))
+
+
+def read_current_rss():
+    with open("/proc/self/status", 'r') as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def run_benchmark(name, paths):
+    """
+                runs one benchmark (executed in a fresh process to get independent memory measurements)
+
+    :param name:    benchmark name
+    :param paths:   dict with the input file paths
+    :return:        dict with the measurements
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            function, arguments, n_lines = setup_benchmark(name, paths, work_dir)
+            rss_before = read_current_rss()
+            profiling.reset_peak_rss()
+            start_cpu = time.process_time()
+            start = time.perf_counter()
+            function(*arguments)
+            seconds = time.perf_counter() - start
+            cpu_seconds = time.process_time() - start_cpu
+            peak_rss = profiling.read_peak_rss()
+    finally:
+        shutil.rmtree(work_dir)
+    return {"seconds": seconds, "cpu_seconds": cpu_seconds, "peak_rss_bytes": peak_rss,
+            "peak_rss_increase_bytes": max(0, peak_rss - rss_before), "lines": n_lines}
+
+
+def run_suite(benchmarks, scales, data_dir, repeat):
+    """
+                runs all benchmarks on all input sizes
+
+    :return:    list of result dicts
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for scale in scales:
+        paths = generate_inputs(data_dir, scale)
+        input_bytes = os.path.getsize(paths["gff3"])
+        for name in benchmarks:
+            runs = []
+            try:
+                for _ in range(repeat):
+                    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        runs.append(executor.submit(run_benchmark, name, paths).result())
+            except (ImportError, FileNotFoundError) as e:
+                print("{:<28}{:>6}%  skipped ({})".format(name, scale, e))
+                continue
+            result = min(runs, key=lambda run: run["seconds"])
+            result["peak_rss_bytes"] = min(run["peak_rss_bytes"] for run in runs)
+            result.update({"benchmark": name, "scale": scale, "gff3_bytes": input_bytes,
+                           "lines_per_second": result["lines"] / result["seconds"] if result["seconds"] > 0 else None})
+            results.append(result)
+            print("{:<28}{:>6}%{:>12,} lines{:>10.3f} s{:>14,.0f} lines/s{:>10.1f} MB peak RSS".format(
+                name, scale, result["lines"], result["seconds"], result["lines_per_second"] or 0,
+                result["peak_rss_bytes"] / 1e6))
+    return results
+
+
+def print_scaling(results):
+    """
+                prints the scaling curves: time and memory per line for each input size (constant values mean linear
+                scaling)
+    """
+    print("\nscaling (seconds per 1M lines, peak RSS increase in bytes per line):")
+    for name in BENCHMARKS:
+        curve = sorted((result for result in results if result["benchmark"] == name), key=lambda r: r["scale"])
+        if len(curve) == 0:
+            continue
+        points = ["{}%: {:.2f} s, {:.0f} B".format(result["scale"], result["seconds"] * 1e6 / max(1, result["lines"]),
+                                                   result["peak_rss_increase_bytes"] / max(1, result["lines"]))
+                  for result in curve]
+        print("\t{:<28}".format(name) + " | ".join(points))
+
+
+def compare_results(results, baseline_path, threshold):
+    """
+                compares the results with a baseline and prints all regressions
+
+    :param results:         list of result dicts
+    :param baseline_path:   file path of the baseline JSON
+    :param threshold:       relative increase flagged as regression
+    :return:                number of regressions
+    """
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = {(result["benchmark"], result["scale"]): result for result in json.load(baseline_file)["results"]}
+
+    print("\ncomparison with baseline '" + baseline_path + "':")
+    regressions = 0
+    for result in results:
+        reference = baseline.get((result["benchmark"], result["scale"]))
+        if reference is None:
+            continue
+        for key in ["seconds", "peak_rss_bytes"]:
+            if reference[key] <= 0:
+                continue
+            change = result[key] / reference[key] - 1
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print("\t{:<28}{:>6}%  {:<16}{:>+8.1%}{}".format(result["benchmark"], result["scale"], key, change, flag))
+    print("\t" + str(regressions) + " regressions (threshold " + "{:.0%}".format(threshold) + ")")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    scales = [int(scale) for scale in args.scales.split(",")]
+    benchmarks = args.benchmarks.split(",")
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            sys.exit("unknown benchmark '" + name + "'")
+
+    results = run_suite(benchmarks, scales, args.data_dir, args.repeat)
+    print_scaling(results)
+
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                       "machine": platform.machine(), "cpus": os.cpu_count(), "repeat": args.repeat,
+                       "results": results}, output_file, indent=2)
+    if args.compare is not None and compare_results(results, args.compare, args.threshold) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+    BGZF writer (multithreaded block compression) and tabix index builder compatible with htslib (bgzip/tabix)
+"""
+import collections
+import concurrent.futures
+import os
+import struct
+import time
+import zlib
+
+"""
+maximal size of the uncompressed data of a BGZF block (same as htslib)
+"""
+BLOCK_SIZE = 0xff00
+
+"""
+maximal size of the compressed data of a BGZF block (block size limit 64 KB minus header and footer)
+"""
+MAX_COMPRESSED_SIZE = 65536 - 26
+
+"""
+empty BGZF block marking the end of the file
+"""
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+"""
+tabix binning scheme
+"""
+TABIX_MIN_SHIFT = 14
+TABIX_PSEUDO_BIN = 37450
+
+"""
+tabix presets: (format, sequence column, begin column, end column, meta character, lines to skip)
+"""
+TABIX_PRESETS = {
+    "gff": (0, 1, 4, 5, '#', 0),
+    "bed": (0x10000, 1, 2, 3, '#', 0)
+}
+
+
+def compress_block(data, level):
+    """
+                compresses data into a single BGZF block
+
+    :param data:    uncompressed data (at most BLOCK_SIZE bytes)
+    :param level:   zlib compression level
+    :return:        BGZF block (bytes)
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed_data = compressor.compress(data) + compressor.flush()
+    if len(compressed_data) > MAX_COMPRESSED_SIZE:
+        # incompressible data -> store uncompressed
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        compressed_data = compressor.compress(data) + compressor.flush()
+    header = struct.pack("<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed_data) + 25)
+    return header + compressed_data + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+class BgzfWriter:
+    """
+                writes a BGZF compressed file, the blocks are compressed in parallel on a thread pool
+
+                Since the blocks are compressed asynchronously, tell() returns a 'pending' virtual offset (block number
+                instead of the compressed file offset) which is converted by virtual_offset() after the file is closed.
+    """
+
+    def __init__(self, file_path, threads=None, level=6):
+        """
+        :param file_path:   path of the output file
+        :param threads:     number of compression threads (default: number of CPUs)
+        :param level:       zlib compression level
+        """
+        self.file_path = file_path
+        self.level = level
+        self.threads = threads or os.cpu_count() or 1
+        self._file = open(file_path, 'wb')
+        self._buffer = bytearray()
+        self._n_blocks = 0
+        # number of uncompressed bytes written
+        self.uncompressed_size = 0
+        # time the writer waited for the compression threads
+        self.wait_seconds = 0.0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+        self._pending_blocks = collections.deque()
+        # compressed start offset of every block written (+ end offset of the data)
+        self._block_offsets = [0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # an incomplete file must not look like a valid BGZF file
+            self.discard()
+
+    def write(self, data):
+        """
+                writes (uncompressed) data to the file
+
+        :param data:    bytes
+        """
+        self.uncompressed_size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= BLOCK_SIZE:
+            self._submit_block(bytes(self._buffer[:BLOCK_SIZE]))
+            del self._buffer[:BLOCK_SIZE]
+
+    @property
+    def n_blocks(self):
+        """
+                number of BGZF blocks submitted for compression
+        """
+        return self._n_blocks
+
+    def tell(self):
+        """
+                returns the pending virtual offset of the current position (see virtual_offset())
+
+        :return:    block number << 16 | offset in the uncompressed block
+        """
+        return self._n_blocks << 16 | len(self._buffer)
+
+    def virtual_offset(self, pending_offset):
+        """
+                converts a pending virtual offset returned by tell() into a BGZF virtual offset (only valid after all
+                blocks up to this position are written, e.g. after close())
+
+        :param pending_offset:  pending virtual offset
+        :return:                BGZF virtual offset (compressed block offset << 16 | offset in the uncompressed block)
+        """
+        return self._block_offsets[pending_offset >> 16] << 16 | (pending_offset & 0xffff)
+
+    def close(self):
+        """
+                writes the remaining data and the EOF marker and closes the file
+        """
+        if self._file.closed:
+            return
+        if len(self._buffer) > 0:
+            self._submit_block(bytes(self._buffer))
+            self._buffer = bytearray()
+        while len(self._pending_blocks) > 0:
+            self._write_next_block()
+        self._executor.shutdown()
+        self._file.write(EOF_BLOCK)
+        self._file.close()
+
+    def discard(self):
+        """
+                stops the compression and removes the incomplete file (the pending blocks and the EOF marker are not
+                written)
+        """
+        if self._file.closed:
+            return
+        self._executor.shutdown(cancel_futures=True)
+        self._pending_blocks.clear()
+        self._file.close()
+        os.remove(self.file_path)
+
+    def _submit_block(self, data):
+        self._pending_blocks.append(self._executor.submit(compress_block, data, self.level))
+        self._n_blocks += 1
+        # limit the number of blocks in memory
+        while len(self._pending_blocks) > 2 * self.threads:
+            self._write_next_block()
+
+    def _write_next_block(self):
+        future = self._pending_blocks.popleft()
+        if not future.done():
+            start = time.perf_counter()
+            concurrent.futures.wait([future])
+            self.wait_seconds += time.perf_counter() - start
+        block = future.result()
+        self._file.write(block)
+        self._block_offsets.append(self._block_offsets[-1] + len(block))
+
+
+def reg2bin(beg, end):
+    """
+                calculates the smallest tabix/BAI bin containing the given region
+
+    :param beg:     start position (0-based)
+    :param end:     end position (exclusive)
+    :return:        bin number
+    """
+    end -= 1
+    if beg >> 14 == end >> 14:
+        return ((1 << 15) - 1) // 7 + (beg >> 14)
+    if beg >> 17 == end >> 17:
+        return ((1 << 12) - 1) // 7 + (beg >> 17)
+    if beg >> 20 == end >> 20:
+        return ((1 << 9) - 1) // 7 + (beg >> 20)
+    if beg >> 23 == end >> 23:
+        return ((1 << 6) - 1) // 7 + (beg >> 23)
+    if beg >> 26 == end >> 26:
+        return ((1 << 3) - 1) // 7 + (beg >> 26)
+    return 0
+
+
+class TabixIndexer:
+    """
+                builds a tabix (.tbi) index from the records of a sorted file while it is written by a BgzfWriter
+    """
+
+    def __init__(self, preset="gff"):
+        """
+        :param preset:  tabix preset of the indexed file (see TABIX_PRESETS)
+        """
+        self.preset = preset
+        self._names = []
+        self._name_to_id = {}
+        self._references = []
+        self._current = None
+
+    def add(self, name, beg, end, start_offset, end_offset):
+        """
+                adds a record to the index (records have to be sorted by sequence and start position)
+
+        :param name:            sequence name
+        :param beg:             start position (0-based)
+        :param end:             end position (exclusive)
+        :param start_offset:    (pending) virtual offset of the start of the record line
+        :param end_offset:      (pending) virtual offset after the end of the record line
+        """
+        if end <= beg:
+            end = beg + 1
+        if self._current is None or self._current["name"] != name:
+            if name in self._name_to_id:
+                raise ValueError("file is not sorted: sequence '" + name + "' is not contiguous")
+            self._finish_reference()
+            self._name_to_id[name] = len(self._names)
+            self._names.append(name)
+            self._current = {"name": name, "bins": {}, "linear": [], "save_bin": None, "save_offset": start_offset,
+                             "last_offset": start_offset, "first_offset": start_offset, "n_records": 0}
+        current = self._current
+
+        # linear index: first record overlapping each 16 kb window
+        linear = current["linear"]
+        last_window = (end - 1) >> TABIX_MIN_SHIFT
+        if len(linear) <= last_window:
+            linear.extend([None] * (last_window + 1 - len(linear)))
+        for window in range(beg >> TABIX_MIN_SHIFT, last_window + 1):
+            if linear[window] is None:
+                linear[window] = start_offset
+
+        # binning index: consecutive records in the same bin form one chunk
+        record_bin = reg2bin(beg, end)
+        if record_bin != current["save_bin"]:
+            if current["save_bin"] is not None:
+                current["bins"].setdefault(current["save_bin"], []).append([current["save_offset"],
+                                                                           current["last_offset"]])
+            current["save_bin"] = record_bin
+            current["save_offset"] = start_offset
+        current["last_offset"] = end_offset
+        current["n_records"] += 1
+
+    def write(self, index_path, writer):
+        """
+                writes the index file
+
+        :param index_path:  file path of the .tbi file
+        :param writer:      (closed) BgzfWriter of the indexed file, used to resolve the virtual offsets
+        """
+        self._finish_reference()
+        resolve = writer.virtual_offset
+
+        fmt, col_seq, col_beg, col_end, meta, skip = TABIX_PRESETS[self.preset]
+        names = b"".join(name.encode("utf-8") + b"\0" for name in self._names)
+        data = bytearray(b"TBI\1")
+        data += struct.pack("<8i", len(self._names), fmt, col_seq, col_beg, col_end, ord(meta), skip, len(names))
+        data += names
+
+        for reference in self._references:
+            bins = reference["bins"]
+            data += struct.pack("<i", len(bins) + 1)
+            for bin_number in sorted(bins):
+                chunks = []
+                for beg_offset, end_offset in bins[bin_number]:
+                    beg_offset, end_offset = resolve(beg_offset), resolve(end_offset)
+                    # merge chunks which are adjacent in the compressed file
+                    if len(chunks) > 0 and chunks[-1][1] >> 16 == beg_offset >> 16:
+                        chunks[-1][1] = max(chunks[-1][1], end_offset)
+                    else:
+                        chunks.append([beg_offset, end_offset])
+                data += struct.pack("<Ii", bin_number, len(chunks))
+                for beg_offset, end_offset in chunks:
+                    data += struct.pack("<QQ", beg_offset, end_offset)
+            # pseudo bin with meta data (file range and number of records)
+            data += struct.pack("<IiQQQQ", TABIX_PSEUDO_BIN, 2, resolve(reference["first_offset"]),
+                                resolve(reference["last_offset"]), reference["n_records"], 0)
+
+            # linear index (windows without records get the offset of the previous window)
+            linear = []
+            previous_offset = 0
+            for offset in reference["linear"]:
+                previous_offset = resolve(offset) if offset is not None else previous_offset
+                linear.append(previous_offset)
+            data += struct.pack("<i", len(linear))
+            data += struct.pack("<" + str(len(linear)) + "Q", *linear)
+        data += struct.pack("<Q", 0)
+
+        with BgzfWriter(index_path, threads=1) as index_writer:
+            index_writer.write(bytes(data))
+
+    def _finish_reference(self):
+        current = self._current
+        if current is None:
+            return
+        if current["save_bin"] is not None:
+            current["bins"].setdefault(current["save_bin"], []).append([current["save_offset"],
+                                                                       current["last_offset"]])
+        self._references.append(current)
+        self._current = None
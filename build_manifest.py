@@ -0,0 +1,112 @@
+"""
+    Build manifest to skip build stages whose inputs did not change since the last run
+"""
+import hashlib
+import json
+import os
+import time
+
+
+def file_hash(file_path):
+    """
+                calculates the SHA-256 hash of a file
+
+    :param file_path:   file path
+    :return:            hex digest
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def file_signature(file_path):
+    """
+                returns a cheap signature (size and modification time) of a file to detect changes of the outputs
+
+    :param file_path:   file path
+    :return:            dict with size and modification time or None if the file does not exist
+    """
+    if not os.path.exists(file_path):
+        return None
+    file_stat = os.stat(file_path)
+    return {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns}
+
+
+class BuildManifest:
+    """
+                stores the inputs (file hashes, template content, options) and the outputs of every build stage
+
+                A stage is up-to-date if its inputs and the tool version are unchanged and all its output files still
+                exist unmodified (size and modification time).
+    """
+
+    def __init__(self, manifest_path, tool_version, template_hash, force=False):
+        """
+        :param manifest_path:   file path of the manifest (JSON)
+        :param tool_version:    version of the build tool (stages are rebuilt if it changes)
+        :param template_hash:   hash of the template file content
+        :param force:           if True, all stages are treated as outdated
+        """
+        self.manifest_path = manifest_path
+        self.tool_version = tool_version
+        self.template_hash = template_hash
+        self.force = force
+        self._previous_stages = {}
+        self._stages = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as manifest_file:
+                self._previous_stages = json.load(manifest_file).get("stages", {})
+
+    def fingerprint(self, inputs):
+        """
+                calculates the fingerprint of the stage inputs (incl. the tool version)
+
+        :param inputs:  JSON serializable dict with all inputs of the stage
+        :return:        hex digest
+        """
+        return hashlib.sha256(json.dumps([self.tool_version, inputs], sort_keys=True).encode("utf-8")).hexdigest()
+
+    def is_up_to_date(self, stage, inputs, output_folder):
+        """
+                checks if a stage can be skipped (and keeps its entry for the new manifest)
+
+        :param stage:           unique name of the stage
+        :param inputs:          JSON serializable dict with all inputs of the stage
+        :param output_folder:   folder containing the output files
+        :return:                True if the stage does not need to be rebuilt
+        """
+        previous_stage = self._previous_stages.get(stage)
+        if self.force or previous_stage is None or previous_stage["fingerprint"] != self.fingerprint(inputs):
+            return False
+        for file_name, signature in previous_stage["outputs"].items():
+            if file_signature(os.path.join(output_folder, file_name)) != signature:
+                return False
+        self._stages[stage] = previous_stage
+        return True
+
+    def record(self, stage, inputs, outputs, output_folder):
+        """
+                records a (re)built stage
+
+        :param stage:           unique name of the stage
+        :param inputs:          JSON serializable dict with all inputs of the stage
+        :param outputs:         file names of all output files of the stage (relative to output_folder)
+        :param output_folder:   folder containing the output files
+        """
+        self._stages[stage] = {
+            "fingerprint": self.fingerprint(inputs),
+            "inputs": inputs,
+            "outputs": {file_name: file_signature(os.path.join(output_folder, file_name)) for file_name in outputs},
+            "built": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def save(self):
+        """
+                writes the manifest (only stages checked or recorded in this run)
+        """
+        with open(self.manifest_path + ".tmp", 'w') as manifest_file:
+            json.dump({"tool_version": self.tool_version, "template_hash": self.template_hash,
+                       "stages": self._stages}, manifest_file, indent=2)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
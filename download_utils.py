@@ -0,0 +1,780 @@
+"""
+    Helper functions to download (large) files via HTTP(S) with resume, retries and keep-alive connections
+"""
+import collections
+import hashlib
+import http.client
+import io
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import urllib.parse
+import urllib.request
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows (no reflink support)
+    pass
+
+"""
+size of the chunks which are read from the HTTP response and written to disk
+"""
+CHUNK_SIZE = 1024 * 1024
+
+"""
+maximal number of redirects which are followed for a single request
+"""
+MAX_REDIRECTS = 5
+
+"""
+HTTP status codes which are treated as temporary errors (download is retried)
+"""
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+"""
+number of chunks which are read ahead by a streamed download
+"""
+PREFETCH_CHUNKS = 16
+
+"""
+ioctl request code to clone a file (reflink) on Linux
+"""
+FICLONE = 0x40049409
+
+"""
+name of the checksum files in the directories of the Ensembl FTP server (BSD 'sum' checksums)
+"""
+CHECKSUMS_FILE_NAME = "CHECKSUMS"
+
+"""
+command computing the BSD 'sum' checksum of its stdin (GNU coreutils/BSD 'sum' with the BSD algorithm)
+"""
+BSD_SUM_COMMAND = ["sum", "-r"]
+
+"""
+result of a single download
+"""
+DownloadResult = collections.namedtuple("DownloadResult",
+                                        ["n_bytes", "seconds", "not_modified", "digests", "etag", "last_modified"])
+
+
+class DownloadError(Exception):
+    """
+                raised if a file can not be downloaded (after all retries)
+    """
+    pass
+
+
+class ChecksumError(DownloadError):
+    """
+                raised if the checksum of a downloaded file does not match the expected value
+    """
+    pass
+
+
+class BsdSum:
+    """
+                hash object (hashlib interface) computing the BSD 'sum' checksum used in the Ensembl CHECKSUMS files
+                (16-bit rotating checksum and number of 1 KB blocks): the data is piped into a 'sum' helper process, the
+                byte-wise checksum runs in C and does not hold the GIL (see bsd_sum_available())
+    """
+    name = "bsd_sum"
+
+    def __init__(self):
+        self._process = subprocess.Popen(BSD_SUM_COMMAND, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._digest = None
+
+    def update(self, data):
+        self._process.stdin.write(data)
+
+    def hexdigest(self):
+        """
+                returns the checksum (no more data can be added afterwards)
+
+        :return:    checksum and number of blocks as printed by 'sum' (e.g. '12345 678')
+        """
+        if self._digest is None:
+            output, _ = self._process.communicate()
+            checksum, n_blocks = output.split()[:2]
+            # 'sum' pads the checksum with zeros
+            self._digest = str(int(checksum)) + " " + str(int(n_blocks))
+        return self._digest
+
+    def __del__(self):
+        # hash object which was replaced (restarted download): end the helper process
+        process = getattr(self, "_process", None)
+        if process is not None and self._digest is None:
+            process.stdin.close()
+            process.wait()
+            process.stdout.close()
+
+
+def bsd_sum_available():
+    """
+                checks whether BSD sums can be computed (the 'sum' tool is installed)
+
+    :return:    True if the 'sum' tool is in $PATH
+    """
+    return shutil.which(BSD_SUM_COMMAND[0]) is not None
+
+
+def new_hasher(algorithm):
+    """
+                creates a hash object
+
+    :param algorithm:   'bsd_sum' or name of a hashlib algorithm
+    :return:            hash object
+    """
+    if algorithm == BsdSum.name:
+        return BsdSum()
+    return hashlib.new(algorithm)
+
+
+def verify_digests(url, digests, expected_digests):
+    """
+                compares the digests of a downloaded file with the expected values
+
+    :param url:                 URL of the file (used in the error message)
+    :param digests:             dict mapping algorithms to the computed digests
+    :param expected_digests:    dict mapping algorithms to the expected digests
+    """
+    for algorithm, expected_digest in expected_digests.items():
+        if digests[algorithm].lower() != expected_digest.lower():
+            raise ChecksumError("Checksum mismatch for '" + url + "': " + algorithm + " is '" + digests[algorithm]
+                                + "', expected '" + expected_digest + "'!")
+
+
+class ConnectionPool:
+    """
+                thread-safe pool of keep-alive HTTP(S) connections (one list of idle connections per host)
+    """
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme, host):
+        """
+                returns an idle connection to the given host or opens a new one
+
+        :param scheme:  URL scheme ('http' or 'https')
+        :param host:    host name (with optional port)
+        :return:        http.client.HTTPConnection
+        """
+        with self._lock:
+            idle_connections = self._idle_connections.get((scheme, host), [])
+            if len(idle_connections) > 0:
+                return idle_connections.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, timeout=self.timeout)
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def put(self, scheme, host, connection):
+        """
+                returns a connection (whose last response was completely read) to the pool for reuse
+
+        :param scheme:      URL scheme ('http' or 'https')
+        :param host:        host name (with optional port)
+        :param connection:  http.client.HTTPConnection
+        """
+        with self._lock:
+            self._idle_connections.setdefault((scheme, host), []).append(connection)
+
+    def close(self):
+        """
+                closes all idle connections
+        """
+        with self._lock:
+            for idle_connections in self._idle_connections.values():
+                for connection in idle_connections:
+                    connection.close()
+            self._idle_connections = {}
+
+
+def format_throughput(n_bytes, seconds):
+    """
+                formats a transferred amount of data and its transfer rate for progress messages
+
+    :param n_bytes:     number of transferred bytes
+    :param seconds:     transfer time in seconds
+    :return:            human readable string (e.g. '12.50 MB in 3.2 s, 3.91 MB/s')
+    """
+    mega_bytes = n_bytes / 1024 ** 2
+    return "{:.2f} MB in {:.1f} s, {:.2f} MB/s".format(mega_bytes, seconds, mega_bytes / max(seconds, 1e-6))
+
+
+def open_url(url, pool, headers=None):
+    """
+                sends a GET request using a pooled connection (following redirects)
+
+    :param url:         URL of the file
+    :param pool:        ConnectionPool used for the request
+    :param headers:     dict with additional request headers
+    :return:            tuple (response, release function which hands the connection back to the pool after the
+                        response was completely read or closes it if called with reuse=False)
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parsed_url = urllib.parse.urlsplit(url)
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path += "?" + parsed_url.query
+        connection = pool.get(parsed_url.scheme, parsed_url.netloc)
+        try:
+            connection.request("GET", path, headers=headers or {})
+            response = connection.getresponse()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            raise
+
+        def release(reuse=True, connection=connection, response=response, parsed_url=parsed_url):
+            if not reuse or response.will_close:
+                connection.close()
+            else:
+                pool.put(parsed_url.scheme, parsed_url.netloc, connection)
+
+        if response.status in (301, 302, 303, 307, 308) and response.getheader("Location") is not None:
+            response.read()
+            release()
+            url = urllib.parse.urljoin(url, response.getheader("Location"))
+            continue
+        return response, release
+
+    raise DownloadError("Too many redirects for '" + url + "'!")
+
+
+def fetch_checksums_file(directory_url, pool=None):
+    """
+                downloads and parses the Ensembl CHECKSUMS file of a directory (lines '<sum> <blocks> <file name>')
+
+    :param directory_url:   URL of the directory (with trailing '/')
+    :param pool:            ConnectionPool for keep-alive connections (a private pool is used if not given)
+    :return:                dict mapping the file names to the expected BSD sums (see BsdSum) or an empty dict if the
+                            directory has no CHECKSUMS file
+    """
+    private_pool = pool is None
+    if private_pool:
+        pool = ConnectionPool()
+    try:
+        response, release = open_url(urllib.parse.urljoin(directory_url, CHECKSUMS_FILE_NAME), pool)
+        content = response.read()
+        release()
+    finally:
+        if private_pool:
+            pool.close()
+    if response.status != 200:
+        return {}
+    checksums = {}
+    for line in content.decode("utf-8").splitlines():
+        split_line = line.split(None, 2)
+        if len(split_line) == 3 and split_line[0].isdigit() and split_line[1].isdigit():
+            # 'sum' pads the checksum with zeros
+            checksums[split_line[2].strip()] = str(int(split_line[0])) + " " + str(int(split_line[1]))
+    return checksums
+
+
+def fetch_to_part_file(url, part_path, pool, abort_event, headers=None, hashers=None):
+    """
+                downloads a file into a partial file, resuming at the end of an already existing partial file
+
+    :param url:             URL of the file
+    :param part_path:       file path of the partial file
+    :param pool:            ConnectionPool used for the request
+    :param abort_event:     threading.Event which aborts the transfer if set
+    :param headers:         dict with additional request headers (e.g. conditional headers), only used if the download
+                            is not resumed
+    :param hashers:         dict with hash objects which are updated with the written data (the caller has to feed
+                            an already existing partial file, the objects are replaced if the download restarts)
+    :return:                tuple (HTTP status code, response headers)
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset > 0:
+        request_headers = {"Range": "bytes=" + str(offset) + "-"}
+    else:
+        request_headers = dict(headers or {})
+    response, release = open_url(url, pool, request_headers)
+
+    try:
+        if response.status == 304 and offset == 0:
+            # conditional request: local copy is still up-to-date
+            response.read()
+            release()
+            return response.status, response.headers
+        if response.status == 416 and offset > 0:
+            # requested range starts at the end of the file -> partial file is already complete
+            response.read()
+            if response.getheader("Content-Range", "").endswith("/" + str(offset)):
+                release()
+                return response.status, response.headers
+            # partial file does not match the remote file -> restart
+            os.remove(part_path)
+            raise http.client.HTTPException("invalid range request, restarting download")
+        if response.status == 206:
+            if not response.getheader("Content-Range", "").startswith("bytes " + str(offset) + "-"):
+                raise http.client.HTTPException("unexpected Content-Range header")
+            mode = 'ab'
+        elif response.status == 200:
+            # server ignored the range request -> start from the beginning
+            mode = 'wb'
+            if hashers is not None:
+                for algorithm in hashers:
+                    hashers[algorithm] = new_hasher(algorithm)
+        elif response.status in RETRY_STATUS_CODES:
+            raise http.client.HTTPException("HTTP error " + str(response.status))
+        else:
+            raise DownloadError("HTTP error " + str(response.status) + " " + response.reason + " for '" + url + "'!")
+
+        n_bytes = 0
+        with open(part_path, mode) as part_file:
+            while True:
+                if abort_event is not None and abort_event.is_set():
+                    raise DownloadError("Download of '" + url + "' aborted!")
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                part_file.write(chunk)
+                if hashers is not None:
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                n_bytes += len(chunk)
+        # a dropped connection just ends the body early -> compare with the announced length
+        content_length = response.getheader("Content-Length")
+        if content_length is not None and n_bytes < int(content_length):
+            raise http.client.IncompleteRead(b"", int(content_length) - n_bytes)
+    except BaseException:
+        release(reuse=False)
+        raise
+
+    release()
+    return response.status, response.headers
+
+
+def hash_file(file_path, hashers):
+    """
+                updates the given hash objects with the content of a file
+
+    :param file_path:   file path
+    :param hashers:     dict with hash objects
+    """
+    with open(file_path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b""):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+
+
+def download_file(url, file_path, pool=None, abort_event=None, retries=5, backoff=1.0, headers=None,
+                  hash_algorithms=(), display_name=None, expected_digests=None):
+    """
+                downloads a single file via a '.part' file which is resumed (HTTP Range request) after interruptions
+
+    :param url:             URL of the file
+    :param file_path:       target file path
+    :param pool:            ConnectionPool for keep-alive connections (a private pool is used if not given)
+    :param abort_event:     threading.Event which aborts the transfer if set (e.g. by a failed parallel download)
+    :param retries:         number of retries after a failed attempt
+    :param backoff:         wait time in seconds before the first retry (doubled after each retry)
+    :param headers:         dict with additional request headers (e.g. conditional headers)
+    :param hash_algorithms: names of algorithms (see new_hasher()) whose digests are computed while the file is written
+    :param display_name:    file name used in progress messages (default: file name of file_path)
+    :param expected_digests: dict mapping algorithms to the expected digests of the file (checked before the file is
+                            moved to file_path, ChecksumError on mismatch)
+    :return:                DownloadResult (if the server answered a conditional request with 'not modified', the
+                            target file is not touched and not verified)
+    """
+
+    if display_name is None:
+        display_name = os.path.basename(file_path)
+    expected_digests = expected_digests or {}
+    hash_algorithms = list(hash_algorithms) + [algorithm for algorithm in expected_digests
+                                               if algorithm not in hash_algorithms]
+    print("Downloading file '" + display_name + "'...")
+    start_time = time.perf_counter()
+    status, response_headers = None, {}
+
+    if urllib.parse.urlsplit(url).scheme not in ("http", "https"):
+        # no resume support for other protocols (e.g. ftp)
+        urllib.request.urlretrieve(url, file_path + ".part")
+        hashers = {algorithm: new_hasher(algorithm) for algorithm in hash_algorithms}
+        hash_file(file_path + ".part", hashers)
+        verify_downloaded_file(url, file_path + ".part", hashers, expected_digests)
+        os.replace(file_path + ".part", file_path)
+    else:
+        private_pool = pool is None
+        if private_pool:
+            pool = ConnectionPool()
+        part_path = file_path + ".part"
+        try:
+            for attempt in range(retries + 1):
+                hashers = {algorithm: new_hasher(algorithm) for algorithm in hash_algorithms}
+                if os.path.exists(part_path):
+                    # resumed download -> hash the already downloaded part
+                    hash_file(part_path, hashers)
+                try:
+                    status, response_headers = fetch_to_part_file(url, part_path, pool, abort_event, headers,
+                                                                  hashers)
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    if attempt == retries:
+                        raise DownloadError("Download of '" + url + "' failed after " + str(retries + 1)
+                                            + " attempts: " + str(e))
+                    wait_time = min(backoff * 2 ** attempt, 60.0)
+                    print("\tWarning: download of '" + display_name + "' interrupted (" + str(e)
+                          + "), retrying in " + str(wait_time) + " s...")
+                    if abort_event is None:
+                        time.sleep(wait_time)
+                    elif abort_event.wait(wait_time):
+                        raise DownloadError("Download of '" + url + "' aborted!")
+            if status != 304:
+                verify_downloaded_file(url, part_path, hashers, expected_digests)
+                os.replace(part_path, file_path)
+        finally:
+            if private_pool:
+                pool.close()
+
+    elapsed_time = time.perf_counter() - start_time
+    if status == 304:
+        print("\t'" + display_name + "' not modified on server.")
+        n_bytes = 0
+    else:
+        n_bytes = os.path.getsize(file_path)
+        print("\tdownloaded '" + display_name + "' (" + format_throughput(n_bytes, elapsed_time) + ")")
+    return DownloadResult(n_bytes, elapsed_time, status == 304,
+                          {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()},
+                          response_headers.get("ETag"), response_headers.get("Last-Modified"))
+
+
+def verify_downloaded_file(url, file_path, hashers, expected_digests):
+    """
+                verifies a completely downloaded file, the file is removed if a digest does not match
+
+    :param url:                 URL of the file
+    :param file_path:           file path of the downloaded file
+    :param hashers:             dict with the hash objects updated with the file content
+    :param expected_digests:    dict mapping algorithms to the expected digests
+    """
+    try:
+        verify_digests(url, {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}, expected_digests)
+    except ChecksumError:
+        os.remove(file_path)
+        raise
+
+
+class StreamingDownload(io.RawIOBase):
+    """
+                readable stream of a remote file which is not written to disk: a background thread reads the HTTP
+                response ahead into a bounded queue (the transfer overlaps with the processing of the data) and resumes
+                the transfer with a Range request after an interruption
+    """
+
+    def __init__(self, url, retries=5, backoff=1.0, hash_algorithms=(), prefetch_chunks=PREFETCH_CHUNKS):
+        """
+        :param url:                 URL of the file (http or https)
+        :param retries:             number of retries after consecutive failed attempts
+        :param backoff:             wait time in seconds before the first retry (doubled after each retry)
+        :param hash_algorithms:     names of algorithms (see new_hasher()) whose digests are computed from the streamed
+                                    data
+        :param prefetch_chunks:     maximal number of chunks (CHUNK_SIZE) which are read ahead
+        """
+        super().__init__()
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.n_bytes = 0
+        self.hashers = {algorithm: new_hasher(algorithm) for algorithm in hash_algorithms}
+        self._chunks = queue.Queue(maxsize=prefetch_chunks)
+        self._buffer = memoryview(b"")
+        self._finished = False
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._fetch, name="download " + os.path.basename(url), daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self._buffer) == 0:
+            if self._finished:
+                return 0
+            chunk = self._chunks.get()
+            if isinstance(chunk, BaseException):
+                self._finished = True
+                raise chunk
+            if chunk is None:
+                self._finished = True
+                return 0
+            self._buffer = memoryview(chunk)
+        n_bytes = min(len(buffer), len(self._buffer))
+        buffer[:n_bytes] = self._buffer[:n_bytes]
+        self._buffer = self._buffer[n_bytes:]
+        return n_bytes
+
+    def close(self):
+        if not self.closed:
+            self._stop_event.set()
+            # unblock the fetching thread
+            while self._thread.is_alive():
+                try:
+                    self._chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        super().close()
+
+    def digests(self):
+        """
+                returns the digests of the streamed data (complete after the end of the stream was read)
+
+        :return:    dict mapping the hash algorithms to hex digests
+        """
+        return {algorithm: hasher.hexdigest() for algorithm, hasher in self.hashers.items()}
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch(self):
+        pool = ConnectionPool()
+        failed_attempts = 0
+        try:
+            while True:
+                try:
+                    if self._fetch_response(pool):
+                        self._put(None)
+                        return
+                    failed_attempts = 0
+                except (OSError, http.client.HTTPException) as e:
+                    if failed_attempts == self.retries:
+                        raise DownloadError("Download of '" + self.url + "' failed after " + str(self.retries + 1)
+                                            + " attempts: " + str(e))
+                    wait_time = min(self.backoff * 2 ** failed_attempts, 60.0)
+                    failed_attempts += 1
+                    print("\tWarning: download of '" + os.path.basename(self.url) + "' interrupted (" + str(e)
+                          + "), retrying in " + str(wait_time) + " s...")
+                    if self._stop_event.wait(wait_time):
+                        return
+        except BaseException as e:
+            self._put(e)
+        finally:
+            pool.close()
+
+    def _fetch_response(self, pool):
+        """
+                reads one response (resumed at the current position)
+
+        :return:    True if the end of the file was reached, False if the transfer was interrupted after receiving
+                    data (retried immediately)
+        """
+        offset = self.n_bytes
+        response, release = open_url(self.url, pool, {"Range": "bytes=" + str(offset) + "-"} if offset > 0 else {})
+        try:
+            skip = 0
+            if response.status == 206:
+                if not response.getheader("Content-Range", "").startswith("bytes " + str(offset) + "-"):
+                    raise http.client.HTTPException("unexpected Content-Range header")
+            elif response.status == 200:
+                # server ignored the range request -> skip the data which was already streamed
+                skip = offset
+            elif response.status in RETRY_STATUS_CODES:
+                raise http.client.HTTPException("HTTP error " + str(response.status))
+            else:
+                raise DownloadError("HTTP error " + str(response.status) + " " + response.reason + " for '"
+                                    + self.url + "'!")
+
+            n_received = 0
+            while not self._stop_event.is_set():
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                n_received += len(chunk)
+                if skip > 0:
+                    n_skipped = min(skip, len(chunk))
+                    chunk = chunk[n_skipped:]
+                    skip -= n_skipped
+                    if not chunk:
+                        continue
+                for hasher in self.hashers.values():
+                    hasher.update(chunk)
+                self.n_bytes += len(chunk)
+                if not self._put(chunk):
+                    break
+            if self._stop_event.is_set():
+                release(reuse=False)
+                return True
+            # a dropped connection just ends the body early -> compare with the announced length
+            content_length = response.getheader("Content-Length")
+            if content_length is not None and n_received < int(content_length):
+                if self.n_bytes > offset:
+                    # new data received -> resume without waiting
+                    release(reuse=False)
+                    return False
+                raise http.client.IncompleteRead(b"", int(content_length) - n_received)
+        except BaseException:
+            release(reuse=False)
+            raise
+        release()
+        return True
+
+
+def link_file(source_path, target_path):
+    """
+                makes a file available at another path without copying the data: tries a reflink (copy-on-write
+                clone), then a hardlink and falls back to a copy
+
+    :param source_path:     existing file
+    :param target_path:     path of the link (an existing file is replaced)
+    """
+    if os.path.lexists(target_path):
+        os.remove(target_path)
+    try:
+        with open(source_path, 'rb') as source_file, open(target_path, 'wb') as target_file:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+        return
+    except (OSError, NameError):
+        # no reflink support (file system or platform)
+        if os.path.exists(target_path):
+            os.remove(target_path)
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+
+
+class DownloadCache:
+    """
+                persistent download cache: file contents are stored by their SHA-256 hash, an index maps URLs to
+                contents and the HTTP validators (ETag/Last-Modified) used to revalidate the entries
+
+                Files linked from the cache into the output folder may be hardlinks: they must be replaced (new file +
+                rename/remove), never modified in place.
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        """
+        :param cache_dir:   directory of the cache (created if missing)
+        :param max_size:    maximal size of the cached files in bytes (least recently used files are evicted)
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "tmp"), exist_ok=True)
+        self._entries = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, 'r') as index_file:
+                self._entries = json.load(index_file)
+
+    def object_path(self, sha256):
+        """
+                returns the path of a cached file
+
+        :param sha256:  SHA-256 hex digest of the file content
+        :return:        file path in the cache
+        """
+        return os.path.join(self.cache_dir, "objects", sha256[:2], sha256)
+
+    def fetch(self, url, file_path, pool=None, abort_event=None, retries=5, hash_algorithms=(),
+              expected_digests=None):
+        """
+                provides the file of the given URL at file_path: cached files are revalidated with a conditional
+                request and linked, new or modified files are downloaded into the cache first
+
+        :param url:                 URL of the file
+        :param file_path:           target file path
+        :param pool:                ConnectionPool for keep-alive connections
+        :param abort_event:         threading.Event which aborts the transfer if set
+        :param retries:             number of retries after a failed attempt
+        :param hash_algorithms:     names of algorithms (see new_hasher()) whose digests are returned (digests are
+                                    stored in the cache index, so cached files are only hashed again for new algorithms)
+        :param expected_digests:    dict mapping algorithms to the expected digests of the file (ChecksumError on
+                                    mismatch)
+        :return:                    DownloadResult (with the digests also for files which were not modified)
+        """
+        expected_digests = expected_digests or {}
+        hash_algorithms = ["sha256"] + [algorithm for algorithm in list(hash_algorithms) + list(expected_digests)
+                                        if algorithm != "sha256"]
+        with self._lock:
+            entry = self._entries.get(url)
+        headers = {}
+        if entry is not None and os.path.exists(self.object_path(entry["sha256"])):
+            if entry.get("etag") is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified") is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        download_path = os.path.join(self.cache_dir, "tmp", hashlib.sha256(url.encode("utf-8")).hexdigest())
+        result = download_file(url, download_path, pool, abort_event, retries, headers=headers,
+                               hash_algorithms=hash_algorithms, display_name=os.path.basename(file_path),
+                               expected_digests=expected_digests)
+
+        if result.not_modified:
+            sha256 = entry["sha256"]
+            digests = dict(entry.get("digests", {}), sha256=sha256)
+            missing_hashers = {algorithm: new_hasher(algorithm) for algorithm in hash_algorithms
+                               if algorithm not in digests}
+            if len(missing_hashers) > 0:
+                hash_file(self.object_path(sha256), missing_hashers)
+                digests.update({algorithm: hasher.hexdigest() for algorithm, hasher in missing_hashers.items()})
+            verify_digests(url, digests, expected_digests)
+            result = result._replace(digests=digests)
+        else:
+            sha256 = result.digests["sha256"]
+            object_path = self.object_path(sha256)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            if os.path.exists(object_path):
+                # same content already cached (e.g. from another URL)
+                os.remove(download_path)
+            else:
+                os.replace(download_path, object_path)
+
+        with self._lock:
+            self._entries[url] = {
+                "sha256": sha256,
+                "size": os.path.getsize(self.object_path(sha256)),
+                "etag": result.etag if not result.not_modified else entry.get("etag"),
+                "last_modified": result.last_modified if not result.not_modified else entry.get("last_modified"),
+                "digests": dict(entry.get("digests", {}) if result.not_modified else {}, **result.digests),
+                "last_access": time.time()
+            }
+            self._save_index()
+
+        link_file(self.object_path(sha256), file_path)
+        return result
+
+    def evict(self):
+        """
+                removes the least recently used files until the cache is smaller than the maximal size
+        """
+        if self.max_size is None:
+            return
+        with self._lock:
+            # one object can be referenced by several URLs
+            objects = {}
+            for url, entry in self._entries.items():
+                size, last_access, urls = objects.get(entry["sha256"], (entry["size"], 0, []))
+                objects[entry["sha256"]] = (size, max(last_access, entry["last_access"]), urls + [url])
+            cache_size = sum(size for size, _, _ in objects.values())
+            for sha256, (size, _, urls) in sorted(objects.items(), key=lambda item: item[1][1]):
+                if cache_size <= self.max_size:
+                    break
+                print("\tremoving '" + os.path.basename(urls[0]) + "' from download cache...")
+                if os.path.exists(self.object_path(sha256)):
+                    os.remove(self.object_path(sha256))
+                for url in urls:
+                    del self._entries[url]
+                cache_size -= size
+            self._save_index()
+
+    def _save_index(self):
+        temp_index_path = self._index_path + ".tmp"
+        with open(temp_index_path, 'w') as index_file:
+            json.dump(self._entries, index_file, indent=2)
+        os.replace(temp_index_path, self._index_path)
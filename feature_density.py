@@ -0,0 +1,101 @@
+"""
+    Gene and transcript density (number of features overlapping fixed size bins) of a gff3 track written as bigWig
+    files with zoom levels, so IGV does not have to load all features of a zoomed out region
+"""
+import array
+
+import bbi_utils
+try:
+    import numpy
+except ImportError:
+    # optional: the bins are counted in pure Python
+    numpy = None
+
+"""
+bin sizes of the density levels: the first one is the resolution of the data, the other ones are the zoom levels
+"""
+DENSITY_BIN_SIZES = [10000, 100000, 1000000, 10000000]
+
+"""
+feature kinds (attribute identifying the feature kind, file extension of the density track, track name suffix)
+"""
+DENSITY_KINDS = [(b"gene_id=", ".gene_density.bw", "gene density"),
+                 (b"transcript_id=", ".transcript_density.bw", "transcript density")]
+
+
+def count_overlaps(starts, ends, n_bins, bin_size):
+    """
+                counts the features overlapping each bin (difference array of the first and last bin of each feature)
+
+    :param starts:      array of the start positions (1-based)
+    :param ends:        array of the end positions (inclusive)
+    :param n_bins:      number of bins
+    :param bin_size:    number of bases per bin
+    :return:            list of the counts per bin (float)
+    """
+    if numpy is not None:
+        first_bins = (numpy.frombuffer(starts, dtype=numpy.uint32).astype(numpy.int64) - 1) // bin_size
+        last_bins = (numpy.frombuffer(ends, dtype=numpy.uint32).astype(numpy.int64) - 1) // bin_size
+        differences = (numpy.bincount(first_bins, minlength=n_bins + 1)
+                       - numpy.bincount(last_bins + 1, minlength=n_bins + 1))
+        return numpy.cumsum(differences[:n_bins]).astype(float).tolist()
+
+    differences = [0] * (n_bins + 1)
+    for start, end in zip(starts, ends):
+        differences[(start - 1) // bin_size] += 1
+        differences[(end - 1) // bin_size + 1] -= 1
+    counts = []
+    count = 0
+    for difference in differences[:n_bins]:
+        count += difference
+        counts.append(float(count))
+    return counts
+
+
+class FeatureDensityBuilder:
+    """
+                collects the coordinates of the gene and transcript features while a gff3 file is written
+    """
+
+    def __init__(self):
+        # chromosome -> list with one pair of arrays (starts, ends) per feature kind (in order of appearance)
+        self.coordinates = {}
+
+    def add(self, chromosome, start, end, attributes):
+        """
+                adds a gff3 content line (lines without gene or transcript id are ignored)
+
+        :param chromosome:  chromosome (bytes)
+        :param start:       start position (1-based)
+        :param end:         end position (inclusive)
+        :param attributes:  part of the line containing the attribute column (bytes)
+        """
+        for kind, (key, _, _) in enumerate(DENSITY_KINDS):
+            if key in attributes:
+                coordinates = self.coordinates.get(chromosome)
+                if coordinates is None:
+                    coordinates = [(array.array('I'), array.array('I')) for _ in DENSITY_KINDS]
+                    self.coordinates[chromosome] = coordinates
+                coordinates[kind][0].append(start)
+                coordinates[kind][1].append(end)
+                return
+
+    def write(self, file_path):
+        """
+                writes one bigWig file per feature kind (file_path + extension of the kind)
+
+        :param file_path:   file path of the gff3 file
+        :return:            list of tuples (file path, track name suffix)
+        """
+        bin_size = DENSITY_BIN_SIZES[0]
+        tracks = []
+        for kind, (_, extension, name) in enumerate(DENSITY_KINDS):
+            chromosomes = []
+            for chromosome, coordinates in self.coordinates.items():
+                starts, ends = coordinates[kind]
+                # chromosome size: end of the last feature of any kind (rounded up to a full bin)
+                n_bins = (max(max(kind_ends, default=0) for _, kind_ends in coordinates) - 1) // bin_size + 1
+                chromosomes.append((chromosome, n_bins * bin_size, count_overlaps(starts, ends, n_bins, bin_size)))
+            bbi_utils.write_bigwig(file_path + extension, chromosomes, bin_size, DENSITY_BIN_SIZES[1:])
+            tracks.append((file_path + extension, name))
+        return tracks
@@ -2,456 +2,99 @@
     Generates a IGV genome file in the new JSON format from a template (including updating gene file)
 """
 import argparse
+import collections
+import concurrent.futures
+import copy
+import hashlib
+import http.client
 import json
-import operator
 import os
-import subprocess
 import tempfile
-import urllib.request
+import threading
+import time
 import gzip
+import heapq
+import io
 import shutil
+import urllib.parse
 
-# global variables
-genome_json = {}
+import bbi_utils
+import bgzf_utils
+import build_manifest
+import download_utils
+import feature_density
+import hgnc_snapshot
+import locus_index
+import pipeline_utils
+import profiling
+import transcript_bigbed
+
+# HGNC mapping of a worker process of the per-chromosome processing (set by init_gff3_worker())
+worker_hgnc_symbols = {}
+worker_hgnc_aliases = {}
+
+"""
+marker of the HGNC accession in the description attribute of the Ensembl gff3 file
+"""
+HGNC_MARKER = b"[Source:HGNC Symbol%3BAcc:"
+
+"""
+approximate memory overhead (in bytes) of a buffered content line in addition to its text length (str object, list
+slot and sort key) used to estimate the memory usage of the sorted runs in streaming mode
+"""
+LINE_MEMORY_OVERHEAD = 160
+
+"""
+rank of all known chromosome names (incl. aliases) used as primary sort key (built by build_chromosome_ranks())
+"""
+chromosome_ranks = {}
+
+"""
+first rank of chromosomes which are neither in the template chromosome order nor in the FASTA index
+"""
+UNKNOWN_CHROMOSOME_RANK = 1 << 32
+
+"""
+optional checksum fields of the template tracks (hash algorithms)
+"""
+CHECKSUM_FIELDS = ["md5", "sha256"]
+
+"""
+file extension of the gene name -> locus search index written next to each gff3 track
+"""
+NAME_INDEX_EXTENSION = ".names.tsv"
 
 """
-sorting order for non integer chromosomes
+attributes which are kept by every pruning profile: ID/Parent (feature hierarchy), Name, gene_id and transcript_id
+(name index, bigBed and density tracks)
 """
-sorting_order = {
-    'X': 100, 
-    'Y': 101, 
-    'MT': 102,
-    "chr11_KI270721v1_random": 1000, 
-    "chr14_GL000009v2_random": 1001, 
-    "chr14_GL000225v1_random": 1002, 
-    "chr14_KI270722v1_random": 1003, 
-    "chr14_GL000194v1_random": 1004, 
-    "chr14_KI270723v1_random": 1005, 
-    "chr14_KI270724v1_random": 1006, 
-    "chr14_KI270725v1_random": 1007, 
-    "chr14_KI270726v1_random": 1008, 
-    "chr15_KI270727v1_random": 1009, 
-    "chr16_KI270728v1_random": 1010, 
-    "chr17_GL000205v2_random": 1011, 
-    "chr17_KI270729v1_random": 1012, 
-    "chr17_KI270730v1_random": 1013, 
-    "chr1_KI270706v1_random": 1014, 
-    "chr1_KI270707v1_random": 1015, 
-    "chr1_KI270708v1_random": 1016, 
-    "chr1_KI270709v1_random": 1017, 
-    "chr1_KI270710v1_random": 1018, 
-    "chr1_KI270711v1_random": 1019, 
-    "chr1_KI270712v1_random": 1020, 
-    "chr1_KI270713v1_random": 1021, 
-    "chr1_KI270714v1_random": 1022, 
-    "chr22_KI270731v1_random": 1023, 
-    "chr22_KI270732v1_random": 1024, 
-    "chr22_KI270733v1_random": 1025, 
-    "chr22_KI270734v1_random": 1026, 
-    "chr22_KI270735v1_random": 1027, 
-    "chr22_KI270736v1_random": 1028, 
-    "chr22_KI270737v1_random": 1029, 
-    "chr22_KI270738v1_random": 1030, 
-    "chr22_KI270739v1_random": 1031, 
-    "chr2_KI270715v1_random": 1032, 
-    "chr2_KI270716v1_random": 1033, 
-    "chr3_GL000221v1_random": 1034, 
-    "chr4_GL000008v2_random": 1035, 
-    "chr5_GL000208v1_random": 1036, 
-    "chr9_KI270717v1_random": 1037, 
-    "chr9_KI270718v1_random": 1038, 
-    "chr9_KI270719v1_random": 1039, 
-    "chr9_KI270720v1_random": 1040, 
-    "chr1_KI270762v1_alt": 1041, 
-    "chr1_KI270766v1_alt": 1042, 
-    "chr1_KI270760v1_alt": 1043, 
-    "chr1_KI270765v1_alt": 1044, 
-    "chr1_GL383518v1_alt": 1045, 
-    "chr1_GL383519v1_alt": 1046, 
-    "chr1_GL383520v2_alt": 1047, 
-    "chr1_KI270764v1_alt": 1048, 
-    "chr1_KI270763v1_alt": 1049, 
-    "chr1_KI270759v1_alt": 1050, 
-    "chr1_KI270761v1_alt": 1051, 
-    "chr2_KI270770v1_alt": 1052, 
-    "chr2_KI270773v1_alt": 1053, 
-    "chr2_KI270774v1_alt": 1054, 
-    "chr2_KI270769v1_alt": 1055, 
-    "chr2_GL383521v1_alt": 1056, 
-    "chr2_KI270772v1_alt": 1057, 
-    "chr2_KI270775v1_alt": 1058, 
-    "chr2_KI270771v1_alt": 1059, 
-    "chr2_KI270768v1_alt": 1060, 
-    "chr2_GL582966v2_alt": 1061, 
-    "chr2_GL383522v1_alt": 1062, 
-    "chr2_KI270776v1_alt": 1063, 
-    "chr2_KI270767v1_alt": 1064, 
-    "chr3_JH636055v2_alt": 1065, 
-    "chr3_KI270783v1_alt": 1066, 
-    "chr3_KI270780v1_alt": 1067, 
-    "chr3_GL383526v1_alt": 1068, 
-    "chr3_KI270777v1_alt": 1069, 
-    "chr3_KI270778v1_alt": 1070, 
-    "chr3_KI270781v1_alt": 1071, 
-    "chr3_KI270779v1_alt": 1072, 
-    "chr3_KI270782v1_alt": 1073, 
-    "chr3_KI270784v1_alt": 1074, 
-    "chr4_KI270790v1_alt": 1075, 
-    "chr4_GL383528v1_alt": 1076, 
-    "chr4_KI270787v1_alt": 1077, 
-    "chr4_GL000257v2_alt": 1078, 
-    "chr4_KI270788v1_alt": 1079, 
-    "chr4_GL383527v1_alt": 1080, 
-    "chr4_KI270785v1_alt": 1081, 
-    "chr4_KI270789v1_alt": 1082, 
-    "chr4_KI270786v1_alt": 1083, 
-    "chr5_KI270793v1_alt": 1084, 
-    "chr5_KI270792v1_alt": 1085, 
-    "chr5_KI270791v1_alt": 1086, 
-    "chr5_GL383532v1_alt": 1087, 
-    "chr5_GL949742v1_alt": 1088, 
-    "chr5_KI270794v1_alt": 1089, 
-    "chr5_GL339449v2_alt": 1090, 
-    "chr5_GL383530v1_alt": 1091, 
-    "chr5_KI270796v1_alt": 1092, 
-    "chr5_GL383531v1_alt": 1093, 
-    "chr5_KI270795v1_alt": 1094, 
-    "chr6_GL000250v2_alt": 1095, 
-    "chr6_KI270800v1_alt": 1096, 
-    "chr6_KI270799v1_alt": 1097, 
-    "chr6_GL383533v1_alt": 1098, 
-    "chr6_KI270801v1_alt": 1099, 
-    "chr6_KI270802v1_alt": 1100, 
-    "chr6_KB021644v2_alt": 1101, 
-    "chr6_KI270797v1_alt": 1102, 
-    "chr6_KI270798v1_alt": 1103, 
-    "chr7_KI270804v1_alt": 1104, 
-    "chr7_KI270809v1_alt": 1105, 
-    "chr7_KI270806v1_alt": 1106, 
-    "chr7_GL383534v2_alt": 1107, 
-    "chr7_KI270803v1_alt": 1108, 
-    "chr7_KI270808v1_alt": 1109, 
-    "chr7_KI270807v1_alt": 1110, 
-    "chr7_KI270805v1_alt": 1111, 
-    "chr8_KI270818v1_alt": 1112, 
-    "chr8_KI270812v1_alt": 1113, 
-    "chr8_KI270811v1_alt": 1114, 
-    "chr8_KI270821v1_alt": 1115, 
-    "chr8_KI270813v1_alt": 1116, 
-    "chr8_KI270822v1_alt": 1117, 
-    "chr8_KI270814v1_alt": 1118, 
-    "chr8_KI270810v1_alt": 1119, 
-    "chr8_KI270819v1_alt": 1120, 
-    "chr8_KI270820v1_alt": 1121, 
-    "chr8_KI270817v1_alt": 1122, 
-    "chr8_KI270816v1_alt": 1123, 
-    "chr8_KI270815v1_alt": 1124, 
-    "chr9_GL383539v1_alt": 1125, 
-    "chr9_GL383540v1_alt": 1126, 
-    "chr9_GL383541v1_alt": 1127, 
-    "chr9_GL383542v1_alt": 1128, 
-    "chr9_KI270823v1_alt": 1129, 
-    "chr10_GL383545v1_alt": 1130, 
-    "chr10_KI270824v1_alt": 1131, 
-    "chr10_GL383546v1_alt": 1132, 
-    "chr10_KI270825v1_alt": 1133, 
-    "chr11_KI270832v1_alt": 1134, 
-    "chr11_KI270830v1_alt": 1135, 
-    "chr11_KI270831v1_alt": 1136, 
-    "chr11_KI270829v1_alt": 1137, 
-    "chr11_GL383547v1_alt": 1138, 
-    "chr11_JH159136v1_alt": 1139, 
-    "chr11_JH159137v1_alt": 1140, 
-    "chr11_KI270827v1_alt": 1141, 
-    "chr11_KI270826v1_alt": 1142, 
-    "chr12_GL877875v1_alt": 1143, 
-    "chr12_GL877876v1_alt": 1144, 
-    "chr12_KI270837v1_alt": 1145, 
-    "chr12_GL383549v1_alt": 1146, 
-    "chr12_KI270835v1_alt": 1147, 
-    "chr12_GL383550v2_alt": 1148, 
-    "chr12_GL383552v1_alt": 1149, 
-    "chr12_GL383553v2_alt": 1150, 
-    "chr12_KI270834v1_alt": 1151, 
-    "chr12_GL383551v1_alt": 1152, 
-    "chr12_KI270833v1_alt": 1153, 
-    "chr12_KI270836v1_alt": 1154, 
-    "chr13_KI270840v1_alt": 1155, 
-    "chr13_KI270839v1_alt": 1156, 
-    "chr13_KI270843v1_alt": 1157, 
-    "chr13_KI270841v1_alt": 1158, 
-    "chr13_KI270838v1_alt": 1159, 
-    "chr13_KI270842v1_alt": 1160, 
-    "chr14_KI270844v1_alt": 1161, 
-    "chr14_KI270847v1_alt": 1162, 
-    "chr14_KI270845v1_alt": 1163, 
-    "chr14_KI270846v1_alt": 1164, 
-    "chr15_KI270852v1_alt": 1165, 
-    "chr15_KI270851v1_alt": 1166, 
-    "chr15_KI270848v1_alt": 1167, 
-    "chr15_GL383554v1_alt": 1168, 
-    "chr15_KI270849v1_alt": 1169, 
-    "chr15_GL383555v2_alt": 1170, 
-    "chr15_KI270850v1_alt": 1171, 
-    "chr16_KI270854v1_alt": 1172, 
-    "chr16_KI270856v1_alt": 1173, 
-    "chr16_KI270855v1_alt": 1174, 
-    "chr16_KI270853v1_alt": 1175, 
-    "chr16_GL383556v1_alt": 1176, 
-    "chr16_GL383557v1_alt": 1177, 
-    "chr17_GL383563v3_alt": 1178, 
-    "chr17_KI270862v1_alt": 1179, 
-    "chr17_KI270861v1_alt": 1180, 
-    "chr17_KI270857v1_alt": 1181, 
-    "chr17_JH159146v1_alt": 1182, 
-    "chr17_JH159147v1_alt": 1183, 
-    "chr17_GL383564v2_alt": 1184, 
-    "chr17_GL000258v2_alt": 1185, 
-    "chr17_GL383565v1_alt": 1186, 
-    "chr17_KI270858v1_alt": 1187, 
-    "chr17_KI270859v1_alt": 1188, 
-    "chr17_GL383566v1_alt": 1189, 
-    "chr17_KI270860v1_alt": 1190, 
-    "chr18_KI270864v1_alt": 1191, 
-    "chr18_GL383567v1_alt": 1192, 
-    "chr18_GL383570v1_alt": 1193, 
-    "chr18_GL383571v1_alt": 1194, 
-    "chr18_GL383568v1_alt": 1195, 
-    "chr18_GL383569v1_alt": 1196, 
-    "chr18_GL383572v1_alt": 1197, 
-    "chr18_KI270863v1_alt": 1198, 
-    "chr19_KI270868v1_alt": 1199, 
-    "chr19_KI270865v1_alt": 1200, 
-    "chr19_GL383573v1_alt": 1201, 
-    "chr19_GL383575v2_alt": 1202, 
-    "chr19_GL383576v1_alt": 1203, 
-    "chr19_GL383574v1_alt": 1204, 
-    "chr19_KI270866v1_alt": 1205, 
-    "chr19_KI270867v1_alt": 1206, 
-    "chr19_GL949746v1_alt": 1207, 
-    "chr20_GL383577v2_alt": 1208, 
-    "chr20_KI270869v1_alt": 1209, 
-    "chr20_KI270871v1_alt": 1210, 
-    "chr20_KI270870v1_alt": 1211, 
-    "chr21_GL383578v2_alt": 1212, 
-    "chr21_KI270874v1_alt": 1213, 
-    "chr21_KI270873v1_alt": 1214, 
-    "chr21_GL383579v2_alt": 1215, 
-    "chr21_GL383580v2_alt": 1216, 
-    "chr21_GL383581v2_alt": 1217, 
-    "chr21_KI270872v1_alt": 1218, 
-    "chr22_KI270875v1_alt": 1219, 
-    "chr22_KI270878v1_alt": 1220, 
-    "chr22_KI270879v1_alt": 1221, 
-    "chr22_KI270876v1_alt": 1222, 
-    "chr22_KI270877v1_alt": 1223, 
-    "chr22_GL383583v2_alt": 1224, 
-    "chr22_GL383582v2_alt": 1225, 
-    "chrX_KI270880v1_alt": 1226, 
-    "chrX_KI270881v1_alt": 1227, 
-    "chr19_KI270882v1_alt": 1228, 
-    "chr19_KI270883v1_alt": 1229, 
-    "chr19_KI270884v1_alt": 1230, 
-    "chr19_KI270885v1_alt": 1231, 
-    "chr19_KI270886v1_alt": 1232, 
-    "chr19_KI270887v1_alt": 1233, 
-    "chr19_KI270888v1_alt": 1234, 
-    "chr19_KI270889v1_alt": 1235, 
-    "chr19_KI270890v1_alt": 1236, 
-    "chr19_KI270891v1_alt": 1237, 
-    "chr1_KI270892v1_alt": 1238, 
-    "chr2_KI270894v1_alt": 1239, 
-    "chr2_KI270893v1_alt": 1240, 
-    "chr3_KI270895v1_alt": 1241, 
-    "chr4_KI270896v1_alt": 1242, 
-    "chr5_KI270897v1_alt": 1243, 
-    "chr5_KI270898v1_alt": 1244, 
-    "chr6_GL000251v2_alt": 1245, 
-    "chr7_KI270899v1_alt": 1246, 
-    "chr8_KI270901v1_alt": 1247, 
-    "chr8_KI270900v1_alt": 1248, 
-    "chr11_KI270902v1_alt": 1249, 
-    "chr11_KI270903v1_alt": 1250, 
-    "chr12_KI270904v1_alt": 1251, 
-    "chr15_KI270906v1_alt": 1252, 
-    "chr15_KI270905v1_alt": 1253, 
-    "chr17_KI270907v1_alt": 1254, 
-    "chr17_KI270910v1_alt": 1255, 
-    "chr17_KI270909v1_alt": 1256, 
-    "chr17_JH159148v1_alt": 1257, 
-    "chr17_KI270908v1_alt": 1258, 
-    "chr18_KI270912v1_alt": 1259, 
-    "chr18_KI270911v1_alt": 1260, 
-    "chr19_GL949747v2_alt": 1261, 
-    "chr22_KB663609v1_alt": 1262, 
-    "chrX_KI270913v1_alt": 1263, 
-    "chr19_KI270914v1_alt": 1264, 
-    "chr19_KI270915v1_alt": 1265, 
-    "chr19_KI270916v1_alt": 1266, 
-    "chr19_KI270917v1_alt": 1267, 
-    "chr19_KI270918v1_alt": 1268, 
-    "chr19_KI270919v1_alt": 1269, 
-    "chr19_KI270920v1_alt": 1270, 
-    "chr19_KI270921v1_alt": 1271, 
-    "chr19_KI270922v1_alt": 1272, 
-    "chr19_KI270923v1_alt": 1273, 
-    "chr3_KI270924v1_alt": 1274, 
-    "chr4_KI270925v1_alt": 1275, 
-    "chr6_GL000252v2_alt": 1276, 
-    "chr8_KI270926v1_alt": 1277, 
-    "chr11_KI270927v1_alt": 1278, 
-    "chr19_GL949748v2_alt": 1279, 
-    "chr22_KI270928v1_alt": 1280, 
-    "chr19_KI270929v1_alt": 1281, 
-    "chr19_KI270930v1_alt": 1282, 
-    "chr19_KI270931v1_alt": 1283, 
-    "chr19_KI270932v1_alt": 1284, 
-    "chr19_KI270933v1_alt": 1285, 
-    "chr19_GL000209v2_alt": 1286, 
-    "chr3_KI270934v1_alt": 1287, 
-    "chr6_GL000253v2_alt": 1288, 
-    "chr19_GL949749v2_alt": 1289, 
-    "chr3_KI270935v1_alt": 1290, 
-    "chr6_GL000254v2_alt": 1291, 
-    "chr19_GL949750v2_alt": 1292, 
-    "chr3_KI270936v1_alt": 1293, 
-    "chr6_GL000255v2_alt": 1294, 
-    "chr19_GL949751v2_alt": 1295, 
-    "chr3_KI270937v1_alt": 1296, 
-    "chr6_GL000256v2_alt": 1297, 
-    "chr19_GL949752v1_alt": 1298, 
-    "chr6_KI270758v1_alt": 1299, 
-    "chr19_GL949753v2_alt": 1300, 
-    "chr19_KI270938v1_alt": 1301, 
-    "chrUn_KI270302v1": 1302, 
-    "chrUn_KI270304v1": 1303, 
-    "chrUn_KI270303v1": 1304, 
-    "chrUn_KI270305v1": 1305, 
-    "chrUn_KI270322v1": 1306, 
-    "chrUn_KI270320v1": 1307, 
-    "chrUn_KI270310v1": 1308, 
-    "chrUn_KI270316v1": 1309, 
-    "chrUn_KI270315v1": 1310, 
-    "chrUn_KI270312v1": 1311, 
-    "chrUn_KI270311v1": 1312, 
-    "chrUn_KI270317v1": 1313, 
-    "chrUn_KI270412v1": 1314, 
-    "chrUn_KI270411v1": 1315, 
-    "chrUn_KI270414v1": 1316, 
-    "chrUn_KI270419v1": 1317, 
-    "chrUn_KI270418v1": 1318, 
-    "chrUn_KI270420v1": 1319, 
-    "chrUn_KI270424v1": 1320, 
-    "chrUn_KI270417v1": 1321, 
-    "chrUn_KI270422v1": 1322, 
-    "chrUn_KI270423v1": 1323, 
-    "chrUn_KI270425v1": 1324, 
-    "chrUn_KI270429v1": 1325, 
-    "chrUn_KI270442v1": 1326, 
-    "chrUn_KI270466v1": 1327, 
-    "chrUn_KI270465v1": 1328, 
-    "chrUn_KI270467v1": 1329, 
-    "chrUn_KI270435v1": 1330, 
-    "chrUn_KI270438v1": 1331, 
-    "chrUn_KI270468v1": 1332, 
-    "chrUn_KI270510v1": 1333, 
-    "chrUn_KI270509v1": 1334, 
-    "chrUn_KI270518v1": 1335, 
-    "chrUn_KI270508v1": 1336, 
-    "chrUn_KI270516v1": 1337, 
-    "chrUn_KI270512v1": 1338, 
-    "chrUn_KI270519v1": 1339, 
-    "chrUn_KI270522v1": 1340, 
-    "chrUn_KI270511v1": 1341, 
-    "chrUn_KI270515v1": 1342, 
-    "chrUn_KI270507v1": 1343, 
-    "chrUn_KI270517v1": 1344, 
-    "chrUn_KI270529v1": 1345, 
-    "chrUn_KI270528v1": 1346, 
-    "chrUn_KI270530v1": 1347, 
-    "chrUn_KI270539v1": 1348, 
-    "chrUn_KI270538v1": 1349, 
-    "chrUn_KI270544v1": 1350, 
-    "chrUn_KI270548v1": 1351, 
-    "chrUn_KI270583v1": 1352, 
-    "chrUn_KI270587v1": 1353, 
-    "chrUn_KI270580v1": 1354, 
-    "chrUn_KI270581v1": 1355, 
-    "chrUn_KI270579v1": 1356, 
-    "chrUn_KI270589v1": 1357, 
-    "chrUn_KI270590v1": 1358, 
-    "chrUn_KI270584v1": 1359, 
-    "chrUn_KI270582v1": 1360, 
-    "chrUn_KI270588v1": 1361, 
-    "chrUn_KI270593v1": 1362, 
-    "chrUn_KI270591v1": 1363, 
-    "chrUn_KI270330v1": 1364, 
-    "chrUn_KI270329v1": 1365, 
-    "chrUn_KI270334v1": 1366, 
-    "chrUn_KI270333v1": 1367, 
-    "chrUn_KI270335v1": 1368, 
-    "chrUn_KI270338v1": 1369, 
-    "chrUn_KI270340v1": 1370, 
-    "chrUn_KI270336v1": 1371, 
-    "chrUn_KI270337v1": 1372, 
-    "chrUn_KI270363v1": 1373, 
-    "chrUn_KI270364v1": 1374, 
-    "chrUn_KI270362v1": 1375, 
-    "chrUn_KI270366v1": 1376, 
-    "chrUn_KI270378v1": 1377, 
-    "chrUn_KI270379v1": 1378, 
-    "chrUn_KI270389v1": 1379, 
-    "chrUn_KI270390v1": 1380, 
-    "chrUn_KI270387v1": 1381, 
-    "chrUn_KI270395v1": 1382, 
-    "chrUn_KI270396v1": 1383, 
-    "chrUn_KI270388v1": 1384, 
-    "chrUn_KI270394v1": 1385, 
-    "chrUn_KI270386v1": 1386, 
-    "chrUn_KI270391v1": 1387, 
-    "chrUn_KI270383v1": 1388, 
-    "chrUn_KI270393v1": 1389, 
-    "chrUn_KI270384v1": 1390, 
-    "chrUn_KI270392v1": 1391, 
-    "chrUn_KI270381v1": 1392, 
-    "chrUn_KI270385v1": 1393, 
-    "chrUn_KI270382v1": 1394, 
-    "chrUn_KI270376v1": 1395, 
-    "chrUn_KI270374v1": 1396, 
-    "chrUn_KI270372v1": 1397, 
-    "chrUn_KI270373v1": 1398, 
-    "chrUn_KI270375v1": 1399, 
-    "chrUn_KI270371v1": 1400, 
-    "chrUn_KI270448v1": 1401, 
-    "chrUn_KI270521v1": 1402, 
-    "chrUn_GL000195v1": 1403, 
-    "chrUn_GL000219v1": 1404, 
-    "chrUn_GL000220v1": 1405, 
-    "chrUn_GL000224v1": 1406, 
-    "chrUn_KI270741v1": 1407, 
-    "chrUn_GL000226v1": 1408, 
-    "chrUn_GL000213v1": 1409, 
-    "chrUn_KI270743v1": 1410, 
-    "chrUn_KI270744v1": 1411, 
-    "chrUn_KI270745v1": 1412, 
-    "chrUn_KI270746v1": 1413, 
-    "chrUn_KI270747v1": 1414, 
-    "chrUn_KI270748v1": 1415, 
-    "chrUn_KI270749v1": 1416, 
-    "chrUn_KI270750v1": 1417, 
-    "chrUn_KI270751v1": 1418, 
-    "chrUn_KI270752v1": 1419, 
-    "chrUn_KI270753v1": 1420, 
-    "chrUn_KI270754v1": 1421, 
-    "chrUn_KI270755v1": 1422, 
-    "chrUn_KI270756v1": 1423, 
-    "chrUn_KI270757v1": 1424, 
-    "chrUn_GL000214v1": 1425, 
-    "chrUn_KI270742v1": 1426, 
-    "chrUn_GL000216v2": 1427, 
-    "chrUn_GL000218v1": 1428, 
-    "chrY_KI270740v1_random": 1429
-    }
+REQUIRED_ATTRIBUTES = [b"ID", b"Parent", b"Name", b"gene_id", b"transcript_id"]
+
+"""
+options of the gff3 rewrite which are shared by all files of a build (see update_gene_file() for their meaning)
+"""
+Gff3RewriteOptions = collections.namedtuple("Gff3RewriteOptions",
+                                            ["max_memory", "threads", "retries", "pipeline_depth", "density_tracks",
+                                             "bigbed"],
+                                            defaults=[None, None, 5, 8, False, False])
+
+
+def parse_size(size: str):
+    """
+                parses a memory size given as plain number of bytes or with unit suffix (e.g. '512M', '2G')
+
+    :param size:    memory size string
+    :return:        size in bytes
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    size = size.strip().upper().rstrip("B")
+    try:
+        if size[-1:] in units:
+            return int(float(size[:-1]) * units[size[-1]])
+        return int(size)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid memory size '" + size + "'")
+
 
 def parse_args():
     """
@@ -466,6 +109,56 @@ def parse_args():
     parser.add_argument("template_file", help="Template JSON containing all links to the input files.")
     parser.add_argument("hgnc_file", help="file path to the the HGNC table file (containing HGNC id <-> gene name mapping")
     parser.add_argument("output", help="file path for the generated output IGV genome JSON file")
+    parser.add_argument("--template", nargs=2, action="append", default=[], metavar=("TEMPLATE_FILE", "OUTPUT"),
+                        help="batch mode: build an additional genome from this template (can be given multiple times). "
+                             "The HGNC file is loaded once, URLs shared by the templates are downloaded once and the "
+                             "GFF3 files of all genomes are processed in one pool of --jobs processes")
+    parser.add_argument("--download-jobs", type=int, default=4,
+                        help="number of files which are downloaded in parallel (default: 4)")
+    parser.add_argument("--download-retries", type=int, default=5,
+                        help="number of retries (resuming the partial file) after an interrupted download (default: 5)")
+    parser.add_argument("--checksums-hosts", default="ftp.ensembl.org",
+                        help="comma separated hosts whose directories contain Ensembl CHECKSUMS files: downloads from "
+                             "these hosts are verified against the BSD sums (computed by the 'sum' tool, '' disables "
+                             "the lookup, md5/sha256 fields in the template are always verified, a missing CHECKSUMS "
+                             "file only prints a warning) (default: ftp.ensembl.org)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="persistent download cache: cached files are revalidated (ETag/Last-Modified) and linked "
+                             "into the output folder instead of downloaded again (default: no cache)")
+    parser.add_argument("--cache-max-size", type=parse_size, default=None,
+                        help="maximal size of the download cache (e.g. '20G'), least recently used files are evicted "
+                             "(default: unlimited)")
+    parser.add_argument("--stream-gff3", action="store_true",
+                        help="stream the remote GFF3 tracks directly into the gene name update (the compressed file is "
+                             "not stored and not cached, only the BGZF output is written)")
+    parser.add_argument("--pipeline-depth", type=int, default=8,
+                        help="number of chunks buffered between the pipelined GFF3 stages (decompression, merging) "
+                             "which run on separate threads, 0 runs all stages sequentially (default: 8)")
+    parser.add_argument("--density-tracks", action="store_true",
+                        help="write gene and transcript density tracks (bigWig files with zoom levels) next to each "
+                             "GFF3 track and add them to the genome JSON, so zoomed out regions show the density "
+                             "instead of loading all features")
+    parser.add_argument("--bigbed", action="store_true",
+                        help="write the transcripts of each GFF3 track as bigBed file (BED12 with gene symbol and "
+                             "Ensembl ids) and point the track of the genome JSON at it instead of the GFF3 file: IGV "
+                             "reads only the compressed blocks of the visible region")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="number of threads used to compress the modified GFF3 files (default: number of CPUs)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of processes: if > 1, the GFF3 files are partitioned by chromosome and the gene "
+                             "names of each chromosome are updated and sorted in parallel (batch mode: the GFF3 files "
+                             "are processed in parallel) (default: 1)")
+    parser.add_argument("--hgnc-snapshot", default=None,
+                        help="file path of the binary snapshot of the parsed HGNC table, rebuilt if the HGNC file "
+                             "changes (default: <hgnc_file>.snapshot)")
+    parser.add_argument("--no-hgnc-snapshot", action="store_true",
+                        help="parse the HGNC file on every run instead of using the binary snapshot")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild all stages, even if the build manifest of a previous run shows no input changes")
+    parser.add_argument("--max-memory", type=parse_size, default=None,
+                        help="streaming mode: sort the GFF3 content in runs of at most this size (e.g. '512M', '2G') "
+                             "which are spilled to temporary files and merged into the output (default: sort in memory)")
+    profiling.add_arguments(parser)
 
     return parser.parse_args()
 
@@ -475,47 +168,186 @@ def parse_json(template_file: str):
             parses the template file
 
     :param template_file:   file path to the json template file
+    :return:                genome JSON (dict)
     """
-    global genome_json
     with open(template_file, 'r') as json_file:
-        genome_json = json.load(json_file)
-    return
+        return json.load(json_file)
 
 
-def download_files(output_folder: str):
+def collect_downloads(genome_json, output_folder, skip_urls=()):
     """
-            downloads all distant files in the template json and links to them
+            collects all distant files of the template json and links the JSON to the local file names
 
+    :param genome_json:     genome JSON (modified in place)
     :param output_folder:   target folder for the downloads
-
-    :return:             modified JSON template with links to the local files
+    :param skip_urls:       URLs which are not downloaded (local files are up-to-date), but still linked in the JSON
+    :return:                list of tuples (URL, local file path)
     """
-    global genome_json
-    # download all required files
-
+    downloads = []
     for key in ["fastaURL", "indexURL", "cytobandURL", "aliasURL"]:
         url = genome_json[key]
-        filename = os.path.basename(url)
-        print("Downloading file '" + filename + "'...")
-        urllib.request.urlretrieve(url, os.path.join(output_folder, filename))
-        genome_json[key] = filename
+        genome_json[key] = os.path.basename(url)
+        downloads.append(url)
 
-    # download tracks
+    # tracks (with optional index)
     for track in genome_json["tracks"]:
-        url = track["url"]
-        filename = os.path.basename(url)
-        print("Downloading file '" + filename + "'...")
-        urllib.request.urlretrieve(url, os.path.join(output_folder, filename))
-        track["url"] = filename
-        # load optional index
-        if "indexURL" in track:
-            url = track["indexURL"]
-            filename = os.path.basename(url)
-            print("Downloading file '" + filename + "'...")
-            urllib.request.urlretrieve(url, os.path.join(output_folder, filename))
-            track["indexURL"] = filename
+        for key in ["url", "indexURL"]:
+            if key in track:
+                url = track[key]
+                track[key] = os.path.basename(url)
+                downloads.append(url)
+    return [(url, os.path.join(output_folder, os.path.basename(url))) for url in downloads if url not in skip_urls]
+
+
+def collect_checksums(genome_json):
+    """
+            removes the expected checksums from the template json: 'md5'/'sha256' fields of the tracks (checksums of
+            the track URL) and the 'checksums' dict (mapping URLs to dicts with 'md5'/'sha256')
+
+    :param genome_json:     genome JSON (modified in place)
+    :return:                dict mapping URLs to dicts mapping the hash algorithms to the expected digests
+    """
+    checksums = {url: dict(digests) for url, digests in genome_json.pop("checksums", {}).items()}
+    for track in genome_json["tracks"]:
+        for algorithm in CHECKSUM_FIELDS:
+            if algorithm in track:
+                checksums.setdefault(track["url"], {})[algorithm] = track.pop(algorithm)
+    return checksums
 
-    return
+
+def collect_pruning_profiles(genome_json):
+    """
+            removes the pruning profiles from the gff3 tracks of the template json: 'pruning' dicts with the allowed
+            'featureTypes' and 'attributes' (both optional, all feature types/attributes are kept if missing)
+
+    :param genome_json:     genome JSON (modified in place)
+    :return:                dict mapping the gff3 file names to dicts with the allowed 'feature_types' and 'attributes'
+                            (frozensets of bytes or None)
+    """
+    profiles = {}
+    for track in genome_json["tracks"]:
+        if "pruning" not in track:
+            continue
+        profile = track.pop("pruning")
+        unknown_keys = set(profile) - {"featureTypes", "attributes"}
+        if track.get("format") != "gff3" or unknown_keys:
+            raise ValueError("Invalid pruning profile of track '" + track["url"] + "' (only gff3 tracks with "
+                             "'featureTypes' and 'attributes' are supported)!")
+        profiles[os.path.basename(track["url"])] = {
+            "feature_types": (frozenset(feature_type.encode("utf-8") for feature_type in profile["featureTypes"])
+                              if "featureTypes" in profile else None),
+            "attributes": (frozenset([attribute.encode("utf-8") for attribute in profile["attributes"]]
+                                     + REQUIRED_ATTRIBUTES) if "attributes" in profile else None)}
+    return profiles
+
+
+def expected_digests(urls, checksums, checksums_hosts=()):
+    """
+            returns the expected digests of the given URLs: checksums of the template and BSD sums of the Ensembl
+            CHECKSUMS files (fetched once per directory, a missing or unreachable CHECKSUMS file only skips the
+            verification of the files in its directory)
+
+    :param urls:            URLs of the files
+    :param checksums:       dict mapping URLs to the checksums of the template (see collect_checksums())
+    :param checksums_hosts: host names whose directories contain CHECKSUMS files
+    :return:                dict mapping URLs to dicts mapping the hash algorithms to the expected digests
+    """
+    expected = {}
+    checksums_files = {}
+    if checksums_hosts and not download_utils.bsd_sum_available():
+        print("Warning: the 'sum' tool is not installed, files are not verified against Ensembl CHECKSUMS files.")
+        checksums_hosts = ()
+    pool = download_utils.ConnectionPool()
+    for url in urls:
+        expected[url] = dict(checksums.get(url, {}))
+        if urllib.parse.urlsplit(url).hostname in checksums_hosts:
+            directory_url = url.rsplit("/", 1)[0] + "/"
+            if directory_url not in checksums_files:
+                print("Fetching checksums of '" + directory_url + "'...")
+                try:
+                    checksums_files[directory_url] = download_utils.fetch_checksums_file(directory_url, pool)
+                except (OSError, http.client.HTTPException, download_utils.DownloadError) as e:
+                    print("\tWarning: checksums of '" + directory_url + "' could not be fetched (" + str(e)
+                          + "), files are not verified.")
+                    checksums_files[directory_url] = {}
+                else:
+                    if len(checksums_files[directory_url]) == 0:
+                        print("\tWarning: no " + download_utils.CHECKSUMS_FILE_NAME + " file in '" + directory_url
+                              + "', files are not verified.")
+            if os.path.basename(url) in checksums_files[directory_url]:
+                expected[url][download_utils.BsdSum.name] = checksums_files[directory_url][os.path.basename(url)]
+    pool.close()
+    return expected
+
+
+def download_files(downloads, n_jobs: int = 1, retries: int = 5, cache=None, profile_record=None, expected=None):
+    """
+            downloads all distant files (URLs contained in multiple templates are downloaded only once and linked),
+            the checksums are computed while the files are written
+
+    :param downloads:       list of tuples (URL, local file path), see collect_downloads()
+    :param n_jobs:          number of parallel downloads
+    :param retries:         number of retries (resuming the partial download) after an interrupted transfer
+    :param cache:           optional download_utils.DownloadCache, cached files are revalidated and linked instead of
+                            downloaded
+    :param profile_record:  optional profiling.StageRecord which is updated with the downloaded bytes
+    :param expected:        dict mapping URLs to the expected digests (see expected_digests()), a mismatch raises a
+                            download_utils.ChecksumError
+    :return:                dict mapping URLs to the digests (SHA-256 and all expected algorithms) of the files
+    """
+    expected = expected or {}
+    # deduplicate URLs: the first file path is downloaded, the other ones are linked to it
+    file_paths = {}
+    for url, file_path in downloads:
+        file_paths.setdefault(url, [])
+        if file_path not in file_paths[url]:
+            file_paths[url].append(file_path)
+
+    # download all files in parallel, abort all remaining transfers on the first error
+    start_time = time.perf_counter()
+    abort_event = threading.Event()
+    # keep-alive connections are shared between the workers (files on the same host reuse the connection)
+    pool = download_utils.ConnectionPool()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            download_function = download_utils.download_file if cache is None else cache.fetch
+            futures = {executor.submit(download_function, url, paths[0], pool, abort_event, retries,
+                                       hash_algorithms=("sha256",), expected_digests=expected.get(url)): url
+                       for url, paths in file_paths.items()}
+            done, not_done = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+            for future in done:
+                if future.exception() is not None:
+                    abort_event.set()
+                    for pending_future in not_done:
+                        pending_future.cancel()
+                    raise future.exception()
+    finally:
+        pool.close()
+    elapsed_time = time.perf_counter() - start_time
+
+    n_linked = 0
+    for paths in file_paths.values():
+        for file_path in paths[1:]:
+            download_utils.link_file(paths[0], file_path)
+            n_linked += 1
+
+    n_bytes = sum(future.result().n_bytes for future in futures)
+    n_verified = sum(len(expected.get(url, {})) > 0 for url in file_paths)
+    if profile_record is not None:
+        profile_record.add(bytes_in=n_bytes)
+        profile_record.extra["files"] = len(file_paths)
+        profile_record.extra["verified_files"] = n_verified
+    print("\t" + str(len(file_paths)) + " files downloaded ("
+          + download_utils.format_throughput(n_bytes, elapsed_time) + ")")
+    print("\t" + str(n_verified) + " files verified by checksum.")
+    if n_linked > 0:
+        print("\t" + str(n_linked) + " files shared by multiple templates were linked.")
+    if cache is not None:
+        n_cached = sum(future.result().not_modified for future in futures)
+        print("\t" + str(n_cached) + " files were up-to-date in the download cache.")
+        cache.evict()
+
+    return {url: future.result().digests for future, url in futures.items()}
 
 
 def load_hgnc_file(hgnc_filepath):
@@ -536,153 +368,810 @@ def load_hgnc_file(hgnc_filepath):
     return hgnc_mapping
 
 
+def load_hgnc_aliases(hgnc_filepath):
+    """
+                parses the alias and previous symbols of all genes of the HGNC file (for the gene name search index)
+
+    :param hgnc_filepath:   file path of the HGNC TSV file
+    :return:                dict mapping UTF-8 encoded gene symbols to lists of UTF-8 encoded aliases
+    """
+    print("Parsing HGNC aliases...")
+    hgnc_aliases = {}
+    with open(hgnc_filepath, 'r', encoding="utf8") as hgnc_file:
+        header = hgnc_file.readline().rstrip("\n").split('\t')
+        columns = [header.index(column) for column in ["alias_symbol", "prev_symbol"] if column in header]
+        for line in hgnc_file:
+            if line.startswith("HGNC:"):
+                split_line = line.rstrip("\n").split('\t')
+                aliases = []
+                for column in columns:
+                    if column < len(split_line):
+                        aliases += [alias.encode('utf-8') for alias in split_line[column].strip('"').split('|')
+                                    if alias != ""]
+                if len(aliases) > 0:
+                    hgnc_aliases[split_line[1].strip().encode('utf-8')] = aliases
+    print("\t " + str(len(hgnc_aliases)) + " genes with aliases parsed.")
+    return hgnc_aliases
+
+
+def load_hgnc_snapshot(hgnc_filepath, snapshot_path=None):
+    """
+                loads the HGNC mapping from the memory-mapped binary snapshot of the HGNC file (the HGNC file is only
+                parsed if the snapshot is missing or outdated)
+
+    :param hgnc_filepath:   file path of the HGNC TSV file
+    :param snapshot_path:   file path of the snapshot (default: <hgnc_filepath>.snapshot)
+    :return:                HgncSnapshot (read-only mapping HGNC ids to gene symbols)
+    """
+    print("Loading HGNC snapshot...")
+    hgnc_mapping = hgnc_snapshot.load_snapshot(hgnc_filepath, load_hgnc_file, snapshot_path)
+    print("\t " + str(len(hgnc_mapping)) + " ids loaded.")
+    return hgnc_mapping
+
+
+def build_chromosome_ranks(genome_json, output_folder):
+    """
+                builds the chromosome rank table: chromosomes of the template 'chromosomeOrder' first, followed by all
+                other sequences in the order of the (downloaded) FASTA index. All aliases of a chromosome (alias file)
+                get the same rank.
+
+    :param genome_json:     genome JSON (with links to the local files)
+    :param output_folder:   folder containing the downloaded files
+    :return:                dict mapping chromosome names to ranks (see set_chromosome_ranks())
+    """
+    print("Building chromosome sort order...")
+    names = list(genome_json.get("chromosomeOrder", []))
+    if "indexURL" in genome_json and os.path.exists(os.path.join(output_folder, genome_json["indexURL"])):
+        with open(os.path.join(output_folder, genome_json["indexURL"]), 'r') as fai_file:
+            names += [line.split('\t', 1)[0] for line in fai_file if line.strip() != ""]
+
+    chromosome_ranks = {}
+    for name in names:
+        if name not in chromosome_ranks:
+            chromosome_ranks[name] = len(chromosome_ranks)
+
+    # aliases (e.g. Ensembl names '1', 'MT', 'KI270728.1')
+    if "aliasURL" in genome_json and os.path.exists(os.path.join(output_folder, genome_json["aliasURL"])):
+        with open(os.path.join(output_folder, genome_json["aliasURL"]), 'r') as alias_file:
+            for line in alias_file:
+                if line.startswith("#"):
+                    continue
+                aliases = [alias.strip() for alias in line.split('\t') if alias.strip() != ""]
+                ranks = [chromosome_ranks[alias] for alias in aliases if alias in chromosome_ranks]
+                if len(ranks) > 0:
+                    for alias in aliases:
+                        chromosome_ranks.setdefault(alias, ranks[0])
+    for name, rank in list(chromosome_ranks.items()):
+        if name.startswith("chr"):
+            chromosome_ranks.setdefault(name[3:], rank)
+    # mitochondrial chromosome (see update_alias_file())
+    if "chrM" in chromosome_ranks:
+        for alias in ["chrMT", "MT", "M"]:
+            chromosome_ranks.setdefault(alias, chromosome_ranks["chrM"])
+
+    print("\t" + str(len(names)) + " sequences ranked (" + str(len(chromosome_ranks)) + " names incl. aliases).")
+    return chromosome_ranks
+
+
+def set_chromosome_ranks(ranks):
+    """
+                sets the chromosome rank table used for sorting the gff3 files (of the current genome)
+
+    :param ranks:   dict mapping chromosome names to ranks (see build_chromosome_ranks())
+    """
+    global chromosome_ranks
+    chromosome_ranks = dict(ranks)
+
+
+def chromosome_rank(chromosome):
+    """
+                returns the rank of a chromosome in the sort order, unknown chromosomes are sorted after all known
+                chromosomes in a deterministic order (hash of the name)
+
+    :param chromosome:  chromosome name (first column of the gff3 file, str or bytes)
+    :return:            integer rank
+    """
+    rank = chromosome_ranks.get(chromosome)
+    if rank is None:
+        if isinstance(chromosome, bytes):
+            # raw gff3 lines: cache the rank also for the bytes name
+            rank = chromosome_rank(chromosome.decode('utf-8'))
+        else:
+            rank = UNKNOWN_CHROMOSOME_RANK + int.from_bytes(hashlib.blake2b(chromosome.encode('utf-8'),
+                                                                            digest_size=8).digest(), 'big')
+        chromosome_ranks[chromosome] = rank
+    return rank
+
+
+def gff3_sort_key(line):
+    """
+                sort key of a (unsplit) gff3 content line: chromosome rank and start position in a single integer
+                (rank << 32 | start, start positions have to be below 2^32)
+
+    :param line:    gff3 content line (bytes)
+    :return:        integer sort key
+    """
+    split_line = line.split(b'\t', 4)
+    return chromosome_rank(split_line[0]) << 32 | int(split_line[3])
+
+
 def sort_gff3(content):
     """
-                sorts the content gff3 file based on the sorting order defined above
+                sorts the content lines of a gff3 file by chromosome rank and start position (stable)
 
-    :param content:  content of the gff file (without headers)
-    :return:         sorted list of lists
+    :param content:  list of content lines of the gff file (without headers)
+    :return:         sorted list of content lines
     """
 
     print("sorting gff3 data...")
 
-    # preprocess chromosome column and positioning column
+    content.sort(key=gff3_sort_key)
+
+    return content
+
+
+def write_sorted_runs(content, max_memory, temp_folder):
+    """
+                sorts the gff3 content lines in runs which fit into the given memory budget and spills each sorted run
+                to a temporary file
+
+    :param content:      iterable of gff3 content lines (without headers)
+    :param max_memory:   memory budget in bytes for the lines of one run
+    :param temp_folder:  folder in which the temporary run files are created
+    :return:             list of file handles (rewound to the start) containing the sorted runs
+    """
+
+    print("sorting gff3 data in runs of " + str(max_memory) + " bytes...")
+
+    run_files = []
+    buffer = []
+    buffer_size = 0
+
+    def spill():
+        buffer.sort(key=gff3_sort_key)
+        run_file = tempfile.TemporaryFile(mode='w+b', dir=temp_folder)
+        run_file.writelines(buffer)
+        run_file.seek(0)
+        run_files.append(run_file)
+        buffer.clear()
+
     for line in content:
-        if line[0] in sorting_order:
-            line[0] = sorting_order[line[0]]
-        elif line[0].startswith("GL0"):
-            line[0] = 10000 + int(float(line[0][2:]) * 10) #move GL0000XX.X to the end
-        elif line[0].startswith("KI"):
-            line[0] = 20000 + int(float(line[0][2:]) * 10) #move KI0000XX.X to the end
+        buffer.append(line)
+        buffer_size += len(line) + LINE_MEMORY_OVERHEAD
+        if buffer_size >= max_memory:
+            spill()
+            buffer_size = 0
+    if len(buffer) > 0:
+        spill()
+
+    print("\t" + str(len(run_files)) + " sorted runs written.")
+    return run_files
+
+
+def merge_sorted_runs(run_files):
+    """
+                k-way merges the sorted runs created by write_sorted_runs() and closes (deletes) the run files afterwards
+
+    :param run_files:   list of file handles containing the sorted runs
+    :return:            generator of sorted gff3 content lines
+    """
+
+    print("merging " + str(len(run_files)) + " sorted runs...")
+    try:
+        # heapq.merge is stable, lines with equal keys keep their input order (like list.sort())
+        yield from heapq.merge(*run_files, key=gff3_sort_key)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+def read_gff3_lines(compressed_gff3, comment_lines, stats):
+    """
+                reads a gzipped gff3 file and separates the comment lines from the content lines (raw bytes, the lines
+                are not decoded)
+
+    :param compressed_gff3:  file handle of the gzipped gff3 file (or iterable of its decompressed lines)
+    :param comment_lines:    list to which all comment lines are appended
+    :param stats:            dict with line counters which is updated while parsing
+    :return:                 generator of gff3 content lines
+    """
+
+    for line in compressed_gff3:
+        # skip comments
+        if line.startswith(b"#"):
+            if line.strip() == b"###":
+                # ignore
+                stats["ignored"] += 1
+                continue
+            comment_lines.append(line)
+            stats["comment"] += 1
+            continue
+        yield line
+
+
+def encode_hgnc_mapping(hgnc_mapping):
+    """
+                converts the HGNC mapping for the bytes-level processing of the gff3 lines
+
+    :param hgnc_mapping:    dict mapping HGNC ids to gene symbols (or HgncSnapshot)
+    :return:                dict mapping HGNC ids to UTF-8 encoded gene symbols
+    """
+    if isinstance(hgnc_mapping, hgnc_snapshot.HgncSnapshot):
+        # memory-mapped: passed to the worker processes as file path
+        return hgnc_mapping.raw_view()
+    return {hgnc_id: symbol.encode('utf-8') for hgnc_id, symbol in hgnc_mapping.items()}
+
+
+def update_gene_name(line, hgnc_symbols, stats):
+    """
+                updates the gene name of a gff3 content line using the HGNC id in the description
+
+                Works on the raw bytes: lines without HGNC reference are returned untouched, otherwise only the value of
+                the 'Name=' attribute is replaced.
+
+    :param line:            gff3 content line (bytes)
+    :param hgnc_symbols:    dict mapping HGNC ids to UTF-8 encoded gene symbols (see encode_hgnc_mapping())
+    :param stats:           dict with line counters which is updated
+    :return:                (modified) gff3 content line or None if the line is dropped
+    """
+
+    # detect HGNC ids
+    marker_position = line.find(HGNC_MARKER)
+    if marker_position < 0:
+        # no HGNC identifier -> store unmodified
+        stats["unmodified"] += 1
+        return line
+
+    attributes_start = line.rfind(b'\t', 0, marker_position) + 1
+    if line.rfind(b"description=", attributes_start, marker_position) < 0:
+        # HGNC reference outside of the description
+        return None
+
+    # extract HGNC id ('...[Source:HGNC Symbol%3BAcc:HGNC:5]')
+    id_end = line.find(b"]", marker_position)
+    hgnc_id = int(line[marker_position + len(HGNC_MARKER):id_end].rsplit(b":", 1)[-1])
+    symbol = hgnc_symbols.get(hgnc_id)
+    if symbol is None:
+        print("Warning: HGNC id " + str(hgnc_id) + " not found in HGNC file!")
+        # store line unmodified
+        stats["unmodified"] += 1
+        return line
+
+    # replace the value of the 'Name' attribute
+    stats["modified"] += 1
+    if line.startswith(b"Name=", attributes_start):
+        name_start = attributes_start + 5
+    else:
+        name_start = line.find(b";Name=", attributes_start)
+        if name_start < 0:
+            # no name -> append attribute
+            line_end = len(line) - 1 if line.endswith(b"\n") else len(line)
+            return line[:line_end] + b";Name=" + symbol + line[line_end:]
+        name_start += 6
+    name_end = line.find(b";", name_start)
+    if name_end < 0:
+        name_end = len(line) - 1 if line.endswith(b"\n") else len(line)
+    return line[:name_start] + symbol + line[name_end:]
+
+
+def prune_gff3_features(content_lines, feature_types, stats, pruned_bytes):
+    """
+                drops the features whose type is not allowed and all their descendants, so no Parent attribute refers
+                to a dropped feature (parents have to precede their children, as in the Ensembl files)
+
+    :param content_lines:   iterable of gff3 content lines (bytes)
+    :param feature_types:   allowed feature types (bytes)
+    :param stats:           dict with line counters which is updated ('pruned')
+    :param pruned_bytes:    dict with byte counters which is updated ('features')
+    :return:                generator of the remaining content lines
+    """
+    dropped_ids = set()
+    for line in content_lines:
+        split_line = line.split(b'\t', 8)
+        dropped = split_line[2] not in feature_types
+        if dropped_ids and not dropped and b"Parent=" in split_line[8]:
+            attributes = split_line[8].rstrip(b"\r\n").split(b";")
+            for index, attribute in enumerate(attributes):
+                if attribute.startswith(b"Parent="):
+                    parents = attribute[len(b"Parent="):].split(b",")
+                    kept_parents = [parent for parent in parents if parent not in dropped_ids]
+                    if not kept_parents:
+                        dropped = True
+                    elif len(kept_parents) < len(parents):
+                        # remove the references to the dropped parents
+                        attributes[index] = b"Parent=" + b",".join(kept_parents)
+                        pruned_line = (line[:len(line) - len(split_line[8])] + b";".join(attributes)
+                                       + line[len(line.rstrip(b"\r\n")):])
+                        pruned_bytes["attributes"] += len(line) - len(pruned_line)
+                        line = pruned_line
+        if dropped:
+            for attribute in split_line[8].rstrip(b"\r\n").split(b";"):
+                if attribute.startswith(b"ID="):
+                    dropped_ids.add(attribute[len(b"ID="):])
+            stats["pruned"] += 1
+            pruned_bytes["features"] += len(line)
+            continue
+        yield line
+
+
+def prune_gff3_attributes(line, attributes):
+    """
+                removes the attributes which are not allowed from a gff3 content line
+
+    :param line:        gff3 content line (bytes)
+    :param attributes:  allowed attribute names (bytes)
+    :return:            tuple (pruned line, number of removed bytes)
+    """
+    attributes_start = line.rfind(b'\t') + 1
+    line_end = len(line) - 1 if line.endswith(b"\n") else len(line)
+    kept_attributes = [attribute for attribute in line[attributes_start:line_end].split(b";")
+                       if attribute.split(b"=", 1)[0] in attributes]
+    pruned_line = line[:attributes_start] + (b";".join(kept_attributes) or b".") + line[line_end:]
+    return pruned_line, len(line) - len(pruned_line)
+
+
+def modify_gff3_content(compressed_gff3, hgnc_symbols, comment_lines, stats, pruning=None, pruned_bytes=None):
+    """
+                updates the gene names of all content lines of a gff3 file using the HGNC ids in the description
+
+    :param compressed_gff3:  file handle of the gzipped gff3 file
+    :param hgnc_symbols:     dict mapping HGNC ids to UTF-8 encoded gene symbols (see encode_hgnc_mapping())
+    :param comment_lines:    list to which all comment lines are appended
+    :param stats:            dict with line counters which is updated while parsing
+    :param pruning:          optional pruning profile (see collect_pruning_profiles()), the attributes are pruned after
+                             the gene names are updated (the HGNC id is part of the description)
+    :param pruned_bytes:     dict with the byte counters of the pruning ('features', 'attributes') which is updated
+    :return:                 generator of (modified) gff3 content lines (bytes)
+    """
+
+    content_lines = read_gff3_lines(compressed_gff3, comment_lines, stats)
+    attributes = None
+    if pruning is not None:
+        if pruning["feature_types"] is not None:
+            content_lines = prune_gff3_features(content_lines, pruning["feature_types"], stats, pruned_bytes)
+        attributes = pruning["attributes"]
+    for line in content_lines:
+        line = update_gene_name(line, hgnc_symbols, stats)
+        if line is not None:
+            if attributes is not None:
+                line, n_bytes = prune_gff3_attributes(line, attributes)
+                pruned_bytes["attributes"] += n_bytes
+            yield line
+
+
+def init_gff3_worker(hgnc_symbols, hgnc_aliases=None):
+    """
+                initializes a worker process of the per-chromosome processing (HGNC mapping is transferred only once)
+
+    :param hgnc_symbols:    dict mapping HGNC ids to UTF-8 encoded gene symbols
+    :param hgnc_aliases:    dict mapping UTF-8 encoded gene symbols to their aliases (batch mode, see load_hgnc_aliases())
+    """
+    global worker_hgnc_symbols, worker_hgnc_aliases
+    worker_hgnc_symbols = hgnc_symbols
+    worker_hgnc_aliases = hgnc_aliases or {}
+
+
+def process_gff3_partition(content, attributes=None):
+    """
+                updates the gene names of all content lines of one chromosome and sorts them (runs in a worker process)
+
+    :param content:     gff3 content lines of one chromosome (joined to one bytes object)
+    :param attributes:  allowed attributes of the pruning profile (None: all attributes are kept)
+    :return:            tuple (sorted content lines joined to one bytes object, dict with line counters, number of
+                        bytes removed by the attribute pruning)
+    """
+    stats = {"unmodified": 0, "modified": 0}
+    pruned_bytes = 0
+    content_lines = []
+    for line in io.BytesIO(content):
+        line = update_gene_name(line, worker_hgnc_symbols, stats)
+        if line is not None:
+            if attributes is not None:
+                line, n_bytes = prune_gff3_attributes(line, attributes)
+                pruned_bytes += n_bytes
+            content_lines.append(line)
+    # all lines are located on the same chromosome -> sort by start position
+    content_lines.sort(key=lambda line: int(line.split(b'\t', 4)[3]))
+    return b"".join(content_lines), stats, pruned_bytes
+
+
+def process_gff3_partitions(compressed_gff3, executor, comment_lines, stats, pruning=None, pruned_bytes=None):
+    """
+                partitions the content of a gff3 file by chromosome, updates the gene names and sorts each partition in
+                a worker process
+
+    :param compressed_gff3:  file handle of the gzipped gff3 file
+    :param executor:         concurrent.futures.ProcessPoolExecutor initialized with init_gff3_worker()
+    :param comment_lines:    list to which all comment lines are appended
+    :param stats:            dict with line counters which is updated with the results of the workers
+    :param pruning:          optional pruning profile (see modify_gff3_content())
+    :param pruned_bytes:     dict with the byte counters of the pruning which is updated
+    :return:                 generator of sorted gff3 content lines (partitions concatenated in chromosome order)
+    """
+
+    print("partitioning gff3 data by chromosome...")
+    content_lines = read_gff3_lines(compressed_gff3, comment_lines, stats)
+    attributes = None
+    if pruning is not None:
+        if pruning["feature_types"] is not None:
+            # the features are pruned in input order (parents before children)
+            content_lines = prune_gff3_features(content_lines, pruning["feature_types"], stats, pruned_bytes)
+        attributes = pruning["attributes"]
+    partitions = {}
+    for line in content_lines:
+        partitions.setdefault(line.split(b'\t', 1)[0], []).append(line)
+    print("\t" + str(len(partitions)) + " chromosomes found.")
+
+    print("updating gene names and sorting gff3 data per chromosome...")
+    futures = {}
+    for chromosome in sorted(partitions.keys(), key=chromosome_rank):
+        futures[chromosome] = executor.submit(process_gff3_partition, b"".join(partitions.pop(chromosome)),
+                                              attributes)
+
+    def sorted_content():
+        for chromosome, future in futures.items():
+            content, partition_stats, partition_pruned_bytes = future.result()
+            for key, value in partition_stats.items():
+                stats[key] += value
+            if pruned_bytes is not None:
+                pruned_bytes["attributes"] += partition_pruned_bytes
+            yield from io.BytesIO(content)
+
+    return sorted_content()
+
+
+def write_bgzf_gff3(file_path, comment_lines, content_lines, threads=None, record=None, stage_stats=None,
+                    collectors=(), feature_collectors=()):
+    """
+                writes a sorted gff3 file BGZF compressed and creates its tabix index (.tbi) in the same pass: both are
+                written to temporary files which replace file_path (e.g. the source file) only after they are complete
+
+    :param file_path:       file path of the compressed gff3 file (index is written to file_path + '.tbi')
+    :param comment_lines:   header lines (bytes)
+    :param content_lines:   iterable of sorted content lines (bytes)
+    :param threads:         number of compression threads (default: number of CPUs)
+    :param record:          optional profiling.StageRecord which is updated with the written bytes and lines
+    :param stage_stats:     optional pipeline_utils.StageStats which is updated with the time the writer waited for
+                            the compression threads
+    :param collectors:      objects to which the gene and transcript lines are added while writing (e.g.
+                            locus_index.LocusIndexBuilder, feature_density.FeatureDensityBuilder)
+    :param feature_collectors:  objects to which all content lines incl. their feature type are added while writing
+                            (e.g. transcript_bigbed.TranscriptBedBuilder)
+    """
+    indexer = bgzf_utils.TabixIndexer("gff")
+    chromosome = None
+    chromosome_name = None
+    n_lines = len(comment_lines)
+    part_path = file_path + ".part"
+    # the incomplete file is removed if writing fails
+    with bgzf_utils.BgzfWriter(part_path, threads) as writer:
+        for line in comment_lines:
+            writer.write(line)
+        for line in content_lines:
+            n_lines += 1
+            start_offset = writer.tell()
+            writer.write(line)
+            split_line = line.split(b'\t', 5)
+            if split_line[0] != chromosome:
+                chromosome = split_line[0]
+                chromosome_name = chromosome.decode('utf-8')
+            start, end = int(split_line[3]), int(split_line[4])
+            indexer.add(chromosome_name, start - 1, end, start_offset, writer.tell())
+            if collectors and split_line[2] not in locus_index.CHILD_FEATURE_TYPES:
+                for collector in collectors:
+                    collector.add(chromosome, start, end, split_line[5])
+            for collector in feature_collectors:
+                collector.add_feature(chromosome, start, end, split_line[2], split_line[5])
+    try:
+        indexer.write(part_path + ".tbi", writer)
+    except BaseException:
+        os.remove(part_path)
+        raise
+    # replacing (instead of writing to) the source file keeps a hardlink into the download cache unchanged
+    os.replace(part_path, file_path)
+    os.replace(part_path + ".tbi", file_path + ".tbi")
+    if stage_stats is not None:
+        stage_stats.add("compress", "items", writer.n_blocks)
+        stage_stats.add("compress", "get_wait_seconds", writer.wait_seconds)
+    if record is not None:
+        record.add(bytes_in=writer.uncompressed_size,
+                   bytes_out=os.path.getsize(file_path) + os.path.getsize(file_path + ".tbi"), lines=n_lines)
+
+
+def rewrite_gff3_file(file_name, hgnc_symbols, output_folder, options=Gff3RewriteOptions(), executor=None,
+                      stream_url=None, expected=None, digests=None, hgnc_aliases=None, pruning=None):
+    """
+                updates the gene names in one gff3 file, sorts it (by the chromosome ranks set by
+                set_chromosome_ranks()) and compresses/indexes it for IGV
+
+    :param file_name:       file name of the gff3 file in the output folder
+    :param hgnc_symbols:    dict mapping HGNC ids to UTF-8 encoded gene symbols (see encode_hgnc_mapping())
+    :param output_folder:   folder containing the downloaded files
+    :param options:         Gff3RewriteOptions: max_memory, threads (compression, default: number of CPUs), retries
+                            (after an interrupted stream), pipeline_depth, density_tracks (write the gene/transcript
+                            density bigWig files, see feature_density) and bigbed (write the transcripts as bigBed
+                            file file_name + transcript_bigbed.BIGBED_EXTENSION)
+    :param executor:        optional concurrent.futures.ProcessPoolExecutor initialized with init_gff3_worker(): the
+                            content is partitioned by chromosome and processed in the pool (max_memory is ignored)
+    :param stream_url:      if set, the gff3 data is streamed from this URL instead of read from the output folder
+    :param expected:        dict mapping hash algorithms to the expected digests of the streamed file (verified before
+                            the output is written)
+    :param digests:         dict which is updated with the digests of the streamed file
+    :param hgnc_aliases:    dict mapping UTF-8 encoded gene symbols to their aliases (see load_hgnc_aliases()) which
+                            are added to the name index (file_name + NAME_INDEX_EXTENSION)
+    :param pruning:         optional pruning profile of the file (see collect_pruning_profiles())
+    :return:                dict with line counters
+    """
+    max_memory, threads, retries, pipeline_depth, density_tracks, bigbed = options
+    print("Modifying GFF3 file '" + file_name + "'...")
+    with profiling.stage("update_gene_file", file_name) as record:
+        if stream_url is not None:
+            print("streaming gff3 data from '" + stream_url + "'...")
+            source = download_utils.StreamingDownload(stream_url, retries,
+                                                      hash_algorithms=["sha256"] + list(expected or {}))
         else:
-            line[0] = int(line[0])
+            source = open(os.path.join(output_folder, file_name), 'rb')
 
-        line[3] = int(line[3])
-        line[4] = int(line[4])
+        # unzip, modify and sort
+        stats = {"comment": 0, "unmodified": 0, "modified": 0, "ignored": 0, "pruned": 0}
+        pruned_bytes = {"features": 0, "attributes": 0}
+        stage_stats = pipeline_utils.StageStats()
+        comment_lines = []
+        with source, gzip.open(source, 'rb') as compressed_gff3:
+            if pipeline_depth > 0:
+                # decompress on a separate thread (zlib releases the GIL)
+                compressed_gff3 = pipeline_utils.split_lines(pipeline_utils.threaded_stage(
+                    pipeline_utils.read_chunks(compressed_gff3), "decompress", stage_stats, pipeline_depth))
+            if executor is not None:
+                with profiling.stage("partition_gff3", file_name):
+                    content_lines = process_gff3_partitions(compressed_gff3, executor, comment_lines, stats, pruning,
+                                                            pruned_bytes)
+            else:
+                content = modify_gff3_content(compressed_gff3, hgnc_symbols, comment_lines, stats, pruning,
+                                              pruned_bytes)
+                if max_memory is None:
+                    with profiling.stage("modify_gff3_content", file_name) as modify_record:
+                        content = list(content)
+                        modify_record.add(lines=len(content))
+                    with profiling.stage("sort_gff3", file_name) as sort_record:
+                        content_lines = sort_gff3(content)
+                        sort_record.add(lines=len(content_lines))
+                else:
+                    # reading and updating the gene names is interleaved with writing the sorted runs
+                    with profiling.stage("sort_gff3", file_name):
+                        run_files = write_sorted_runs(content, max_memory, output_folder)
+                    content_lines = merge_sorted_runs(run_files)
 
-    # sort content
-    content.sort(key=operator.itemgetter(0, 3))
+        if isinstance(source, download_utils.StreamingDownload):
+            # the stream was read completely
+            record.add(bytes_in=source.n_bytes)
+            download_utils.verify_digests(stream_url, source.digests(), expected or {})
+            if digests is not None:
+                digests.update(source.digests())
+        else:
+            # the downloaded file is replaced by write_bgzf_gff3() once the output is complete
+            record.add(bytes_in=os.path.getsize(os.path.join(output_folder, file_name)))
 
-    # create reverse sorting_order:
-    reverse_sorting_order = {}
-    for k, v in sorting_order.items():
-        reverse_sorting_order[v] = k
+        if pipeline_depth > 0 and not isinstance(content_lines, list):
+            # merge the sorted runs / collect the partitions on a separate thread while writing
+            content_lines = pipeline_utils.unbatched(pipeline_utils.threaded_stage(
+                pipeline_utils.batched(content_lines), "merge", stage_stats, pipeline_depth))
 
-    # replace placeholder with original chromosome names:
-    for line in content:
-        if line[0] in reverse_sorting_order:
-            line[0] = reverse_sorting_order[line[0]]
+        # write modified file to disk (compressed and indexed)
+        print("Writing modified file to disk (compressing and indexing)...")
+        collectors = [locus_index.LocusIndexBuilder(hgnc_aliases)]
+        if density_tracks:
+            collectors.append(feature_density.FeatureDensityBuilder())
+        feature_collectors = [transcript_bigbed.TranscriptBedBuilder()] if bigbed else []
+        with profiling.stage("bgzip_tabix", file_name) as bgzf_record:
+            write_bgzf_gff3(os.path.join(output_folder, file_name), comment_lines, content_lines, threads,
+                            bgzf_record, stage_stats, collectors, feature_collectors)
+        with profiling.stage("write_name_index", file_name) as index_record:
+            n_names = collectors[0].write(os.path.join(output_folder, file_name + NAME_INDEX_EXTENSION))
+            index_record.add(lines=n_names)
+        print("\t" + str(n_names) + " names written to the search index.")
+        if density_tracks:
+            with profiling.stage("write_density_tracks", file_name) as density_record:
+                for density_file, _ in collectors[1].write(os.path.join(output_folder, file_name)):
+                    density_record.add(bytes_out=os.path.getsize(density_file))
+            print("\tgene/transcript density tracks written.")
+        if bigbed:
+            bigbed_path = os.path.join(output_folder, file_name + transcript_bigbed.BIGBED_EXTENSION)
+            with profiling.stage("write_bigbed", file_name) as bigbed_record:
+                n_transcripts = feature_collectors[0].write(bigbed_path)
+                bigbed_record.add(bytes_out=os.path.getsize(bigbed_path), lines=n_transcripts)
+            print("\t" + str(n_transcripts) + " transcripts written to the bigBed file.")
+        if pipeline_depth > 0:
+            print("Pipeline queue wait times:")
+            stage_stats.print_report()
+            record.extra["pipeline"] = stage_stats.report()
+        if pruning is not None:
+            record.extra["pruning"] = dict(pruned_bytes, lines=stats["pruned"])
+        record.add(bytes_out=bgzf_record.bytes_out, lines=sum(stats.values()))
+
+    # stats
+    print("\tcomment lines: " + str(stats["comment"]))
+    print("\tunmodified lines: " + str(stats["unmodified"]))
+    print("\tmodified lines: " + str(stats["modified"]))
+    print("\tignored lines: " + str(stats["ignored"]))
+    if pruning is not None:
+        saved_bytes = pruned_bytes["features"] + pruned_bytes["attributes"]
+        print("\tpruned lines: " + str(stats["pruned"]))
+        print("\tbytes saved by pruning: " + str(saved_bytes) + " of " + str(saved_bytes + bgzf_record.bytes_in)
+              + " uncompressed (features: " + str(pruned_bytes["features"]) + ", attributes: "
+              + str(pruned_bytes["attributes"]) + ")")
+    return stats
 
-    return content
 
-def update_gene_file(hgnc_mapping, output_folder):
+def rewrite_gff3_file_task(file_name, ranks, output_folder, options, stream_url=None, expected=None, pruning=None):
     """
+                rewrites one gff3 file in a worker process of the batch mode (see rewrite_gff3_file(), the HGNC mapping
+                is set by init_gff3_worker())
 
-    :param hgnc_mapping:
-    :return:
+    :param ranks:   chromosome rank table of the genome of the file (see build_chromosome_ranks())
+    :return:        tuple (dict with line counters, dict with the digests of a streamed file)
+    """
+    set_chromosome_ranks(ranks)
+    digests = {}
+    stats = rewrite_gff3_file(file_name, worker_hgnc_symbols, output_folder, options, stream_url=stream_url,
+                              expected=expected, digests=digests, hgnc_aliases=worker_hgnc_aliases, pruning=pruning)
+    return stats, digests
+
+
+def add_gff3_track_files(genome_json, track, density_tracks=False, bigbed=False):
+    """
+                links a rewritten gff3 track to its index files and adds its density tracks after it
+
+    :param genome_json:     genome JSON
+    :param track:           gff3 track of the genome JSON
+    :param density_tracks:  add the gene/transcript density tracks (see feature_density)
+    :param bigbed:          the track is pointed at the bigBed file of the transcripts instead of the gff3 file
+    """
+    file_name = track["url"]
+    track["nameIndexURL"] = file_name + NAME_INDEX_EXTENSION
+    if bigbed:
+        track["format"] = "bigbed"
+        track["type"] = "annotation"
+        track["url"] = file_name + transcript_bigbed.BIGBED_EXTENSION
+    else:
+        track["indexURL"] = file_name + ".tbi"
+    if density_tracks:
+        position = genome_json["tracks"].index(track) + 1
+        for _, extension, name in feature_density.DENSITY_KINDS:
+            genome_json["tracks"].insert(position, {"name": track.get("name", file_name) + " (" + name + ")",
+                                                    "type": "wig", "format": "bigwig",
+                                                    "url": file_name + extension})
+            position += 1
+
+
+def update_gene_file(genome_json, hgnc_mapping, output_folder, ranks, max_memory=None, threads=None, n_jobs=1,
+                     skip_files=(), stream_urls=None, retries=5, pipeline_depth=8, expected=None, hgnc_aliases=None,
+                     density_tracks=False, bigbed=False, pruning_profiles=None):
+    """
+                updates the gene names in all gff3 tracks, sorts them and compresses/indexes them for IGV
+
+    :param genome_json:     genome JSON (the index of each gff3 track is added)
+    :param hgnc_mapping:    dict mapping HGNC ids to gene symbols (or HgncSnapshot)
+    :param output_folder:   folder containing the downloaded files
+    :param ranks:           chromosome rank table used for sorting (see build_chromosome_ranks())
+    :param max_memory:      if set, the content is sorted in streaming mode (external merge sort) using at most this
+                            number of bytes for the buffered lines instead of sorting the whole file in memory
+    :param threads:         number of threads used for the compression (default: number of CPUs)
+    :param n_jobs:          if > 1, the content is partitioned by chromosome and each partition is processed (gene
+                            names updated and sorted) in a pool of n_jobs processes (max_memory is ignored)
+    :param skip_files:      gff3 files which are already up-to-date (only linked to their index in the JSON)
+    :param stream_urls:     dict mapping gff3 file names to URLs: these files are streamed from the server instead of
+                            read from the output folder
+    :param retries:         number of retries (resuming the transfer) after an interrupted stream
+    :param pipeline_depth:  if > 0, the decompression and the reading of the sorted content run on separate threads
+                            connected by queues of at most this number of chunks (0: all stages run sequentially)
+    :param expected:        dict mapping URLs to the expected digests of the streamed files (see expected_digests())
+    :param hgnc_aliases:    dict mapping UTF-8 encoded gene symbols to their aliases (see load_hgnc_aliases())
+    :param density_tracks:  write gene/transcript density tracks and add them to the JSON (see feature_density)
+    :param bigbed:          write the transcripts of each gff3 track as bigBed file and point the track at it (see
+                            transcript_bigbed)
+    :param pruning_profiles:    dict mapping gff3 file names to their pruning profiles (see collect_pruning_profiles())
+    :return:                dict mapping the URLs of the streamed files to their digests
     """
 
     print("Modifying GFF3 files (updating gene names) ...")
-    global genome_json
+    set_chromosome_ranks(ranks)
+    hgnc_symbols = encode_hgnc_mapping(hgnc_mapping)
+    stream_urls = stream_urls or {}
+    expected = expected or {}
+    pruning_profiles = pruning_profiles or {}
+    options = Gff3RewriteOptions(max_memory, threads, retries, pipeline_depth, density_tracks, bigbed)
+    stream_digests = {}
+    executor = None
+    if n_jobs > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs, initializer=init_gff3_worker,
+                                                          initargs=(hgnc_symbols,))
     # modify all gff3 track files:
-    for track in genome_json["tracks"]:
+    for track in list(genome_json["tracks"]):
         if "format" in track and track["format"] == "gff3":
 
-            print("Modifying GFF3 file '" + track["url"] + "'...")
-
-            # unzip and modify
-            n_comment_lines = 0
-            n_unmodified_lines = 0
-            n_modified_lines = 0
-            n_ignored = 0
-            comment_lines = []
-            content_lines = []
-            with gzip.open(os.path.join(output_folder, track["url"]), 'rb') as compressed_gff3:
-
-                    for line in compressed_gff3:
-                        line = line.decode('utf-8')
-                        # skip comments
-                        if line.startswith("#"):
-                            if line.strip() == "###":
-                                # ignore
-                                n_ignored += 1
-                                continue
-                            comment_lines.append(line)
-                            n_comment_lines += 1
-                            continue
-                        # detect HGNC ids
-                        annotation_column = line.split('\t')[8]
-                        if "[Source:HGNC Symbol%3BAcc:" in annotation_column:
-                            kv_list = annotation_column.split(';')
-                            idx_name = -1
-                            idx_description = -1
-                            for idx in range(len(kv_list)):
-                                if kv_list[idx].startswith("Name="):
-                                    idx_name = idx
-                                elif kv_list[idx].startswith("description="):
-                                    idx_description = idx
-                            if idx_description > -1:
-                                # extract HGNC id
-                                hgnc_id = int(kv_list[idx_description].split('[')[1].split(']')[0].split(':')[-1])
-
-                                if hgnc_id not in hgnc_mapping.keys():
-                                    print("Warning: HGNC id " + str(hgnc_id) + " not found in HGNC file!")
-                                    # store line unmodified
-                                    content_lines.append(line.split('\t'))
-                                    n_unmodified_lines += 1
-                                    continue
-                                if idx_name > -1:
-                                    kv_list[idx_name] = "Name=" + hgnc_mapping[hgnc_id]
-                                else:
-                                    kv_list.append("Name=" + hgnc_mapping[hgnc_id])
-
-                                split_line = line.split('\t')
-                                split_line[8] = ";".join(kv_list)
-                                content_lines.append(split_line)
-                                n_modified_lines += 1
-                        else:
-                            # no HGNC identifier -> store unmodified
-                            content_lines.append(line.split('\t'))
-                            n_unmodified_lines += 1
-
-            # stats
-            print("\tcomment lines: " + str(n_comment_lines))
-            print("\tunmodified lines: " + str(n_unmodified_lines))
-            print("\tmodified lines: " + str(n_modified_lines))
-            print("\tignored lines: " + str(n_ignored))
-
-            # sort content
-
-            content_lines = sort_gff3(content_lines)
-
-            # write modified file to disk
-            print("Writing modified file to disk...")
-            with open(os.path.join(output_folder, os.path.splitext(track["url"])[0]), 'wt') as modified_gff3:
-                for line in comment_lines:
-                    modified_gff3.write(line)
-                for line in content_lines:
-                    modified_gff3.write("\t".join(str(e) for e in line))
-
-            # bgzip
-            print("Compressing file...")
-            print("\tignored lines: " + str(n_ignored))
-            rc = subprocess.call(["bgzip", "-f", os.path.join(output_folder, os.path.splitext(track["url"])[0])])
-            if rc != 0:
-                raise RuntimeError("bgzip failed with return code " + str(rc) + "!")
-
-            # tabix
-            print("Indexing file...")
-            rc = subprocess.call(["tabix", "-p", "gff", os.path.join(output_folder, track["url"])])
-            if rc != 0:
-                raise RuntimeError("tabix failed with return code " + str(rc) + "!")
-            # add index to JSON
-            track["indexURL"] = track["url"] + ".tbi"
-    return
+            if track["url"] in skip_files:
+                print("GFF3 file '" + track["url"] + "' is up-to-date.")
+            else:
+                stream_url = stream_urls.get(track["url"])
+                digests = {}
+                rewrite_gff3_file(track["url"], hgnc_symbols, output_folder, options, executor=executor,
+                                  stream_url=stream_url, expected=expected.get(stream_url), digests=digests,
+                                  hgnc_aliases=hgnc_aliases, pruning=pruning_profiles.get(track["url"]))
+                if stream_url is not None:
+                    stream_digests[stream_url] = digests
+
+            add_gff3_track_files(genome_json, track, density_tracks, bigbed)
+
+    if executor is not None:
+        executor.shutdown()
+    return stream_digests
+
+
+def update_gene_files(builds, hgnc_mapping, max_memory=None, threads=None, n_jobs=1, retries=5, pipeline_depth=8,
+                      expected=None, hgnc_aliases=None, density_tracks=False, bigbed=False):
+    """
+                batch mode: updates the gff3 tracks of multiple genomes, every gff3 file is processed as one task in a
+                shared pool of n_jobs processes
+
+    :param builds:          list of dicts with the 'genome_json', 'output_folder', 'ranks', 'skip_files',
+                            'stream_urls' and 'pruning_profiles' of each genome (see update_gene_file())
+    :param hgnc_mapping:    dict mapping HGNC ids to gene symbols (or HgncSnapshot)
+    :param max_memory:      see update_gene_file()
+    :param threads:         number of compression threads per task (default: number of CPUs / n_jobs)
+    :param n_jobs:          number of worker processes
+    :param retries:         number of retries (resuming the transfer) after an interrupted stream
+    :param pipeline_depth:  see update_gene_file()
+    :param expected:        dict mapping URLs to the expected digests of the streamed files (see expected_digests())
+    :param hgnc_aliases:    dict mapping UTF-8 encoded gene symbols to their aliases (see load_hgnc_aliases())
+    :param density_tracks:  see update_gene_file()
+    :param bigbed:          see update_gene_file()
+    :return:                dict mapping the URLs of the streamed files to their digests
+    """
+    print("Modifying GFF3 files of " + str(len(builds)) + " genomes in " + str(n_jobs) + " processes...")
+    expected = expected or {}
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // n_jobs)
+    hgnc_symbols = encode_hgnc_mapping(hgnc_mapping)
+    options = Gff3RewriteOptions(max_memory, threads, retries, pipeline_depth, density_tracks, bigbed)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs, initializer=init_gff3_worker,
+                                                initargs=(hgnc_symbols, hgnc_aliases)) as executor:
+        futures = {}
+        for build in builds:
+            for track in list(build["genome_json"]["tracks"]):
+                if track.get("format") == "gff3":
+                    if track["url"] in build["skip_files"]:
+                        print("GFF3 file '" + track["url"] + "' is up-to-date.")
+                    else:
+                        stream_url = build["stream_urls"].get(track["url"])
+                        futures[executor.submit(rewrite_gff3_file_task, track["url"], build["ranks"],
+                                                build["output_folder"], options, stream_url=stream_url,
+                                                expected=expected.get(stream_url),
+                                                pruning=build["pruning_profiles"].get(track["url"]))] = (
+                            os.path.join(build["output_folder"], track["url"]), stream_url)
+                    add_gff3_track_files(build["genome_json"], track, density_tracks, bigbed)
+
+        done, not_done = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                for pending_future in not_done:
+                    pending_future.cancel()
+                raise future.exception()
+    stream_digests = {}
+    for future, (file_path, stream_url) in futures.items():
+        stats, digests = future.result()
+        print("\t" + file_path + ": " + str(stats["modified"]) + " gene names updated.")
+        if stream_url is not None:
+            stream_digests[stream_url] = digests
+    return stream_digests
 
 
-def update_alias_file(output_folder):
+def update_alias_file(genome_json, output_folder):
     """
                 Extends the alias tab file
+
+    :param genome_json:     genome JSON (with links to the local files)
+    :param output_folder:   folder containing the downloaded files
     """
     print("Updating alias file...")
     alias_file_name = genome_json["aliasURL"]
@@ -694,35 +1183,225 @@ def update_alias_file(output_folder):
                 line = line.strip() + "\tchrMT\tM\n"
             file_buffer.append(line)
 
-    with open(os.path.join(output_folder, alias_file_name), 'w') as alias_file:
+    # replace the file instead of overwriting it (may be a hardlink into the download cache)
+    with open(os.path.join(output_folder, alias_file_name + ".tmp"), 'w') as alias_file:
         alias_file.writelines(file_buffer)
+    os.replace(os.path.join(output_folder, alias_file_name + ".tmp"), os.path.join(output_folder, alias_file_name))
     return
 
 
+def get_tool_version():
+    """
+                returns the version of this tool used in the build manifest (hash of the source code of the script and
+                its modules, so every code change invalidates the previous build stages)
+
+    :return:    version string
+    """
+    hasher = hashlib.sha256()
+    for file_path in [__file__, bgzf_utils.__file__, build_manifest.__file__, download_utils.__file__,
+                      feature_density.__file__, hgnc_snapshot.__file__, locus_index.__file__, pipeline_utils.__file__,
+                      profiling.__file__, bbi_utils.__file__, transcript_bigbed.__file__]:
+        with open(file_path, 'rb') as source_file:
+            hasher.update(source_file.read())
+    return hasher.hexdigest()[:16]
+
+
+def plan_build_stages(genome_json, hgnc_file_hash, density_tracks=False, bigbed=False):
+    """
+                defines the build stages of the template with their inputs and output files (has to be called before
+                the links in the JSON are replaced by the local files)
+
+    :param genome_json:     genome JSON (template)
+    :param hgnc_file_hash:  hash of the HGNC file
+    :param density_tracks:  gene/transcript density tracks are written for the gff3 tracks
+    :param bigbed:          bigBed files are written for the gff3 tracks
+    :return:                dict mapping the stage names to dicts with the URL, the inputs and the output files
+    """
+    stages = {}
+
+    def add_stage(stage_type, url, inputs, extensions=("",)):
+        # copy the inputs (the template JSON is modified during the build)
+        inputs = copy.deepcopy(inputs)
+        inputs["url"] = url
+        stages[stage_type + ":" + url] = {"url": url, "inputs": inputs,
+                                          "outputs": [os.path.basename(url) + extension for extension in extensions]}
+
+    for key in ["fastaURL", "indexURL", "cytobandURL"]:
+        add_stage("download", genome_json[key], {})
+    add_stage("alias", genome_json["aliasURL"], {})
+    for track in genome_json["tracks"]:
+        if "format" in track and track["format"] == "gff3":
+            # sorting depends on the chromosome order (template, FASTA index and alias file)
+            extensions = ["", ".tbi", NAME_INDEX_EXTENSION]
+            if density_tracks:
+                extensions += [extension for _, extension, _ in feature_density.DENSITY_KINDS]
+            if bigbed:
+                extensions.append(transcript_bigbed.BIGBED_EXTENSION)
+            add_stage("gff3", track["url"], {"track": track, "hgnc_file": hgnc_file_hash,
+                                             "chromosomeOrder": genome_json.get("chromosomeOrder"),
+                                             "indexURL": genome_json["indexURL"], "aliasURL": genome_json["aliasURL"],
+                                             "density_tracks": density_tracks, "bigbed": bigbed},
+                      extensions)
+        else:
+            for key in ["url", "indexURL"]:
+                if key in track:
+                    add_stage("download", track[key], {})
+    return stages
+
+
+def plan_build(template_file, output, hgnc_file_hash, force=False, stream_gff3=False, density_tracks=False,
+               bigbed=False):
+    """
+                reads a template and checks which of its build stages are up-to-date
+
+    :param template_file:   file path to the json template file
+    :param output:          file path for the generated output IGV genome JSON file
+    :param hgnc_file_hash:  hash of the HGNC file
+    :param force:           rebuild all stages
+    :param stream_gff3:     stream remote gff3 tracks instead of downloading them
+    :param density_tracks:  gene/transcript density tracks are written for the gff3 tracks
+    :param bigbed:          bigBed files are written for the gff3 tracks
+    :return:                dict with the genome JSON, output folder, build manifest, stages, up-to-date stages,
+                            streamed gff3 URLs, template checksums, pruning profiles and previous build metadata of the
+                            genome
+    """
+    genome_json = parse_json(template_file)
+    output_folder = os.path.dirname(output)
+    print("Checking build manifest of '" + output + "'...")
+    manifest = build_manifest.BuildManifest(output + ".manifest.json", get_tool_version(),
+                                            build_manifest.file_hash(template_file), force)
+    stages = plan_build_stages(genome_json, hgnc_file_hash, density_tracks, bigbed)
+    checksums = collect_checksums(genome_json)
+    pruning_profiles = collect_pruning_profiles(genome_json)
+    previous_metadata = {}
+    if os.path.exists(output):
+        with open(output, 'r') as previous_output_file:
+            previous_metadata = json.load(previous_output_file).get("buildMetadata", {})
+    up_to_date = set(name for name, stage in stages.items()
+                     if manifest.is_up_to_date(name, stage["inputs"], output_folder))
+    print("\t" + str(len(up_to_date)) + " of " + str(len(stages)) + " stages are up-to-date.")
+    stream_urls = {}
+    if stream_gff3:
+        # remote gff3 tracks are read directly from the server by update_gene_file()
+        stream_urls = {os.path.basename(track["url"]): track["url"] for track in genome_json["tracks"]
+                       if track.get("format") == "gff3" and track["url"].startswith(("http://", "https://"))}
+    return {"output": output, "genome_json": genome_json, "output_folder": output_folder, "manifest": manifest,
+            "stages": stages, "up_to_date": up_to_date, "stream_urls": stream_urls, "checksums": checksums,
+            "pruning_profiles": pruning_profiles, "previous_metadata": previous_metadata,
+            "skip_files": set(os.path.basename(stages[name]["url"]) for name in up_to_date if name.startswith("gff3:")),
+            "pending_gff3": any(name.startswith("gff3:") and name not in up_to_date for name in stages)}
+
+
+def update_build_metadata(build, digests, expected):
+    """
+                adds the build metadata to the genome JSON: digests of all source files and the algorithms which were
+                verified against an expected checksum (entries of up-to-date files are kept from the previous build)
+
+    :param build:       dict of the genome (see plan_build())
+    :param digests:     dict mapping the URLs of the files downloaded/streamed in this run to their digests
+    :param expected:    dict mapping URLs to the expected digests (see expected_digests())
+    """
+    previous_sources = build["previous_metadata"].get("sources", {})
+    sources = {}
+    for name, stage in build["stages"].items():
+        url = stage["url"]
+        if name not in build["up_to_date"] and url in digests:
+            sources[url] = dict(digests[url], verified=sorted(expected.get(url, {})))
+        elif url in previous_sources:
+            sources[url] = previous_sources[url]
+    build["genome_json"]["buildMetadata"] = {"sources": sources}
+
+
 def main():
 
     args = parse_args()
+    profiler = profiling.start_from_args(args)
+
+    # load hgnc file (once for all templates)
+    hgnc_mapping = None
+    if args.no_hgnc_snapshot:
+        hgnc_file_hash = build_manifest.file_hash(args.hgnc_file)
+    else:
+        with profiling.stage("load_hgnc_file") as record:
+            hgnc_mapping = load_hgnc_snapshot(args.hgnc_file, args.hgnc_snapshot)
+            record.add(bytes_in=os.path.getsize(args.hgnc_file), lines=len(hgnc_mapping))
+        hgnc_file_hash = hgnc_mapping.source_digest.hex()
+
+    # read templates and check which build stages are up-to-date
+    builds = [plan_build(template_file, output, hgnc_file_hash, args.force, args.stream_gff3, args.density_tracks,
+                         args.bigbed)
+              for template_file, output in [(args.template_file, args.output)] + args.template]
 
-    # read template
-    parse_json(args.template_file)
+    # download files to local storage (URLs shared by multiple templates are downloaded once)
+    cache = None
+    if args.cache_dir is not None:
+        cache = download_utils.DownloadCache(args.cache_dir, args.cache_max_size)
+    downloads = []
+    checksums = {}
+    pending_stream_urls = []
+    for build in builds:
+        skip_urls = set(build["stages"][name]["url"] for name in build["up_to_date"])
+        downloads += collect_downloads(build["genome_json"], build["output_folder"],
+                                       skip_urls | set(build["stream_urls"].values()))
+        checksums.update(build["checksums"])
+        pending_stream_urls += [url for url in build["stream_urls"].values() if url not in skip_urls]
+    expected = expected_digests(set(url for url, _ in downloads) | set(pending_stream_urls), checksums,
+                                [host for host in args.checksums_hosts.split(",") if host != ""])
+    with profiling.stage("download_files") as record:
+        digests = download_files(downloads, args.download_jobs, args.download_retries, cache, record, expected)
 
-    # download files to local storage
-    output_folder = os.path.dirname(args.output)
-    download_files(output_folder)
+    pending_builds = [build for build in builds if build["pending_gff3"]]
+    for build in pending_builds:
+        # chromosome sort order
+        build["ranks"] = build_chromosome_ranks(build["genome_json"], build["output_folder"])
 
     # load hgnc file
-    hgnc_mapping = load_hgnc_file(args.hgnc_file)
+    hgnc_aliases = {}
+    if len(pending_builds) > 0:
+        if hgnc_mapping is None:
+            with profiling.stage("load_hgnc_file") as record:
+                hgnc_mapping = load_hgnc_file(args.hgnc_file)
+                record.add(bytes_in=os.path.getsize(args.hgnc_file), lines=len(hgnc_mapping))
+        with profiling.stage("load_hgnc_aliases") as record:
+            hgnc_aliases = load_hgnc_aliases(args.hgnc_file)
+            record.add(bytes_in=os.path.getsize(args.hgnc_file), lines=len(hgnc_aliases))
 
     # update gene file
-    update_gene_file(hgnc_mapping, output_folder)
+    if len(builds) > 1 and args.jobs > 1:
+        for build in builds:
+            build.setdefault("ranks", {})
+        digests.update(update_gene_files(builds, hgnc_mapping or {}, args.max_memory, args.threads, args.jobs,
+                                         args.download_retries, args.pipeline_depth, expected, hgnc_aliases,
+                                         args.density_tracks, args.bigbed))
+    else:
+        for build in builds:
+            digests.update(update_gene_file(build["genome_json"], hgnc_mapping or {}, build["output_folder"],
+                                            build.get("ranks", {}), args.max_memory, args.threads, args.jobs,
+                                            build["skip_files"], build["stream_urls"], args.download_retries,
+                                            args.pipeline_depth, expected, hgnc_aliases, args.density_tracks,
+                                            args.bigbed, build["pruning_profiles"]))
+
+    for build in builds:
+        update_build_metadata(build, digests, expected)
+
+        # update alias file
+        if not any(name.startswith("alias:") for name in build["up_to_date"]):
+            with profiling.stage("update_alias_file", build["output"]):
+                update_alias_file(build["genome_json"], build["output_folder"])
+
+        # store modified JSON file
+        with open(build["output"], 'w') as output_file:
+            print("Writing genome JSON file '" + build["output"] + "'...")
+            json.dump(build["genome_json"], output_file, indent=4)
 
-    # update alias file
-    update_alias_file(output_folder)
+        # store build manifest
+        for name, stage in build["stages"].items():
+            if name not in build["up_to_date"]:
+                build["manifest"].record(name, stage["inputs"], stage["outputs"], build["output_folder"])
+        build["manifest"].save()
 
-    # store modified JSON file
-    with open(args.output, 'w') as output_file:
-        print("Writing genome JSON file...")
-        json.dump(genome_json, output_file, indent=4)
+    if profiler is not None:
+        profiler.write_report(os.path.basename(__file__), vars(args))
 
     print("\nfinished.")
 
@@ -1,11 +1,13 @@
 """
 Converts a gff3 file to genePred
 """
+import hashlib
 import operator
 import shutil
 import stat
 import subprocess
 import sys
+import threading
 import argparse
 import os
 import tempfile
@@ -14,6 +16,7 @@ from six.moves.urllib.request import urlopen
 from six.moves.urllib.error import URLError, HTTPError
 import zipfile
 from collections import OrderedDict
+import profiling
 
 """
 sorting order for non integer chromosomes
@@ -25,6 +28,22 @@ download URL to the gff3ToGenePred tool
 """
 gff_converter_url = "http://hgdownload.cse.ucsc.edu/admin/exe/linux.x86_64/gff3ToGenePred"
 
+"""
+file name of the gff3ToGenePred tool (in $PATH or the cache directory)
+"""
+gff_converter_name = "gff3ToGenePred"
+
+"""
+default cache directory of the downloaded gff3ToGenePred tool
+"""
+default_converter_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "gff3ToGenePred")
+
+"""
+feature types of the gene entries used for the ENSG<->HGNC mapping (besides all types ending with '_gene' or
+'_gene_segment')
+"""
+gene_feature_types = {"gene", "pseudogene", "processed_transcript", "RNA"}
+
 
 def parse_args():
     """
@@ -42,6 +61,14 @@ def parse_args():
     parser.add_argument("genome_file", help="file path to a IGV .genome file which is then used to generate own .genome"
                                             + " file with the generated annotation file")
     parser.add_argument("output", help="file path for the generated output IGV .genome file")
+    parser.add_argument("--converter-cache-dir", default=default_converter_cache_dir,
+                        help="directory of the cached gff3ToGenePred tool, the tool is taken from this directory or "
+                             "$PATH and downloaded into it only if missing (Linux x86_64 only, default: %(default)s)")
+    parser.add_argument("--converter-sha256", default=None,
+                        help="expected SHA-256 of the gff3ToGenePred tool (default: the checksum recorded when the "
+                             "tool was downloaded into the cache directory, i.e. a first download without this option "
+                             "is not verified, only later changes of the cached tool are detected)")
+    profiling.add_arguments(parser)
 
     return parser.parse_args()
 
@@ -72,32 +99,68 @@ def validate_args(args):
     return True
 
 
-def read_gff_file(gff_file_path):
+def parse_attributes(attributes):
+    """
+                parses the attribute column of a gff3 line
+
+    :param attributes:  attribute column (e.g. 'ID=gene:ENSG00000000003;Name=TSPAN6')
+    :return:            dict mapping attribute names to values
+    """
+
+    return dict(entry.split('=', 1) for entry in attributes.split(';') if '=' in entry)
+
+
+def is_gene_feature(feature_type):
+    """
+                checks if a feature type (of the original gff file) belongs to a gene entry
+
+    :param feature_type:    feature type (third column)
+    :return:                True if the entry is used for the ENSG<->HGNC mapping
+    """
+
+    return feature_type in gene_feature_types or feature_type.endswith('_gene_segment') or \
+        feature_type.endswith('_gene')
+
+
+def read_gff_file(gff_file_path, valid_hgnc_ids, alt_gene_names):
     """
-                reads the gff file and returns it divided in header and content
+                reads the gff file in a single streaming pass: divides it in header and content and extracts the
+                ENSG<->HGNC mapping from the gene entries at the same time
 
     :param gff_file_path:   file path to the gff file
+    :param valid_hgnc_ids:  set with valid HGNC ids
+    :param alt_gene_names:  dict containing mapping from older/alternative gene names to valid HGNC genes
     :return:
         header              list of all header lines
         content             content of the gff file as list of lists
+        gene_mapping        tuple (ensg_to_hgnc, hgnc_to_ensg, ensg_to_non_hgnc_gene, non_hgnc_gene_to_ensg), see
+                            generate_ensg_hgnc_mapping()
     """
 
     print("reading gff file...")
 
-    with open(gff_file_path, 'r') as gff_file:
-        data = gff_file.readlines()
-
     header = []
     content = []
+    gene_attributes = []
 
     replaced_genes = 0
     replaced_transcripts = 0
 
-    for line in data:
-        if line.startswith('#'):
-            if not line.startswith('###'):
-                header.append(line.strip())
-        else:
+    with open(gff_file_path, 'r') as gff_file:
+        for line in gff_file:
+            if line.startswith('#'):
+                if not line.startswith('###'):
+                    header.append(line.strip())
+                continue
+
+            # split line by tab and parse the attributes (once per line)
+            split_line = line.strip().split('\t')
+            meta_data_dict = parse_attributes(split_line[8])
+
+            # collect gene entries for the mapping (incl. GL000xxx/KI270xxx entries)
+            if is_gene_feature(split_line[2]):
+                gene_attributes.append(meta_data_dict)
+
             # ignore GL000xxx entries:
             if line.startswith('GL000'):
                 continue
@@ -105,13 +168,8 @@ def read_gff_file(gff_file_path):
             if line.startswith('KI270'):
                 continue
 
-            # split line by tab
-            split_line = line.strip().split('\t')
-
             # treat all entries with ENST id as transcript and entries with ENSG id as genes
-            # generate temp dict with all values:
-            meta_data_dict = {entry.split('=')[0]: entry.split('=')[1] for entry in split_line[8].split(';')}
-            if "ID" in meta_data_dict.keys():
+            if "ID" in meta_data_dict:
                 if meta_data_dict["ID"].startswith("transcript:ENST") and split_line[2] != "transcript":
                     split_line[2] = "transcript"
                     replaced_transcripts += 1
@@ -126,7 +184,7 @@ def read_gff_file(gff_file_path):
     print("\t {} entries with ENSG ids are treated as genes".format(replaced_genes))
     print("\t {} entries with ENST ids are treated as transcripts".format(replaced_transcripts))
 
-    return header, content
+    return header, content, generate_ensg_hgnc_mapping(gene_attributes, valid_hgnc_ids, alt_gene_names)
 
 
 def sort_gff(content):
@@ -169,7 +227,7 @@ def write_gff(gff_file_handle, header, content):
     """
                 writes the header and content to a gff file
 
-    :param gff_file_handle:     file handle for the gff file
+    :param gff_file_handle:     file handle for the gff file (or the stdin of the converter)
     :param header:              header lines (starting with #)
     :param content:             content of the gff file (as list of lists)
     :return:
@@ -190,61 +248,161 @@ def write_gff(gff_file_handle, header, content):
     return
 
 
-def setup_gff_converter(file_handle):
+def file_sha256(file_path):
     """
-                downloads the gff converter tool from the ucsc website
+                calculates the SHA-256 checksum of a file
 
-    :param file_handle:      file handle to save the downloaded binary
-    :return:
+    :param file_path:   file path
+    :return:            hex digest
+    """
+
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def setup_gff_converter(cache_dir):
+    """
+                downloads the gff converter tool from the ucsc website into the cache directory (the checksum is
+                stored next to it): the checksum is computed from the downloaded file, it only detects later changes
+                of the cached tool (the download itself is verified by resolve_gff_converter() if a checksum is given)
+
+    :param cache_dir:   cache directory
+    :return:            file path of the downloaded tool
     """
 
     print("initializing gff3ToGenePred converter...")
 
-    # download gff converter
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    converter_path = os.path.join(cache_dir, gff_converter_name)
+
+    # download gff converter (into a temporary file, so an interrupted download is never used)
     try:
         print("downloading converter from: " + gff_converter_url)
         f = urlopen(gff_converter_url)
 
         # write downloaded file to disk
-        file_handle.write(f.read())
+        with open(converter_path + ".part", 'wb') as file_handle:
+            shutil.copyfileobj(f, file_handle)
 
     # handle errors
     except HTTPError as e:
         print("HTTP Error:", e.code, gff_converter_url)
+        raise
     except URLError as e:
         print("URL Error:", e.reason, gff_converter_url)
+        raise
 
     # make tool executable:
-    os.chmod(file_handle.name, os.stat(file_handle.name).st_mode | stat.S_IEXEC)
+    os.chmod(converter_path + ".part", os.stat(converter_path + ".part").st_mode | stat.S_IEXEC)
+    os.replace(converter_path + ".part", converter_path)
+    with open(converter_path + ".sha256", 'w') as checksum_file:
+        checksum_file.write(file_sha256(converter_path) + "\n")
+
+    return converter_path
 
 
-def run_gff_converter(converter_file_handle, gff_file_handle, gene_pred_file_handle):
+def resolve_gff_converter(cache_dir, expected_sha256=None, download=True):
+    """
+                finds the gff3ToGenePred tool: the cached tool is used if its checksum matches (expected_sha256 or the
+                checksum recorded at its download), then the tool in $PATH, otherwise the tool is downloaded into the
+                cache directory
+
+    :param cache_dir:           cache directory
+    :param expected_sha256:     optional expected SHA-256 of the tool
+    :param download:            download the tool if it is neither cached nor in $PATH
+    :return:                    file path of the tool (None if it is not found and download is False)
     """
-                converts a gff3 file into the genePred format using the gff3ToGenePred tool from the ucsc website
 
-    :param converter_file_handle:     file handle for the gff3ToGenePred binary
-    :param gff_file_handle:           file handle for the input gff3 file
-    :param gene_pred_file_handle:     file handle for the genePred output file
+    converter_path = os.path.join(cache_dir, gff_converter_name)
+    if os.path.isfile(converter_path):
+        expected = expected_sha256
+        if expected is None and os.path.isfile(converter_path + ".sha256"):
+            with open(converter_path + ".sha256", 'r') as checksum_file:
+                expected = checksum_file.read().strip()
+        if expected is None:
+            print("no checksum of cached converter found: " + converter_path)
+        elif file_sha256(converter_path) == expected.lower():
+            print("using cached converter: " + converter_path)
+            return converter_path
+        else:
+            print("checksum of cached converter does not match: " + converter_path)
+
+    path_converter = shutil.which(gff_converter_name)
+    if path_converter is not None:
+        if expected_sha256 is None or file_sha256(path_converter) == expected_sha256.lower():
+            print("using converter from $PATH: " + path_converter)
+            return path_converter
+        print("checksum of converter in $PATH does not match: " + path_converter)
+
+    if not download:
+        return None
+    converter_path = setup_gff_converter(cache_dir)
+    if expected_sha256 is None:
+        # no pinned checksum (the UCSC tool is updated in place): trusted on first use
+        print("Warning: downloaded converter is not verified (no --converter-sha256 given): " + converter_path)
+    elif file_sha256(converter_path) != expected_sha256.lower():
+        # never keep a tool which does not match
+        os.remove(converter_path)
+        os.remove(converter_path + ".sha256")
+        raise ValueError("checksum of the downloaded converter does not match: " + converter_path)
+    return converter_path
 
-    :return: gene_pred_file_handle:   containing the modified and reopened tempfile
+
+def run_gff_converter(converter_path, header, content):
     """
+                converts the gff3 content into the genePred format using the gff3ToGenePred tool from the ucsc website:
+                the sorted gff3 is written to the stdin of the tool on a separate thread while the genePred output is
+                read from its stdout (no temporary files)
 
-    print("converting gff file...")
+    :param converter_path:    file path of the gff3ToGenePred tool (see resolve_gff_converter())
+    :param header:            header lines (starting with #)
+    :param content:           sorted content of the gff file (as list of lists)
 
-    # close temporary files before converting
-    converter_file_handle.close()
-    gff_file_handle.close()
-    gene_pred_file_handle.close()
+    :return:                  generator of the genePred lines
+    """
 
-    # concat the command
-    cmd = [converter_file_handle.name, gff_file_handle.name, gene_pred_file_handle.name]
-    subprocess.call(cmd)
+    print("converting gff file...")
 
-    # delete sorted gff file and converter (not required anymore)
-    os.remove(gff_file_handle.name)
-    os.remove(converter_file_handle.name)
+    cmd = [converter_path, "/dev/stdin", "/dev/stdout"]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
 
-    return open(gene_pred_file_handle.name, "r")
+    # feed the tool while its output is consumed (a full pipe would block both sides otherwise)
+    write_errors = []
+
+    def feed():
+        try:
+            write_gff(process.stdin, header, content)
+            process.stdin.close()
+        except BrokenPipeError:
+            # the tool stopped reading, reported by its exit code
+            pass
+        except BaseException as e:
+            write_errors.append(e)
+
+    writer = threading.Thread(target=feed, name="write gff", daemon=True)
+    writer.start()
+
+    completed = False
+    try:
+        for line in process.stdout:
+            yield line
+        completed = True
+    finally:
+        if not completed:
+            # the consumer stopped early: stop the tool and unblock the writer
+            process.kill()
+        process.stdout.close()
+        writer.join()
+        return_code = process.wait()
+
+    if write_errors:
+        raise write_errors[0]
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, cmd)
 
 
 def read_hgnc_file(file_path):
@@ -307,11 +465,11 @@ def read_hgnc_file(file_path):
     return gene_to_hgnc, hgnc_to_gene, alt_gene_names
 
 
-def generate_ensg_hgnc_mapping(gff_file_path, valid_hgnc_ids, alt_gene_names):
+def generate_ensg_hgnc_mapping(gene_attributes, valid_hgnc_ids, alt_gene_names):
     """
-                extracts a ENSG<->HGNC mapping from the gff3 file
+                extracts a ENSG<->HGNC mapping from the gene entries of the gff3 file
 
-    :param gff_file_path:   file path to the gff3 file
+    :param gene_attributes: iterable of the parsed attributes of the gene entries (dicts, see read_gff_file())
     :param valid_hgnc_ids:  set with valid HGNC ids
     :param alt_gene_names:  dict containing mapping from older/alternative gene names to valid HGNC genes
     :return:
@@ -334,21 +492,8 @@ def generate_ensg_hgnc_mapping(gff_file_path, valid_hgnc_ids, alt_gene_names):
     genes_without_names = 0
     genes_without_description = 0
 
-    # read file content without header
-    with open(gff_file_path, 'r') as gff_file:
-        gff_data = [line for line in gff_file.readlines() if not line.startswith('#')]
-
-    # remove all non gene lines and split by tab
-    gff_gene_lines = [line.split('\t') for line in gff_data if
-                      line.split('\t')[2] in ["gene", "pseudogene", "processed_transcript", "RNA"]
-                      or line.split('\t')[2].endswith('_gene_segment') or line.split('\t')[2].endswith('_gene')]
-
     # extract ENSG<->HGNC mapping:
-    for line in gff_gene_lines:
-        meta_data = line[8].split(';')
-        # generate temp dict with all values:
-        meta_data_dict = {entry.split('=')[0]: entry.split('=')[1] for entry in meta_data}
-
+    for meta_data_dict in gene_attributes:
         # skip entries which do not have a ensembl gene id:
         try:
             ensg = meta_data_dict["gene_id"]
@@ -406,37 +551,30 @@ def generate_ensg_hgnc_mapping(gff_file_path, valid_hgnc_ids, alt_gene_names):
     return ensg_to_hgnc, hgnc_to_ensg, ensg_to_non_hgnc_gene, non_hgnc_gene_to_ensg
 
 
-def read_gene_pred_file(gene_pred_file_handle):
+def read_gene_pred_file(gene_pred_lines):
     """
-                reads a genePred file as list of lists
+                splits genePred lines into their columns (lazily, one line at a time)
 
-    :param gene_pred_file_handle:   file handle for the genePred input file
-    :return:                        list of lists of all entries in the file
+    :param gene_pred_lines:     iterable of genePred lines (e.g. the output of run_gff_converter())
+    :return:                    generator of lists (one per entry)
     """
 
-    print("reading genePred file...")
+    print("reading genePred data...")
 
-    raw_data = gene_pred_file_handle.readlines()
-
-    gene_pred_table = [line.split('\t') for line in raw_data]
-
-    # close and delete file
-    print("\t" + gene_pred_file_handle.name)
-    gene_pred_file_handle.close()
-    os.remove(gene_pred_file_handle.name)
-
-    return gene_pred_table
+    for line in gene_pred_lines:
+        yield line.split('\t')
 
 
 def modify_gene_pred_data(gene_pred_data, ensg_to_hgnc, hgnc_to_gene, ensg_to_non_hgnc_gene):
     """
-                modifies the genePred data to match the IGV requirements using HGNC ids
+                modifies the genePred data to match the IGV requirements using HGNC ids (lazily: each entry is
+                transformed when it is requested, the counts are printed when the input is exhausted)
 
-    :param gene_pred_data:          content of the genePred file as list of lists
+    :param gene_pred_data:          iterable of genePred entries (lists of the columns)
     :param ensg_to_hgnc:            dict with mapping ensembl id -> HGNC id
     :param hgnc_to_gene:            dict with mapping HGNC id -> gene name
     :param ensg_to_non_hgnc_gene:   dict with mapping ensembl id -> gene name (which do not have a HGNC id)
-    :return:                        list of lists with all entries of the modified genePred data
+    :return:                        generator of the modified entries (lists with the ENSG number as first column)
     """
 
     print("modifying genePred file...")
@@ -446,9 +584,6 @@ def modify_gene_pred_data(gene_pred_data, ensg_to_hgnc, hgnc_to_gene, ensg_to_no
     genes_without_name = 0
     for line in gene_pred_data:
 
-        # remove "transcript:" in front of the ENST id:
-        line[0] = line[0].split(':')[1]
-
         # get ENSG id
         ensg = line[11].split(':')[1].strip()
 
@@ -463,36 +598,36 @@ def modify_gene_pred_data(gene_pred_data, ensg_to_hgnc, hgnc_to_gene, ensg_to_no
             except KeyError:
                 gene_name = ensg
                 genes_without_name += 1
-        line[11] = gene_name
 
-        # add ENSG number as gene id in the first column
-        ensg_int = int(ensg[4:])
-        line.insert(0, str(ensg_int))
+        # ENSG number as gene id in the first column, ENST id without "transcript:" prefix, gene name instead of the
+        # ENSG id
+        yield [str(int(ensg[4:])), line[0].split(':')[1]] + line[1:11] + [gene_name] + line[12:]
 
     print("\t gene names from %i hgnc genes and %i non hgnc genes were replaced" % (hgnc_genes, non_hgnc_genes))
     print("\t %i genes do not have a name (only id)" % (genes_without_name))
 
-    return gene_pred_data
-
 
 def write_gene_pred_file(gene_pred_data, gene_pred_file_handle):
     """
-                writes a genePred file using the data (list of lists) given in gene_pred_data
+                writes a genePred file using the entries given in gene_pred_data (each entry is written as soon as it is
+                produced, so the end of a lazy pipeline is not kept in memory)
 
-    :param gene_pred_data:          list of lists containing all entries of the genePred file
+    :param gene_pred_data:          iterable of lists containing the entries of the genePred file
     :param gene_pred_file_handle:   file handle to the genePred file
-    :return:
+    :return:                        number of written entries
     """
 
     print("writing genePred file...")
 
+    n_lines = 0
     for line in gene_pred_data:
         gene_pred_file_handle.write("\t".join(line))
+        n_lines += 1
 
     # close genePred file
     gene_pred_file_handle.close()
 
-    return
+    return n_lines
 
 
 def extract_genome_file(genome_file_path, working_directory):
@@ -635,59 +770,56 @@ def main():
     if not validate_args(args):
         return
 
+    profiler = profiling.start_from_args(args)
+
+    # parse HGNC file (required for the ENSG-HGNC mapping while reading the gff file):
+    with profiling.stage("read_hgnc_file") as record:
+        gene_to_hgnc, hgnc_to_gene, alt_gene_names = read_hgnc_file(args.hgnc_file)
+        record.add(bytes_in=os.path.getsize(args.hgnc_file), lines=len(hgnc_to_gene))
+
     ### convert gff file to genePred
     temp_files = {}
-    # read input gff
-    header, content = read_gff_file(args.gff_file)
+    # read input gff and generate ENSG-HGNC mapping (single pass)
+    with profiling.stage("read_gff_file") as record:
+        header, content, (ensg_to_hgnc, hgnc_to_ensg, ensg_to_non_hgnc_gene, non_hgnc_gene_to_ensg) = \
+            read_gff_file(args.gff_file, hgnc_to_gene.keys(), alt_gene_names)
+        record.add(bytes_in=os.path.getsize(args.gff_file), lines=len(header) + len(content))
 
     # sort input gff
-    sorted_content = sort_gff(content)
-
-    # write sorted gff to file
-    temp_files["sorted gff file"] = generate_temp_file(True, 'w+t', False)
-    write_gff(temp_files["sorted gff file"], header, sorted_content)
-
-    # setup converter
-    temp_files["gff3ToGenePred binary"] = generate_temp_file(True, 'w+b', False)
-    setup_gff_converter(temp_files["gff3ToGenePred binary"])
-
-    # run converter
-    temp_files["genePred file"] = generate_temp_file(True, 'w+t', False)
-
-    temp_files["genePred file"] = run_gff_converter(temp_files["gff3ToGenePred binary"], temp_files["sorted gff file"],
-                                                    temp_files["genePred file"])
-
-    ### modify genePred file
-    # parse HGNC file:
-    gene_to_hgnc, hgnc_to_gene, alt_gene_names = read_hgnc_file(args.hgnc_file)
-
-    # generate ENSG-HGNC mapping
-    ensg_to_hgnc, hgnc_to_ensg, ensg_to_non_hgnc_gene, non_hgnc_gene_to_ensg = \
-        generate_ensg_hgnc_mapping(args.gff_file, hgnc_to_gene.keys(), alt_gene_names)
-
-    # read genePred
-    gene_pred_data = read_gene_pred_file(temp_files["genePred file"])
-
-    # modify genePred to fit IGV requirements
-    modified_gene_pred_data = modify_gene_pred_data(gene_pred_data, ensg_to_hgnc, hgnc_to_gene, ensg_to_non_hgnc_gene)
-
-    # write modified genePred data back to disk
+    with profiling.stage("sort_gff") as record:
+        sorted_content = sort_gff(content)
+        record.add(lines=len(sorted_content))
+
+    # setup converter (cached or from $PATH, downloaded only if missing)
+    with profiling.stage("setup_gff_converter") as record:
+        converter_path = resolve_gff_converter(args.converter_cache_dir, args.converter_sha256)
+        record.add(bytes_in=os.path.getsize(converter_path))
+
+    # convert, modify (IGV requirements) and write the genePred entries as a lazy pipeline: the sorted gff is piped
+    # into the tool and each entry is written as soon as the tool has converted it
+    gene_pred_data = read_gene_pred_file(run_gff_converter(converter_path, header, sorted_content))
     temp_files["genePred file modified"] = generate_temp_file(True, 'w+t', False)
-    write_gene_pred_file(modified_gene_pred_data, temp_files["genePred file modified"])
+    with profiling.stage("run_gff_converter") as record:
+        modified_gene_pred_data = modify_gene_pred_data(gene_pred_data, ensg_to_hgnc, hgnc_to_gene,
+                                                        ensg_to_non_hgnc_gene)
+        n_lines = write_gene_pred_file(modified_gene_pred_data, temp_files["genePred file modified"])
+        record.add(bytes_out=os.path.getsize(temp_files["genePred file modified"].name), lines=n_lines)
 
     ### replace gene file in genome file
-    # generate temporary directory
-    temp_files["zip extraction folder"] = tempfile.mkdtemp()
-    # extract given .genome file
-    temp_folder = extract_genome_file(args.genome_file, temp_files["zip extraction folder"])
-    # modify property.txt
-    gene_file_name, chr_alias_file_name = modify_genome_property_file(os.path.join(temp_folder, "property.txt"))
-    # modify chr alias file
-    modify_chr_alias_file(os.path.join(temp_folder, chr_alias_file_name))
-    # replace gene file
-    replace_gene_file(os.path.join(temp_folder, gene_file_name), temp_files["genePred file modified"].name)
-    # repack the files into a .genome file
-    generate_genome_file(temp_folder, args.output)
+    with profiling.stage("generate_genome_file") as record:
+        # generate temporary directory
+        temp_files["zip extraction folder"] = tempfile.mkdtemp()
+        # extract given .genome file
+        temp_folder = extract_genome_file(args.genome_file, temp_files["zip extraction folder"])
+        # modify property.txt
+        gene_file_name, chr_alias_file_name = modify_genome_property_file(os.path.join(temp_folder, "property.txt"))
+        # modify chr alias file
+        modify_chr_alias_file(os.path.join(temp_folder, chr_alias_file_name))
+        # replace gene file
+        replace_gene_file(os.path.join(temp_folder, gene_file_name), temp_files["genePred file modified"].name)
+        # repack the files into a .genome file
+        generate_genome_file(temp_folder, args.output)
+        record.add(bytes_in=os.path.getsize(args.genome_file), bytes_out=os.path.getsize(args.output))
 
     ### cleanup temp files
     # remove generated genePred file
@@ -695,6 +827,9 @@ def main():
     # remove zip extraction folder
     shutil.rmtree(temp_files["zip extraction folder"])
 
+    if profiler is not None:
+        profiler.write_report(os.path.basename(__file__), vars(args))
+
     return
 
 
@@ -0,0 +1,186 @@
+"""
+    Binary snapshot of the parsed HGNC table (HGNC id -> gene symbol) which is memory-mapped instead of re-parsing the
+    HGNC TSV file on every run
+"""
+import array
+import bisect
+import collections.abc
+import hashlib
+import mmap
+import os
+import struct
+
+"""
+snapshot header: magic, format version, byte order mark, source file modification time (ns), source file size,
+source file SHA-256 digest, number of ids (native byte order like the id and offset arrays)
+"""
+SNAPSHOT_MAGIC = b"HGNCSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("=8sIIqq32sI")
+BYTE_ORDER_MARK = 0x01020304
+
+
+def source_signature(hgnc_filepath):
+    """
+                returns the signature of the HGNC source file stored in the snapshot header
+
+    :param hgnc_filepath:   file path of the HGNC TSV file
+    :return:                tuple (modification time in ns, size, SHA-256 digest)
+    """
+    file_stat = os.stat(hgnc_filepath)
+    hasher = hashlib.sha256()
+    with open(hgnc_filepath, 'rb') as hgnc_file:
+        for chunk in iter(lambda: hgnc_file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return file_stat.st_mtime_ns, file_stat.st_size, hasher.digest()
+
+
+def write_snapshot(snapshot_path, hgnc_mapping, signature):
+    """
+                writes a snapshot file: header, sorted ids (uint32), string offsets (uint32) and the UTF-8 string table
+
+    :param snapshot_path:   file path of the snapshot
+    :param hgnc_mapping:    dict mapping HGNC ids to gene symbols
+    :param signature:       signature of the HGNC source file (see source_signature())
+    """
+    ids = array.array('I', sorted(hgnc_mapping))
+    offsets = array.array('I', [0])
+    strings = bytearray()
+    for hgnc_id in ids:
+        strings += hgnc_mapping[hgnc_id].encode('utf-8')
+        offsets.append(len(strings))
+
+    with open(snapshot_path + ".tmp", 'wb') as snapshot_file:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, BYTE_ORDER_MARK, signature[0],
+                                                 signature[1], signature[2], len(ids)))
+        snapshot_file.write(ids.tobytes())
+        snapshot_file.write(offsets.tobytes())
+        snapshot_file.write(strings)
+    os.replace(snapshot_path + ".tmp", snapshot_path)
+
+
+def read_header(snapshot_path):
+    """
+                reads the header of a snapshot file
+
+    :param snapshot_path:   file path of the snapshot
+    :return:                tuple (modification time in ns, size, SHA-256 digest) of the source file or None if the
+                            snapshot does not exist or is not compatible
+    """
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            header = snapshot_file.read(SNAPSHOT_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) != SNAPSHOT_HEADER.size:
+        return None
+    magic, version, byte_order_mark, mtime_ns, size, digest, _ = SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or byte_order_mark != BYTE_ORDER_MARK:
+        return None
+    return mtime_ns, size, digest
+
+
+def update_header_signature(snapshot_path, signature):
+    """
+                updates the source file signature in the header (source file touched but content unchanged)
+
+    :param snapshot_path:   file path of the snapshot
+    :param signature:       signature of the HGNC source file (see source_signature())
+    """
+    with open(snapshot_path, 'r+b') as snapshot_file:
+        n_ids = SNAPSHOT_HEADER.unpack(snapshot_file.read(SNAPSHOT_HEADER.size))[-1]
+        snapshot_file.seek(0)
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, BYTE_ORDER_MARK, signature[0],
+                                                 signature[1], signature[2], n_ids))
+
+
+class HgncSnapshot(collections.abc.Mapping):
+    """
+                read-only mapping HGNC id -> gene symbol backed by a memory-mapped snapshot file (ids are looked up by
+                binary search)
+
+                The object is pickled as file path only, so worker processes map the same file instead of receiving a
+                copy of the table.
+    """
+
+    def __init__(self, snapshot_path, raw=False):
+        """
+        :param snapshot_path:   file path of the snapshot
+        :param raw:             if True, the gene symbols are returned as UTF-8 encoded bytes
+        """
+        self.snapshot_path = snapshot_path
+        self.raw = raw
+        with open(snapshot_path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = SNAPSHOT_HEADER.unpack_from(self._mmap)
+        self.source_digest = header[5]
+        n_ids = header[6]
+        data = memoryview(self._mmap)
+        ids_start = SNAPSHOT_HEADER.size
+        offsets_start = ids_start + 4 * n_ids
+        strings_start = offsets_start + 4 * (n_ids + 1)
+        self._ids = data[ids_start:offsets_start].cast('I')
+        self._offsets = data[offsets_start:strings_start].cast('I')
+        self._strings = data[strings_start:]
+
+    def __reduce__(self):
+        return self.__class__, (self.snapshot_path, self.raw)
+
+    def __getitem__(self, hgnc_id):
+        symbol = self.get(hgnc_id)
+        if symbol is None:
+            raise KeyError(hgnc_id)
+        return symbol
+
+    def get(self, hgnc_id, default=None):
+        idx = bisect.bisect_left(self._ids, hgnc_id)
+        if idx == len(self._ids) or self._ids[idx] != hgnc_id:
+            return default
+        symbol = self._strings[self._offsets[idx]:self._offsets[idx + 1]].tobytes()
+        return symbol if self.raw else symbol.decode('utf-8')
+
+    def __contains__(self, hgnc_id):
+        idx = bisect.bisect_left(self._ids, hgnc_id)
+        return idx < len(self._ids) and self._ids[idx] == hgnc_id
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def raw_view(self):
+        """
+                returns a view of the same snapshot file returning the gene symbols as UTF-8 encoded bytes
+
+        :return:    HgncSnapshot
+        """
+        return self.__class__(self.snapshot_path, raw=True)
+
+
+def load_snapshot(hgnc_filepath, parse_function, snapshot_path=None):
+    """
+                loads the HGNC mapping from the snapshot of the HGNC file. The snapshot is (re)built if the source file
+                changed: if only the modification time changed, the SHA-256 hash decides if it has to be rebuilt.
+
+    :param hgnc_filepath:   file path of the HGNC TSV file
+    :param parse_function:  function parsing the HGNC TSV file into a dict mapping HGNC ids to gene symbols
+    :param snapshot_path:   file path of the snapshot (default: <hgnc_filepath>.snapshot)
+    :return:                HgncSnapshot
+    """
+    if snapshot_path is None:
+        snapshot_path = hgnc_filepath + ".snapshot"
+    file_stat = os.stat(hgnc_filepath)
+    header = read_header(snapshot_path)
+    if header is not None and header[:2] == (file_stat.st_mtime_ns, file_stat.st_size):
+        return HgncSnapshot(snapshot_path)
+
+    signature = source_signature(hgnc_filepath)
+    if header is not None and header[1:] == signature[1:]:
+        # only the modification time changed
+        update_header_signature(snapshot_path, signature)
+        return HgncSnapshot(snapshot_path)
+
+    print("\tBuilding HGNC snapshot " + snapshot_path + "...")
+    write_snapshot(snapshot_path, parse_function(hgnc_filepath), signature)
+    return HgncSnapshot(snapshot_path)
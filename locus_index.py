@@ -0,0 +1,167 @@
+"""
+    Gene name -> locus search index: sorted text file (one line per name and chromosome) which supports case-insensitive
+    prefix lookups by binary search without loading the file
+"""
+import mmap
+import os
+import urllib.parse
+
+"""
+feature types which carry neither a gene nor a transcript id (most of the lines, skipped by the writer)
+"""
+CHILD_FEATURE_TYPES = frozenset([b"exon", b"CDS", b"five_prime_UTR", b"three_prime_UTR"])
+
+"""
+attributes of gene features whose values are indexed with the collapsed span of the gene
+"""
+GENE_ATTRIBUTES = [b"Name=", b"gene_id="]
+
+"""
+attributes of transcript features whose values are indexed with the span of the transcript
+"""
+TRANSCRIPT_ATTRIBUTES = [b"transcript_id="]
+
+
+def attribute_value(attributes, key):
+    """
+                extracts the value of an attribute of a gff3 line
+
+    :param attributes:  part of a gff3 line containing the attribute column (bytes, e.g. everything after the end
+                        position)
+    :param key:         attribute name incl. '=' (bytes)
+    :return:            decoded value (bytes) or None if the attribute is missing
+    """
+    start = attributes.find(b";" + key)
+    if start < 0:
+        start = attributes.find(b"\t" + key)
+        if start < 0:
+            return None
+    start += len(key) + 1
+    end = attributes.find(b";", start)
+    if end < 0:
+        end = len(attributes)
+    return urllib.parse.unquote_to_bytes(attributes[start:end].rstrip(b"\r\n"))
+
+
+class LocusIndexBuilder:
+    """
+                collects the names of the gene and transcript features while a gff3 file is written: HGNC symbols
+                (Name), Ensembl gene ids with the span of the gene (collapsed per chromosome if a name occurs in several
+                features), Ensembl transcript ids with the span of the transcript and the HGNC alias/previous symbols of
+                the genes
+    """
+
+    def __init__(self, hgnc_aliases=None):
+        """
+        :param hgnc_aliases:    dict mapping UTF-8 encoded gene symbols to lists of alias symbols (bytes)
+        """
+        self.hgnc_aliases = hgnc_aliases or {}
+        self.spans = {}
+
+    def _add_span(self, name, chromosome, start, end):
+        span = self.spans.get((name, chromosome))
+        if span is None:
+            self.spans[(name, chromosome)] = [start, end]
+        else:
+            span[0] = min(span[0], start)
+            span[1] = max(span[1], end)
+
+    def add(self, chromosome, start, end, attributes):
+        """
+                adds a gff3 content line (lines without gene or transcript id are ignored)
+
+        :param chromosome:  chromosome (bytes)
+        :param start:       start position (1-based)
+        :param end:         end position (inclusive)
+        :param attributes:  part of the line containing the attribute column (bytes)
+        """
+        if b"gene_id=" in attributes:
+            for key in GENE_ATTRIBUTES:
+                name = attribute_value(attributes, key)
+                if name:
+                    self._add_span(name, chromosome, start, end)
+                    if key == b"Name=":
+                        for alias in self.hgnc_aliases.get(name, ()):
+                            self._add_span(alias, chromosome, start, end)
+        elif b"transcript_id=" in attributes:
+            for key in TRANSCRIPT_ATTRIBUTES:
+                name = attribute_value(attributes, key)
+                if name:
+                    self._add_span(name, chromosome, start, end)
+
+    def write(self, file_path):
+        """
+                writes the index sorted by the upper case names (lines '<NAME>\t<name>\t<chromosome>\t<start>\t<end>')
+
+        :param file_path:   file path of the index
+        :return:            number of entries
+        """
+        entries = sorted((name.upper(), name, chromosome, span[0], span[1])
+                         for (name, chromosome), span in self.spans.items())
+        with open(file_path, 'wb') as index_file:
+            for key, name, chromosome, start, end in entries:
+                index_file.write(b"\t".join([key, name, chromosome, str(start).encode(), str(end).encode()]) + b"\n")
+        return len(entries)
+
+
+class LocusIndex:
+    """
+                memory-mapped locus index (see LocusIndexBuilder) with prefix lookups by binary search
+    """
+
+    def __init__(self, file_path):
+        """
+        :param file_path:   file path of the index
+        """
+        with open(file_path, 'rb') as index_file:
+            if os.fstat(index_file.fileno()).st_size == 0:
+                # empty files can not be mapped
+                self._mmap = b""
+            else:
+                self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _first_line(self, key):
+        # start of the first line whose key is >= the given key
+        low, high = 0, len(self._mmap)
+        while low < high:
+            middle = (low + high) // 2
+            line_start = self._mmap.rfind(b"\n", 0, middle) + 1
+            if self._mmap[line_start:self._mmap.find(b"\t", line_start)] < key:
+                low = self._mmap.find(b"\n", middle) + 1
+            else:
+                high = line_start
+        return low
+
+    def search(self, prefix, limit=20):
+        """
+                returns all names starting with the given prefix (case-insensitive)
+
+        :param prefix:  name prefix (str)
+        :param limit:   maximal number of results (None: all)
+        :return:        list of tuples (name, chromosome, start, end) sorted by name
+        """
+        key = prefix.encode("utf-8").upper()
+        results = []
+        position = self._first_line(key)
+        while position < len(self._mmap) and (limit is None or len(results) < limit):
+            line_end = self._mmap.find(b"\n", position)
+            fields = self._mmap[position:line_end].split(b"\t")
+            if not fields[0].startswith(key):
+                break
+            results.append((fields[1].decode("utf-8"), fields[2].decode("utf-8"), int(fields[3]), int(fields[4])))
+            position = line_end + 1
+        return results
+
+    def lookup(self, name):
+        """
+                returns the loci of a name (case-insensitive exact match)
+
+        :param name:    gene/transcript name or id
+        :return:        list of tuples (name, chromosome, start, end)
+        """
+        key = name.encode("utf-8").upper()
+        return [result for result in self.search(name, None) if result[0].encode("utf-8").upper() == key]
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
@@ -0,0 +1,180 @@
+"""
+    Helper functions to run the stages of a streaming pipeline on separate threads connected by bounded queues
+"""
+import io
+import queue
+import threading
+import time
+
+"""
+size of the chunks which are read from a (decompressing) file object
+"""
+CHUNK_SIZE = 1024 * 1024
+
+"""
+number of lines which are passed through a queue as one batch
+"""
+BATCH_SIZE = 4096
+
+"""
+marker of the end of a queue
+"""
+END_OF_QUEUE = object()
+
+
+class StageStats:
+    """
+                queue-wait statistics of the pipeline stages: a stage waiting for its output queue is faster than its
+                consumer, a consumer waiting for the queue is faster than the stage
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage, key, value):
+        """
+                adds a value to a counter of a stage
+
+        :param stage:   stage name
+        :param key:     counter name ('items', 'put_wait_seconds', 'get_wait_seconds', 'busy_seconds')
+        :param value:   value added to the counter
+        """
+        with self._lock:
+            counters = self.stages.setdefault(stage, {"items": 0, "put_wait_seconds": 0.0, "get_wait_seconds": 0.0,
+                                                      "busy_seconds": 0.0})
+            counters[key] += value
+
+    def report(self):
+        """
+                returns the statistics rounded for printing/JSON
+
+        :return:    dict mapping stage names to counters
+        """
+        return {stage: {key: round(value, 6) if isinstance(value, float) else value for key, value in counters.items()}
+                for stage, counters in self.stages.items()}
+
+    def print_report(self):
+        """
+                prints the statistics of all stages
+        """
+        for stage, counters in self.report().items():
+            print("\t" + stage + ": " + str(counters["items"]) + " chunks, busy "
+                  + str(round(counters["busy_seconds"], 2)) + " s, waiting for consumer "
+                  + str(round(counters["put_wait_seconds"], 2)) + " s, consumer waiting "
+                  + str(round(counters["get_wait_seconds"], 2)) + " s")
+
+
+def threaded_stage(iterable, name, stats, max_items=8):
+    """
+                runs a producer (iterable) on a separate thread and yields its items through a bounded queue (the
+                producer blocks if the consumer is slower: backpressure keeps the memory usage bounded)
+
+    :param iterable:    producer, iterated on the stage thread
+    :param name:        stage name used in the statistics
+    :param stats:       StageStats
+    :param max_items:   maximal number of items in the queue
+    :return:            generator of the produced items
+    """
+    items = queue.Queue(maxsize=max_items)
+    stop_event = threading.Event()
+
+    def put(item):
+        start = time.perf_counter()
+        while not stop_event.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        stats.add(name, "put_wait_seconds", time.perf_counter() - start)
+
+    def produce():
+        try:
+            iterator = iter(iterable)
+            while not stop_event.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats.add(name, "busy_seconds", time.perf_counter() - start)
+                stats.add(name, "items", 1)
+                put(item)
+            put(END_OF_QUEUE)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, name="pipeline " + name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            item = items.get()
+            stats.add(name, "get_wait_seconds", time.perf_counter() - start)
+            if item is END_OF_QUEUE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # stop the producer if the consumer stops early
+        stop_event.set()
+        thread.join()
+
+
+def read_chunks(file_object, chunk_size=CHUNK_SIZE):
+    """
+                reads a file object in chunks (e.g. decompressed data of a gzip file)
+
+    :param file_object:     file object opened in binary mode
+    :param chunk_size:      size of the chunks
+    :return:                generator of chunks (bytes)
+    """
+    return iter(lambda: file_object.read(chunk_size), b"")
+
+
+def split_lines(chunks):
+    """
+                splits a sequence of chunks into lines (incl. line break)
+
+    :param chunks:  iterable of chunks (bytes)
+    :return:        generator of lines (bytes)
+    """
+    remainder = b""
+    for chunk in chunks:
+        data = remainder + chunk
+        end = data.rfind(b"\n") + 1
+        yield from io.BytesIO(data[:end])
+        remainder = data[end:]
+    if remainder:
+        yield remainder
+
+
+def batched(iterable, batch_size=BATCH_SIZE):
+    """
+                groups the items of an iterable into lists
+
+    :param iterable:    iterable
+    :param batch_size:  maximal number of items per list
+    :return:            generator of lists
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def unbatched(batches):
+    """
+                flattens a sequence of lists
+
+    :param batches:     iterable of lists
+    :return:            generator of the items
+    """
+    for batch in batches:
+        yield from batch
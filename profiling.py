@@ -0,0 +1,275 @@
+"""
+    Per-stage instrumentation (wall time, CPU time, peak RSS, bytes in/out, lines per second) written as JSON report,
+    with an optional cProfile/tracemalloc hook for a single stage
+"""
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+
+"""
+profiler used by stage() (set by start(), no instrumentation if None)
+"""
+active_profiler = None
+
+"""
+supported profiling modes of the single stage hook
+"""
+PROFILE_MODES = ["cprofile", "tracemalloc"]
+
+
+def read_peak_rss():
+    """
+                returns the peak resident set size of this process (since the last reset_peak_rss())
+
+    :return:    peak RSS in bytes
+    """
+    try:
+        with open("/proc/self/status", 'r') as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # fallback: peak since process start (kB on Linux, bytes on macOS)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def reset_peak_rss():
+    """
+                resets the peak resident set size of this process (Linux only, otherwise the peak since the process
+                start is reported)
+    """
+    try:
+        with open("/proc/self/clear_refs", 'w') as clear_refs_file:
+            clear_refs_file.write("5")
+    except OSError:
+        pass
+
+
+class StageRecord:
+    """
+                measurements of one run of a stage, the stage code adds its bytes in/out and line counts
+    """
+
+    def __init__(self, name, detail=None, parent=None):
+        """
+        :param name:    stage name
+        :param detail:  optional detail (e.g. the processed file)
+        :param parent:  name of the enclosing stage
+        """
+        self.name = name
+        self.detail = detail
+        self.parent = parent
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.lines = 0
+        self.peak_rss = 0
+        self.extra = {}
+
+    def add(self, bytes_in=0, bytes_out=0, lines=0):
+        """
+                adds processed data to the stage
+
+        :param bytes_in:    number of bytes read
+        :param bytes_out:   number of bytes written
+        :param lines:       number of lines processed
+        """
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.lines += lines
+
+
+class StageProfiler:
+    """
+                collects the measurements of all stages and writes them to a JSON report
+
+                Stages can be nested, the peak RSS of a nested stage is also taken into account for the enclosing
+                stages.
+    """
+
+    def __init__(self, report_path, profile_stage=None, profile_mode="cprofile"):
+        """
+        :param report_path:     file path of the JSON report
+        :param profile_stage:   name of a stage which is profiled in detail (cProfile or tracemalloc)
+        :param profile_mode:    'cprofile' or 'tracemalloc'
+        """
+        self.report_path = report_path
+        self.profile_stage = profile_stage
+        self.profile_mode = profile_mode
+        self.stages = []
+        self._stack = []
+        # number of runs of the profiled stage (one profile file per run)
+        self._profile_runs = 0
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def _update_peak_rss(self):
+        peak_rss = read_peak_rss()
+        for record in self._stack:
+            record.peak_rss = max(record.peak_rss, peak_rss)
+
+    @contextlib.contextmanager
+    def stage(self, name, detail=None):
+        """
+                measures a stage
+
+        :param name:    stage name
+        :param detail:  optional detail (e.g. the processed file)
+        :return:        context manager yielding the StageRecord
+        """
+        record = StageRecord(name, detail, self._stack[-1].name if len(self._stack) > 0 else None)
+        self._update_peak_rss()
+        reset_peak_rss()
+        self._stack.append(record)
+
+        profiler = None
+        if name == self.profile_stage:
+            if self.profile_mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                tracemalloc.start(25)
+
+        start_children = os.times()
+        start_cpu = time.process_time()
+        start_wall = time.perf_counter()
+        try:
+            yield record
+        finally:
+            wall_seconds = time.perf_counter() - start_wall
+            cpu_seconds = time.process_time() - start_cpu
+            end_children = os.times()
+            self._update_peak_rss()
+            self._stack.pop()
+
+            result = {
+                "stage": name,
+                "detail": detail,
+                "parent": record.parent,
+                "wall_seconds": round(wall_seconds, 6),
+                "cpu_seconds": round(cpu_seconds, 6),
+                # CPU time of finished child processes (e.g. worker processes, external tools)
+                "children_cpu_seconds": round(end_children.children_user + end_children.children_system
+                                              - start_children.children_user - start_children.children_system, 6),
+                "peak_rss_bytes": record.peak_rss,
+                "bytes_in": record.bytes_in,
+                "bytes_out": record.bytes_out,
+                "lines": record.lines,
+                "bytes_in_per_second": round(record.bytes_in / wall_seconds, 1) if wall_seconds > 0 else None,
+                "lines_per_second": round(record.lines / wall_seconds, 1) if wall_seconds > 0 else None
+            }
+            result.update(record.extra)
+            if name == self.profile_stage:
+                result["profile"] = self._stop_profiler(profiler, name)
+            self.stages.append(result)
+
+    def _stop_profiler(self, profiler, name):
+        if profiler is not None:
+            profiler.disable()
+            self._profile_runs += 1
+            profile_path = self.report_path + "." + name + "." + str(self._profile_runs) + ".prof"
+            profiler.dump_stats(profile_path)
+            # top functions by cumulative time
+            statistics = pstats.Stats(profiler)
+            top_functions = sorted(statistics.stats.items(), key=lambda item: item[1][3], reverse=True)[:20]
+            return {"mode": "cprofile", "file": profile_path,
+                    "top_cumulative": [{"function": file_name + ":" + str(line) + "(" + function + ")",
+                                        "calls": calls, "total_seconds": round(total_time, 6),
+                                        "cumulative_seconds": round(cumulative_time, 6)}
+                                       for (file_name, line, function), (_, calls, total_time, cumulative_time, _)
+                                       in top_functions]}
+
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"mode": "tracemalloc", "peak_traced_bytes": peak_traced,
+                "top_allocations": [{"location": str(statistic.traceback[0]), "size_bytes": statistic.size,
+                                     "count": statistic.count}
+                                    for statistic in snapshot.statistics("lineno")[:20]]}
+
+    def write_report(self, script, arguments):
+        """
+                writes the JSON report
+
+        :param script:      name of the instrumented script
+        :param arguments:   dict of the command line arguments
+        """
+        report = {
+            "script": script,
+            "arguments": arguments,
+            "total": {"wall_seconds": round(time.perf_counter() - self._start_wall, 6),
+                      "cpu_seconds": round(time.process_time() - self._start_cpu, 6),
+                      "peak_rss_bytes": max([stage["peak_rss_bytes"] for stage in self.stages] + [read_peak_rss()])},
+            "stages": self.stages
+        }
+        with open(self.report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2, default=str)
+        print("Profile report written to '" + self.report_path + "'.")
+
+
+def start(report_path, profile_stage=None, profile_mode="cprofile"):
+    """
+                activates the instrumentation of all stages
+
+    :param report_path:     file path of the JSON report
+    :param profile_stage:   name of a stage which is profiled in detail (cProfile or tracemalloc)
+    :param profile_mode:    'cprofile' or 'tracemalloc'
+    :return:                StageProfiler
+    """
+    global active_profiler
+    active_profiler = StageProfiler(report_path, profile_stage, profile_mode)
+    return active_profiler
+
+
+@contextlib.contextmanager
+def stage(name, detail=None):
+    """
+                measures a stage if the instrumentation is active (see start())
+
+    :param name:    stage name
+    :param detail:  optional detail (e.g. the processed file)
+    :return:        context manager yielding a StageRecord
+    """
+    if active_profiler is None:
+        yield StageRecord(name, detail)
+    else:
+        with active_profiler.stage(name, detail) as record:
+            yield record
+
+
+def add_arguments(parser):
+    """
+                adds the instrumentation options to an argument parser
+
+    :param parser:  argparse.ArgumentParser
+    """
+    parser.add_argument("--profile-report", default=None,
+                        help="write a JSON report with wall time, CPU time, peak RSS, bytes in/out and lines per "
+                             "second of every stage to this file")
+    parser.add_argument("--profile-stage", default=None,
+                        help="profile the stage with this name in detail (requires --profile-report), only this "
+                             "process is profiled: work done in worker processes (e.g. the per-chromosome "
+                             "processing of process_gff3_partitions() with --jobs > 1) is not captured")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default="cprofile",
+                        help="profiler used for --profile-stage: 'cprofile' (each run of the stage written to "
+                             "<report>.<stage>.<run>.prof) or 'tracemalloc' (top allocations in the report) "
+                             "(default: cprofile)")
+
+
+def start_from_args(args):
+    """
+                activates the instrumentation if requested on the command line (see add_arguments())
+
+    :param args:    parsed arguments
+    :return:        StageProfiler or None
+    """
+    if args.profile_report is None:
+        return None
+    return start(args.profile_report, args.profile_stage, args.profile_mode)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scripts of the repository are plain modules in its root folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,114 @@
+"""
+    Local HTTP stand-in server for the download tests: serves in-memory files (keep-alive, Range requests) and injects
+    faults (dropped connections, ignored Range headers, temporary HTTP errors, corrupt data)
+"""
+import http.server
+import re
+import socket
+import threading
+
+
+class StandInServer:
+    """
+                HTTP/1.1 server on a free local port running on a background thread (use as context manager)
+    """
+
+    def __init__(self, files):
+        """
+        :param files:   dict mapping URL paths (e.g. '/data/file.gz') to their content (bytes)
+        """
+        # URL path -> content
+        self.files = dict(files)
+        # URL path -> list of byte counts: the next responses for the path are cut off after this many body bytes
+        self.disconnects = {}
+        # URL path -> list of status codes which are answered before the file is served
+        self.errors = {}
+        # URL paths whose content is served with one flipped byte (in the middle of the file)
+        self.corrupt = set()
+        # answer Range requests with the complete file (status 200)
+        self.ignore_range = False
+        # list of tuples (URL path, Range header or None) of all received requests
+        self.requests = []
+        # number of accepted TCP connections
+        self.n_connections = 0
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path):
+        """
+        :param path:    URL path of a file
+        :return:        URL of the file on this server
+        """
+        return "http://127.0.0.1:" + str(self._server.server_address[1]) + path
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stand_in._lock:
+                    stand_in.n_connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                range_header = self.headers.get("Range")
+                with stand_in._lock:
+                    stand_in.requests.append((self.path, range_header))
+                    errors = stand_in.errors.get(self.path, [])
+                    error = errors.pop(0) if errors else None
+                    disconnects = stand_in.disconnects.get(self.path, [])
+                    disconnect = disconnects.pop(0) if disconnects else None
+                content = stand_in.files.get(self.path)
+                if content is not None and self.path in stand_in.corrupt:
+                    middle = len(content) // 2
+                    content = content[:middle] + bytes([content[middle] ^ 0xff]) + content[middle + 1:]
+                if error is not None or content is None:
+                    self.send_response(error or 404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                match = re.fullmatch(r"bytes=(\d+)-", range_header or "")
+                if match is not None and not stand_in.ignore_range:
+                    offset = int(match.group(1))
+                    if offset >= len(content):
+                        self.send_response(416)
+                        self.send_header("Content-Range", "bytes */" + str(len(content)))
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range",
+                                     "bytes " + str(offset) + "-" + str(len(content) - 1) + "/" + str(len(content)))
+                    body = content[offset:]
+                else:
+                    self.send_response(200)
+                    body = content
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                if disconnect is None:
+                    self.wfile.write(body)
+                    return
+                # drop the connection in the middle of the body
+                self.wfile.write(body[:disconnect])
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+                self.close_connection = True
+
+        return Handler
@@ -0,0 +1,219 @@
+"""
+    Tests of the BGZF writer and tabix indexer: the output is checked against the BGZF and tabix specifications (block
+    headers, EOF marker, bins, chunks and linear index recomputed from the block layout) and against tabix if installed
+"""
+import gzip
+import os
+import random
+import shutil
+import struct
+import subprocess
+import tempfile
+import unittest
+import zlib
+
+import bgzf_utils
+import generate_igv_genome
+
+"""
+sorted gff3 test data: short features and long features spanning several tabix windows and bins on three sequences
+"""
+COMMENT_LINES = [b"##gff-version 3\n", b"##sequence-region   1 1 248956422\n"]
+
+
+def content_lines():
+    rng = random.Random(5)
+    lines = []
+    for chromosome in [b"1", b"2", b"X"]:
+        starts = sorted(rng.randint(1, 3000000) for _ in range(4000))
+        for idx, start in enumerate(starts):
+            length = rng.choice([1, 50, 2000, 20000, 300000])
+            lines.append(b"\t".join([chromosome, b"ensembl", b"exon", str(start).encode(),
+                                     str(start + length - 1).encode(), b".", b"+", b".",
+                                     b"Parent=transcript:ENST%011d;rank=%d\n" % (idx, idx % 7)]))
+    return lines
+
+
+def read_blocks(data):
+    """
+    :param data:    BGZF file content
+    :return:        list of tuples (compressed offset, block, uncompressed data) of all blocks
+    """
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        magic, flags, xlen, subfield, subfield_length, bsize = struct.unpack_from("<3sB6xH2sHH", data, offset)
+        if (magic, flags, xlen, subfield, subfield_length) != (b"\x1f\x8b\x08", 4, 6, b"BC", 2):
+            raise ValueError("invalid BGZF block header at " + str(offset))
+        block = data[offset:offset + bsize + 1]
+        crc, isize = struct.unpack_from("<II", block, len(block) - 8)
+        uncompressed = zlib.decompress(block[18:-8], -15)
+        if len(uncompressed) != isize or zlib.crc32(uncompressed) != crc:
+            raise ValueError("invalid BGZF block at " + str(offset))
+        blocks.append((offset, block, uncompressed))
+        offset += len(block)
+    return blocks
+
+
+def read_tabix_index(data):
+    """
+    :param data:    uncompressed .tbi file content
+    :return:        tuple (header values, sequence names, list of (bins: dict bin -> list of chunks, linear index))
+    """
+    magic, n_ref, fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack_from("<4s8i", data)
+    if magic != b"TBI\1":
+        raise ValueError("invalid tabix magic")
+    offset = 36
+    names = data[offset:offset + l_nm].split(b"\0")[:-1]
+    offset += l_nm
+    references = []
+    for _ in range(n_ref):
+        (n_bin,) = struct.unpack_from("<i", data, offset)
+        offset += 4
+        bins = {}
+        for _ in range(n_bin):
+            bin_number, n_chunk = struct.unpack_from("<Ii", data, offset)
+            offset += 8
+            bins[bin_number] = [struct.unpack_from("<QQ", data, offset + 16 * idx) for idx in range(n_chunk)]
+            offset += 16 * n_chunk
+        (n_intv,) = struct.unpack_from("<i", data, offset)
+        offset += 4
+        linear = list(struct.unpack_from("<" + str(n_intv) + "Q", data, offset))
+        offset += 8 * n_intv
+        references.append((bins, linear))
+    return (fmt, col_seq, col_beg, col_end, chr(meta), skip), names, references
+
+
+class BgzfWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.folder, "genes.gff3.gz")
+        self.lines = content_lines()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, lines=None, threads=4):
+        generate_igv_genome.write_bgzf_gff3(self.file_path, COMMENT_LINES, self.lines if lines is None else lines,
+                                            threads)
+        with open(self.file_path, 'rb') as bgzf_file, open(self.file_path + ".tbi", 'rb') as index_file:
+            return bgzf_file.read(), index_file.read()
+
+    def test_gzip_compatible(self):
+        data, _ = self.write()
+        self.assertEqual(gzip.decompress(data), b"".join(COMMENT_LINES + self.lines))
+
+    def test_blocks(self):
+        data, _ = self.write()
+        blocks = read_blocks(data)
+        self.assertGreater(len(blocks), 10)
+        for _, block, uncompressed in blocks[:-2]:
+            self.assertLessEqual(len(block), 65536)
+            self.assertEqual(len(uncompressed), bgzf_utils.BLOCK_SIZE)
+        # the last block is the empty EOF marker of htslib
+        self.assertEqual(blocks[-1][1], bgzf_utils.EOF_BLOCK)
+        self.assertEqual(blocks[-1][2], b"")
+        self.assertEqual(len(blocks[-2][2]), len(b"".join(COMMENT_LINES + self.lines)) % bgzf_utils.BLOCK_SIZE)
+
+    def test_incompressible_block(self):
+        data = random.Random(1).randbytes(3 * bgzf_utils.BLOCK_SIZE)
+        with bgzf_utils.BgzfWriter(self.file_path, threads=2) as writer:
+            writer.write(data)
+        with open(self.file_path, 'rb') as bgzf_file:
+            blocks = read_blocks(bgzf_file.read())
+        self.assertEqual(b"".join(uncompressed for _, _, uncompressed in blocks), data)
+        self.assertTrue(all(len(block) <= 65536 for _, block, _ in blocks))
+
+    def test_reg2bin(self):
+        # values of the SAM/tabix specification
+        self.assertEqual(bgzf_utils.reg2bin(0, 1), 4681)
+        self.assertEqual(bgzf_utils.reg2bin(1 << 14, (1 << 14) + 1), 4682)
+        self.assertEqual(bgzf_utils.reg2bin(0, (1 << 14) + 1), 585)
+        self.assertEqual(bgzf_utils.reg2bin(0, (1 << 17) + 1), 73)
+        self.assertEqual(bgzf_utils.reg2bin(0, (1 << 20) + 1), 9)
+        self.assertEqual(bgzf_utils.reg2bin(0, (1 << 23) + 1), 1)
+        self.assertEqual(bgzf_utils.reg2bin(0, (1 << 26) + 1), 0)
+
+    def test_tabix_index(self):
+        data, index_data = self.write()
+        header, names, references = read_tabix_index(gzip.decompress(index_data))
+        self.assertEqual(header, (0, 1, 4, 5, '#', 0))
+        self.assertEqual(names, [b"1", b"2", b"X"])
+
+        # virtual offset of each record from the block layout (all blocks except the last are full)
+        block_offsets = [offset for offset, _, _ in read_blocks(data)]
+        position = len(b"".join(COMMENT_LINES))
+        records = {name: [] for name in names}
+        for line in self.lines:
+            split_line = line.split(b"\t")
+            start_offset = block_offsets[position // bgzf_utils.BLOCK_SIZE] << 16 | position % bgzf_utils.BLOCK_SIZE
+            position += len(line)
+            end_offset = block_offsets[position // bgzf_utils.BLOCK_SIZE] << 16 | position % bgzf_utils.BLOCK_SIZE
+            records[split_line[0]].append((int(split_line[3]) - 1, int(split_line[4]), start_offset, end_offset))
+
+        for name, (bins, linear) in zip(names, references):
+            # pseudo bin: file range and number of records
+            (meta_begin, meta_end), (n_mapped, n_unmapped) = bins.pop(bgzf_utils.TABIX_PSEUDO_BIN)
+            self.assertEqual((meta_begin, meta_end), (records[name][0][2], records[name][-1][3]))
+            self.assertEqual((n_mapped, n_unmapped), (len(records[name]), 0))
+
+            expected_linear = []
+            for beg, end, start_offset, end_offset in records[name]:
+                # every record is in a chunk of its bin
+                chunks = bins[bgzf_utils.reg2bin(beg, end)]
+                self.assertTrue(any(chunk_beg <= start_offset and end_offset <= chunk_end
+                                    for chunk_beg, chunk_end in chunks))
+                for window in range(beg >> 14, ((end - 1) >> 14) + 1):
+                    expected_linear.extend([None] * (window + 1 - len(expected_linear)))
+                    if expected_linear[window] is None:
+                        expected_linear[window] = start_offset
+            self.assertEqual(set(bins), {bgzf_utils.reg2bin(beg, end) for beg, end, _, _ in records[name]})
+            # chunks are sorted and do not overlap
+            for chunks in bins.values():
+                self.assertEqual(chunks, sorted(chunks))
+                self.assertTrue(all(chunks[idx][1] <= chunks[idx + 1][0] for idx in range(len(chunks) - 1)))
+            # windows without records get the offset of the previous window
+            for window, offset in enumerate(expected_linear):
+                if offset is None:
+                    expected_linear[window] = expected_linear[window - 1] if window > 0 else 0
+            self.assertEqual(linear, expected_linear)
+
+    @unittest.skipUnless(shutil.which("tabix"), "tabix not installed")
+    def test_tabix_queries(self):
+        self.write()
+        for name, beg, end in [("1", 1, 20000), ("2", 1000000, 1100000), ("X", 2999000, 4000000)]:
+            output = subprocess.run(["tabix", self.file_path, name + ":" + str(beg) + "-" + str(end)],
+                                    stdout=subprocess.PIPE, check=True).stdout
+            expected = [line for line in self.lines if line.split(b"\t")[0] == name.encode()
+                        and int(line.split(b"\t")[3]) <= end and int(line.split(b"\t")[4]) >= beg]
+            self.assertEqual(output, b"".join(expected))
+
+    def test_failed_write(self):
+        # the source file is kept and no incomplete output looking like a valid BGZF file is left
+        with open(self.file_path, 'wb') as source_file:
+            source_file.write(b"source")
+
+        def failing_lines():
+            yield from self.lines[:5000]
+            raise ValueError("failed")
+        with self.assertRaises(ValueError):
+            self.write(failing_lines())
+        self.assertEqual(os.listdir(self.folder), ["genes.gff3.gz"])
+        with open(self.file_path, 'rb') as source_file:
+            self.assertEqual(source_file.read(), b"source")
+
+    def test_replace_hardlink(self):
+        # the source may be a hardlink into the download cache which must not be changed
+        cached_path = os.path.join(self.folder, "cached.gz")
+        with open(cached_path, 'wb') as cached_file:
+            cached_file.write(b"cached")
+        os.link(cached_path, self.file_path)
+        self.write()
+        with open(cached_path, 'rb') as cached_file:
+            self.assertEqual(cached_file.read(), b"cached")
+        self.assertEqual(sorted(os.listdir(self.folder)), ["cached.gz", "genes.gff3.gz", "genes.gff3.gz.tbi"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+    Tests of the checksum verification (template md5/sha256 fields and Ensembl CHECKSUMS files) against a local
+    stand-in server which serves corrupt data
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import download_utils
+import generate_igv_genome
+from http_stand_in import StandInServer
+
+"""
+content of the served test file
+"""
+CONTENT = bytes(range(256)) * 5000
+
+"""
+gff3 file which is streamed into the gene name update
+"""
+GFF3_CONTENT = gzip.compress(b"##gff-version 3\n"
+                             b"1\tensembl\tgene\t100\t200\t.\t+\t.\tID=gene:ENSG1;gene_id=ENSG1;Name=A\n")
+
+
+def bsd_sum(data):
+    """
+                BSD sum of data as written in the CHECKSUMS files of the Ensembl FTP server
+
+    :param data:    bytes
+    :return:        CHECKSUMS line of a file 'file.bin'
+    """
+    output = subprocess.run(download_utils.BSD_SUM_COMMAND, input=data, stdout=subprocess.PIPE, check=True).stdout
+    checksum, n_blocks = output.split()[:2]
+    return b"%05d %5d file.bin\n" % (int(checksum), int(n_blocks))
+
+
+class DownloadChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.folder, "file.bin")
+        self.server = StandInServer({"/data/file.bin": CONTENT}).__enter__()
+        self.url = self.server.url("/data/file.bin")
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        shutil.rmtree(self.folder)
+
+    def assert_rejected(self, expected_digests):
+        with self.assertRaises(download_utils.ChecksumError):
+            download_utils.download_file(self.url, self.file_path, expected_digests=expected_digests)
+        # neither the target file nor a partial file which would be resumed is kept
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_template_checksums(self):
+        expected_digests = {"sha256": hashlib.sha256(CONTENT).hexdigest(), "md5": hashlib.md5(CONTENT).hexdigest()}
+        result = download_utils.download_file(self.url, self.file_path, expected_digests=expected_digests)
+        self.assertEqual(result.digests, expected_digests)
+
+    def test_sha256_mismatch(self):
+        self.server.corrupt.add("/data/file.bin")
+        self.assert_rejected({"sha256": hashlib.sha256(CONTENT).hexdigest()})
+
+    def test_md5_mismatch(self):
+        self.server.corrupt.add("/data/file.bin")
+        self.assert_rejected({"md5": hashlib.md5(CONTENT).hexdigest().upper()})
+
+    def test_mismatch_after_resume(self):
+        # the part received before the interruption is hashed again when the download is resumed
+        self.server.disconnects["/data/file.bin"] = [1000]
+        self.server.corrupt.add("/data/file.bin")
+        with self.assertRaises(download_utils.ChecksumError):
+            download_utils.download_file(self.url, self.file_path, backoff=0.01,
+                                         expected_digests={"sha256": hashlib.sha256(CONTENT).hexdigest()})
+
+    def test_cache_mismatch(self):
+        cache = download_utils.DownloadCache(os.path.join(self.folder, "cache"))
+        self.server.corrupt.add("/data/file.bin")
+        with self.assertRaises(download_utils.ChecksumError):
+            cache.fetch(self.url, self.file_path, expected_digests={"sha256": hashlib.sha256(CONTENT).hexdigest()})
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertEqual(os.listdir(os.path.join(self.folder, "cache", "objects")), [])
+
+
+@unittest.skipUnless(download_utils.bsd_sum_available(), "'sum' tool not installed")
+class ChecksumsFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.server = StandInServer({"/data/file.bin": CONTENT, "/data/CHECKSUMS": bsd_sum(CONTENT),
+                                     "/other/file.bin": CONTENT}).__enter__()
+        self.url = self.server.url("/data/file.bin")
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        shutil.rmtree(self.folder)
+
+    def download(self, urls):
+        expected = generate_igv_genome.expected_digests(urls, {}, ["127.0.0.1"])
+        return generate_igv_genome.download_files([(url, os.path.join(self.folder, url.split("/")[-2]))
+                                                   for url in urls], expected=expected)
+
+    def test_checksums_file(self):
+        hasher = download_utils.BsdSum()
+        hasher.update(CONTENT)
+        digests = self.download([self.url])
+        self.assertEqual(digests[self.url][download_utils.BsdSum.name], hasher.hexdigest())
+
+    def test_checksums_file_mismatch(self):
+        self.server.corrupt.add("/data/file.bin")
+        with self.assertRaises(download_utils.ChecksumError):
+            self.download([self.url])
+
+    def test_streamed_checksums_file_mismatch(self):
+        self.server.corrupt.add("/data/file.bin")
+        expected_digests = generate_igv_genome.expected_digests([self.url], {}, ["127.0.0.1"])[self.url]
+        with download_utils.StreamingDownload(self.url, hash_algorithms=list(expected_digests)) as stream:
+            stream.read()
+            with self.assertRaises(download_utils.ChecksumError):
+                download_utils.verify_digests(self.url, stream.digests(), expected_digests)
+
+    def test_missing_checksums_file(self):
+        # no CHECKSUMS file in the directory: downloaded without verification
+        self.server.corrupt.add("/other/file.bin")
+        url = self.server.url("/other/file.bin")
+        self.assertEqual(generate_igv_genome.expected_digests([url], {}, ["127.0.0.1"]), {url: {}})
+        self.download([url])
+
+    def test_failing_checksums_file(self):
+        self.server.errors["/data/CHECKSUMS"] = [503]
+        self.assertEqual(generate_igv_genome.expected_digests([self.url], {}, ["127.0.0.1"]), {self.url: {}})
+
+    def test_unreachable_checksums_file(self):
+        url = "http://localhost:1/data/file.bin"
+        self.assertEqual(generate_igv_genome.expected_digests([url], {}, ["localhost"]), {url: {}})
+
+
+class StreamingChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.server = StandInServer({"/data/file.bin": CONTENT, "/data/genes.gff3.gz": GFF3_CONTENT}).__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        shutil.rmtree(self.folder)
+
+    def test_streaming_digests(self):
+        self.server.disconnects["/data/file.bin"] = [1000]
+        with download_utils.StreamingDownload(self.server.url("/data/file.bin"), backoff=0.01,
+                                              hash_algorithms=["sha256", "md5"]) as stream:
+            self.assertEqual(stream.read(), CONTENT)
+            download_utils.verify_digests(stream.url, stream.digests(), {"sha256": hashlib.sha256(CONTENT).hexdigest(),
+                                                                         "md5": hashlib.md5(CONTENT).hexdigest()})
+
+    def test_streaming_mismatch(self):
+        self.server.corrupt.add("/data/file.bin")
+        with download_utils.StreamingDownload(self.server.url("/data/file.bin"), hash_algorithms=["sha256"]) as stream:
+            stream.read()
+            with self.assertRaises(download_utils.ChecksumError):
+                download_utils.verify_digests(stream.url, stream.digests(),
+                                              {"sha256": hashlib.sha256(CONTENT).hexdigest()})
+
+    def rewrite_streamed_gff3(self, expected):
+        generate_igv_genome.set_chromosome_ranks({"1": 0})
+        digests = {}
+        generate_igv_genome.rewrite_gff3_file("genes.gff3.gz", {}, self.folder,
+                                              stream_url=self.server.url("/data/genes.gff3.gz"), expected=expected,
+                                              digests=digests)
+        return digests
+
+    def test_streamed_gff3(self):
+        digests = self.rewrite_streamed_gff3({"sha256": hashlib.sha256(GFF3_CONTENT).hexdigest()})
+        self.assertEqual(digests["sha256"], hashlib.sha256(GFF3_CONTENT).hexdigest())
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "genes.gff3.gz.tbi")))
+
+    def test_streamed_gff3_mismatch(self):
+        # the stream is verified before the output is written
+        with self.assertRaises(download_utils.ChecksumError):
+            self.rewrite_streamed_gff3({"sha256": hashlib.sha256(b"other").hexdigest()})
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+    Tests of the resumable downloads against a local stand-in server which drops connections
+"""
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import download_utils
+from http_stand_in import StandInServer
+
+"""
+content of the served test file (several download chunks, not compressible)
+"""
+CONTENT = random.Random(42).randbytes(3 * download_utils.CHUNK_SIZE + 12345)
+
+
+class DownloadFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.folder, "file.bin")
+        self.server = StandInServer({"/file.bin": CONTENT}).__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        shutil.rmtree(self.folder)
+
+    def download(self, **kwargs):
+        return download_utils.download_file(self.server.url("/file.bin"), self.file_path, backoff=0.01, **kwargs)
+
+    def read_file(self):
+        with open(self.file_path, 'rb') as downloaded_file:
+            return downloaded_file.read()
+
+    def test_resume_after_disconnects(self):
+        self.server.disconnects["/file.bin"] = [1000, 2 * download_utils.CHUNK_SIZE, 5]
+        result = self.download(hash_algorithms=("sha256",))
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertFalse(os.path.exists(self.file_path + ".part"))
+        self.assertEqual(result.digests["sha256"], hashlib.sha256(CONTENT).hexdigest())
+        # every retry continues at the end of the partial file
+        ranges = [range_header for _, range_header in self.server.requests]
+        self.assertEqual(ranges[0], None)
+        self.assertEqual(len(ranges), 4)
+        self.assertTrue(all(range_header.startswith("bytes=") for range_header in ranges[1:]))
+
+    def test_restart_if_range_is_ignored(self):
+        self.server.disconnects["/file.bin"] = [download_utils.CHUNK_SIZE + 10]
+        self.server.ignore_range = True
+        result = self.download(hash_algorithms=("md5",))
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertEqual(result.digests["md5"], hashlib.md5(CONTENT).hexdigest())
+
+    def test_complete_partial_file(self):
+        with open(self.file_path + ".part", 'wb') as part_file:
+            part_file.write(CONTENT)
+        self.download()
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertEqual(self.server.requests, [("/file.bin", "bytes=" + str(len(CONTENT)) + "-")])
+
+    def test_retry_temporary_errors(self):
+        self.server.errors["/file.bin"] = [503, 500]
+        self.download()
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_fail_after_retries(self):
+        self.server.disconnects["/file.bin"] = [10, 10, 10]
+        with self.assertRaises(download_utils.DownloadError):
+            self.download(retries=1)
+        # the partial file is kept for a later resume
+        self.assertTrue(os.path.exists(self.file_path + ".part"))
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_permanent_error(self):
+        self.server.errors["/file.bin"] = [404]
+        with self.assertRaises(download_utils.DownloadError):
+            self.download()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_keep_alive(self):
+        pool = download_utils.ConnectionPool()
+        try:
+            for _ in range(3):
+                self.download(pool=pool)
+        finally:
+            pool.close()
+        self.assertEqual(self.read_file(), CONTENT)
+        self.assertEqual(self.server.n_connections, 1)
+
+
+class StreamingDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer({"/file.bin": CONTENT}).__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+
+    def stream(self, **kwargs):
+        with download_utils.StreamingDownload(self.server.url("/file.bin"), backoff=0.01, **kwargs) as stream:
+            return stream.read(), stream.digests()
+
+    def test_resume_after_disconnects(self):
+        self.server.disconnects["/file.bin"] = [1000, download_utils.CHUNK_SIZE + 1, 1]
+        data, digests = self.stream(hash_algorithms=("sha256",))
+        self.assertEqual(data, CONTENT)
+        self.assertEqual(digests["sha256"], hashlib.sha256(CONTENT).hexdigest())
+        self.assertTrue(all(range_header is not None for _, range_header in self.server.requests[1:]))
+
+    def test_skip_streamed_data_if_range_is_ignored(self):
+        self.server.disconnects["/file.bin"] = [download_utils.CHUNK_SIZE + 10]
+        self.server.ignore_range = True
+        data, _ = self.stream()
+        self.assertEqual(data, CONTENT)
+
+    def test_fail_after_retries(self):
+        self.server.errors["/file.bin"] = [503, 503, 503]
+        with self.assertRaises(download_utils.DownloadError):
+            self.stream(retries=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+    Tests of the pruning profiles of the gff3 tracks on an Ensembl-like slice: no remaining line refers to a removed
+    parent, the attributes needed by IGV (ID, Parent, Name) are kept by every profile
+"""
+import copy
+import os
+import unittest
+
+import generate_igv_genome
+
+"""
+test data folder
+"""
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+"""
+pruning profiles of the test template: feature types only, attributes only (none and some allowed), both
+"""
+PROFILES = {
+    "feature_types.gff3.gz": {"featureTypes": ["gene", "mRNA", "exon", "CDS"]},
+    "no_attributes.gff3.gz": {"attributes": []},
+    "attributes.gff3.gz": {"attributes": ["biotype", "description"]},
+    "both.gff3.gz": {"featureTypes": ["gene", "ncRNA_gene", "mRNA", "lnc_RNA", "exon"], "attributes": ["biotype"]},
+}
+
+"""
+transcript with two parents (one of them a dropped feature type) and its exon
+"""
+MULTI_PARENT_LINES = [
+    b"2\tensembl_havana\tpseudogene\t1501\t1800\t.\t+\t.\tID=gene:ENSG00000900007;Name=TESTF\n",
+    b"2\tensembl_havana\tmRNA\t1501\t1800\t.\t+\t.\tID=transcript:ENST00000900008;"
+    b"Parent=gene:ENSG00000900007,gene:ENSG00000900003;Name=TESTF-201\n",
+    b"2\tensembl_havana\texon\t1501\t1800\t.\t+\t.\tParent=transcript:ENST00000900008;Name=ENSE00000900014\n",
+]
+
+
+def attribute_values(line):
+    """
+    :return:    dict mapping the attribute names of a gff3 content line to their values
+    """
+    return dict(attribute.split(b"=", 1) for attribute in line.rstrip(b"\n").split(b"\t")[8].split(b";")
+                if attribute != b".")
+
+
+def slice_lines():
+    """
+    :return:    content lines of the Ensembl-like slice (bytes)
+    """
+    with open(os.path.join(DATA_DIR, "ensembl_slice.gff3"), 'rb') as gff3_file:
+        return [line for line in gff3_file if not line.startswith(b"#")]
+
+
+class PruningTest(unittest.TestCase):
+
+    def setUp(self):
+        self.genome_json = {"tracks": [{"name": name, "format": "gff3", "url": "https://ftp.ensembl.org/" + name,
+                                        "pruning": copy.deepcopy(profile)} for name, profile in PROFILES.items()]
+                                      + [{"name": "Cytobands", "format": "bed", "url": "https://hgdownload/cyto.bed"}]}
+        self.profiles = generate_igv_genome.collect_pruning_profiles(self.genome_json)
+        self.lines = slice_lines()
+
+    def prune(self, lines, profile):
+        """
+        :return:    tuple (remaining lines, stats, pruned bytes) of the pruning of the lines with the profile
+        """
+        stats = {"pruned": 0}
+        pruned_bytes = {"features": 0, "attributes": 0}
+        if profile["feature_types"] is not None:
+            lines = generate_igv_genome.prune_gff3_features(lines, profile["feature_types"], stats, pruned_bytes)
+        pruned_lines = []
+        for line in lines:
+            if profile["attributes"] is not None:
+                line, n_bytes = generate_igv_genome.prune_gff3_attributes(line, profile["attributes"])
+                pruned_bytes["attributes"] += n_bytes
+            pruned_lines.append(line)
+        return pruned_lines, stats, pruned_bytes
+
+    def assert_no_dangling_parents(self, lines):
+        ids = set()
+        for line in lines:
+            attributes = attribute_values(line)
+            for parent in attributes.get(b"Parent", b"").split(b","):
+                if parent:
+                    self.assertIn(parent, ids, line)
+            if b"ID" in attributes:
+                ids.add(attributes[b"ID"])
+
+    def test_collect_profiles(self):
+        self.assertEqual(set(self.profiles), set(PROFILES))
+        self.assertTrue(all("pruning" not in track for track in self.genome_json["tracks"]))
+        self.assertEqual(self.profiles["feature_types.gff3.gz"],
+                         {"feature_types": frozenset([b"gene", b"mRNA", b"exon", b"CDS"]), "attributes": None})
+        # the required attributes are always allowed
+        self.assertIsNone(self.profiles["no_attributes.gff3.gz"]["feature_types"])
+        self.assertEqual(self.profiles["no_attributes.gff3.gz"]["attributes"],
+                         frozenset(generate_igv_genome.REQUIRED_ATTRIBUTES))
+        self.assertEqual(self.profiles["attributes.gff3.gz"]["attributes"],
+                         frozenset(generate_igv_genome.REQUIRED_ATTRIBUTES + [b"biotype", b"description"]))
+
+    def test_invalid_profiles(self):
+        for track in [{"format": "bed", "url": "cyto.bed", "pruning": {"attributes": []}},
+                      {"format": "gff3", "url": "genes.gff3.gz", "pruning": {"attributes": [], "sources": []}}]:
+            with self.assertRaises(ValueError):
+                generate_igv_genome.collect_pruning_profiles({"tracks": [track]})
+
+    def test_no_dangling_parents(self):
+        self.assert_no_dangling_parents(self.lines)
+        for name, profile in self.profiles.items():
+            lines, stats, pruned_bytes = self.prune(self.lines + MULTI_PARENT_LINES, profile)
+            self.assert_no_dangling_parents(lines)
+            self.assertEqual(stats["pruned"], len(self.lines) + len(MULTI_PARENT_LINES) - len(lines), name)
+            if profile["feature_types"] is not None:
+                self.assertTrue(all(line.split(b"\t")[2] in profile["feature_types"] for line in lines))
+
+    def test_dropped_descendants(self):
+        lines, stats, pruned_bytes = self.prune(self.lines + MULTI_PARENT_LINES, self.profiles["feature_types.gff3.gz"])
+        names = [attribute_values(line).get(b"Name") for line in lines]
+        # the lncRNA gene with its transcript and exons, the retained intron transcript with its exons, UTRs and the
+        # chromosome line are dropped
+        self.assertNotIn(b"TESTE", names)
+        self.assertNotIn(b"TESTA-202", names)
+        self.assertNotIn(b"ENSE00000900004", names)
+        self.assertEqual(stats["pruned"], 14)
+        self.assertEqual(pruned_bytes["features"],
+                         sum(map(len, self.lines + MULTI_PARENT_LINES)) - sum(map(len, lines))
+                         - pruned_bytes["attributes"])
+        # the transcript with a dropped parent keeps its other parent, its exon is kept
+        self.assertEqual(lines[-2], MULTI_PARENT_LINES[1].replace(b"gene:ENSG00000900007,", b""))
+        self.assertEqual(pruned_bytes["attributes"], len(b"gene:ENSG00000900007,"))
+        self.assertEqual(lines[-1], MULTI_PARENT_LINES[2])
+
+    def test_required_attributes(self):
+        for name, profile in self.profiles.items():
+            lines, _, _ = self.prune(self.lines, profile)
+            original_lines = iter(self.lines)
+            for line in lines:
+                # (lines are kept in input order)
+                original_line = next(original for original in original_lines
+                                     if original.split(b"\t")[:8] == line.split(b"\t")[:8])
+                original = attribute_values(original_line)
+                pruned = attribute_values(line)
+                for attribute in [b"ID", b"Parent", b"Name"]:
+                    self.assertEqual(pruned.get(attribute), original.get(attribute), name)
+                if profile["attributes"] is not None:
+                    self.assertTrue(set(pruned) <= profile["attributes"], name)
+                    self.assertTrue(line.endswith(b"\n"))
+                else:
+                    self.assertEqual(line, original_line)
+
+    def test_line_without_allowed_attributes(self):
+        line = b"1\tensembl_havana\tbiological_region\t1\t100\t.\t+\t.\tlogic_name=cpg\n"
+        self.assertEqual(generate_igv_genome.prune_gff3_attributes(line, self.profiles["no_attributes.gff3.gz"]
+                                                                   ["attributes"]),
+                         (b"1\tensembl_havana\tbiological_region\t1\t100\t.\t+\t.\t.\n", len(b"logic_name=cpg") - 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
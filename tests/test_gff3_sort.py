@@ -0,0 +1,189 @@
+"""
+    Tests of the gff3 sorting: chromosome rank table and sort key, external merge sort (sorted runs spilled to disk)
+    against the in-memory sort
+"""
+import gzip
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import generate_igv_genome
+
+"""
+chromosome ranks of the test data
+"""
+RANKS = {"1": 0, "2": 1, "X": 2}
+
+"""
+Ensembl sequence names of GRCh38 (incl. scaffolds) and the FASTA index / alias file of the UCSC hg38 genome
+"""
+ENSEMBL_NAMES = [str(number) for number in range(1, 23)] + ["X", "Y", "MT", "GL000009.2", "GL000194.1",
+                                                            "KI270706.1", "KI270728.1"]
+FASTA_INDEX = "".join(name + "\t1000\t100\t60\t61\n" for name in
+                      ["chr" + str(number) for number in range(1, 23)]
+                      + ["chrX", "chrY", "chrM", "chr14_GL000009v2_random", "chr14_GL000194v1_random",
+                         "chr1_KI270706v1_random", "chr16_KI270728v1_random", "chrEBV"])
+ALIASES = ("#hg38\tensembl\n"
+           "chr14_GL000009v2_random\tGL000009.2\n"
+           "chr14_GL000194v1_random\tGL000194.1\n"
+           "chr1_KI270706v1_random\tKI270706.1\n"
+           "chr16_KI270728v1_random\tKI270728.1\n")
+
+
+def baseline_chromosome_key(chromosome):
+    """
+                chromosome order of the original sort_gff3() (before the rank table)
+    """
+    if chromosome in {"X": 100, "Y": 101, "MT": 102}:
+        return {"X": 100, "Y": 101, "MT": 102}[chromosome]
+    if chromosome.startswith("GL0"):
+        return 10000 + int(float(chromosome[2:]) * 10)
+    if chromosome.startswith("KI"):
+        return 20000 + int(float(chromosome[2:]) * 10)
+    return int(chromosome)
+
+
+def content_lines(n_lines, seed=3):
+    """
+    :return:    unsorted gff3 content lines (bytes) with many equal sort keys (same chromosome and start) and lines
+                on a sequence without rank
+    """
+    rng = random.Random(seed)
+    lines = []
+    for idx in range(n_lines):
+        chromosome = rng.choice([b"1", b"2", b"X", b"KI270728.1"])
+        start = rng.randint(1, 50)
+        lines.append(b"\t".join([chromosome, b"ensembl", b"exon", str(start).encode(), str(start + 100).encode(),
+                                 b".", b"+", b".", b"Parent=transcript:ENST%011d\n" % idx]))
+    return lines
+
+
+class ExternalMergeSortTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        generate_igv_genome.set_chromosome_ranks(RANKS)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_merge_sorted_runs(self):
+        lines = content_lines(3000)
+        run_files = generate_igv_genome.write_sorted_runs(iter(lines), 20000, self.folder)
+        self.assertGreater(len(run_files), 10)
+        merged = list(generate_igv_genome.merge_sorted_runs(run_files))
+        # byte-identical to the stable in-memory sort (lines with equal keys keep their input order)
+        self.assertEqual(merged, sorted(lines, key=generate_igv_genome.gff3_sort_key))
+        self.assertEqual(merged, generate_igv_genome.sort_gff3(list(lines)))
+        # the run files are removed
+        self.assertTrue(all(run_file.closed for run_file in run_files))
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_stop_merging_early(self):
+        run_files = generate_igv_genome.write_sorted_runs(iter(content_lines(1000)), 5000, self.folder)
+        merged = generate_igv_genome.merge_sorted_runs(run_files)
+        next(merged)
+        merged.close()
+        self.assertTrue(all(run_file.closed for run_file in run_files))
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_single_run(self):
+        lines = content_lines(100)
+        run_files = generate_igv_genome.write_sorted_runs(iter(lines), 1 << 30, self.folder)
+        self.assertEqual(len(run_files), 1)
+        self.assertEqual(list(generate_igv_genome.merge_sorted_runs(run_files)),
+                         sorted(lines, key=generate_igv_genome.gff3_sort_key))
+
+    def rewrite(self, name, max_memory, pipeline_depth):
+        folder = os.path.join(self.folder, name)
+        os.mkdir(folder)
+        comment_lines = [b"##gff-version 3\n", b"#!genome-build GRCh38.p14\n"]
+        lines = content_lines(2000)
+        with gzip.open(os.path.join(folder, "genes.gff3.gz"), 'wb') as gff3_file:
+            gff3_file.writelines(comment_lines + lines[:1000] + [b"###\n", b"#!comment between the features\n"]
+                                 + lines[1000:])
+        options = generate_igv_genome.Gff3RewriteOptions(max_memory=max_memory, threads=2,
+                                                         pipeline_depth=pipeline_depth)
+        generate_igv_genome.rewrite_gff3_file("genes.gff3.gz", {}, folder, options)
+        with gzip.open(os.path.join(folder, "genes.gff3.gz"), 'rb') as gff3_file:
+            return gff3_file.read(), sorted(os.listdir(folder))
+
+    def test_rewrite_with_sorted_runs(self):
+        expected, expected_files = self.rewrite("in_memory", None, 0)
+        self.assertTrue(expected.startswith(b"##gff-version 3\n#!genome-build GRCh38.p14\n"
+                                            b"#!comment between the features\n"))
+        for pipeline_depth in [0, 8]:
+            output, files = self.rewrite("runs_" + str(pipeline_depth), 10000, pipeline_depth)
+            self.assertEqual(output, expected)
+            # no run files are left in the output folder
+            self.assertEqual(files, expected_files)
+
+
+class ChromosomeRankTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "GRCh38_template.json"),
+                  'r') as template_file:
+            self.genome_json = {"chromosomeOrder": json.load(template_file)["chromosomeOrder"],
+                                "indexURL": "hg38.fa.fai", "aliasURL": "hg38_alias.tab"}
+        with open(os.path.join(self.folder, "hg38.fa.fai"), 'w') as fai_file:
+            fai_file.write(FASTA_INDEX)
+        with open(os.path.join(self.folder, "hg38_alias.tab"), 'w') as alias_file:
+            alias_file.write(ALIASES)
+        self.ranks = generate_igv_genome.build_chromosome_ranks(self.genome_json, self.folder)
+        generate_igv_genome.set_chromosome_ranks(self.ranks)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_baseline_order(self):
+        shuffled = list(ENSEMBL_NAMES)
+        random.Random(1).shuffle(shuffled)
+        self.assertEqual(sorted(shuffled, key=generate_igv_genome.chromosome_rank), ENSEMBL_NAMES)
+        self.assertEqual(sorted(shuffled, key=baseline_chromosome_key), ENSEMBL_NAMES)
+        # UCSC names and aliases share the rank of the Ensembl name
+        for ucsc_name, ensembl_name in [("chr1", "1"), ("chrX", "X"), ("chrM", "MT"), ("M", "MT"),
+                                        ("chr16_KI270728v1_random", "KI270728.1")]:
+            self.assertEqual(generate_igv_genome.chromosome_rank(ucsc_name),
+                             generate_igv_genome.chromosome_rank(ensembl_name))
+        self.assertEqual(generate_igv_genome.chromosome_rank(b"MT"), generate_igv_genome.chromosome_rank("MT"))
+
+    def test_unknown_chromosomes(self):
+        known_ranks = [generate_igv_genome.chromosome_rank(name) for name in ENSEMBL_NAMES + ["chrEBV"]]
+        unknown = ["scaffold_7", "KN196487.1", "HSCHR6_MHC_COX"]
+        ranks = [generate_igv_genome.chromosome_rank(name) for name in unknown]
+        self.assertGreater(min(ranks), max(known_ranks))
+        self.assertTrue(all(rank >= generate_igv_genome.UNKNOWN_CHROMOSOME_RANK for rank in ranks))
+        self.assertEqual(len(set(ranks)), len(ranks))
+        self.assertEqual(generate_igv_genome.chromosome_rank(b"scaffold_7"), ranks[0])
+
+        # independent of the order in which the names are seen, of the process and its hash seed
+        generate_igv_genome.set_chromosome_ranks(self.ranks)
+        self.assertEqual([generate_igv_genome.chromosome_rank(name) for name in reversed(unknown)],
+                         list(reversed(ranks)))
+        output = subprocess.run([sys.executable, "-c", "import generate_igv_genome as g; "
+                                 "print([g.chromosome_rank(name) for name in " + repr(unknown) + "])"],
+                                cwd=os.path.dirname(generate_igv_genome.__file__), stdout=subprocess.PIPE,
+                                env=dict(os.environ, PYTHONHASHSEED="123"), check=True).stdout
+        self.assertEqual(output.decode().strip(), str(ranks))
+
+    def test_sort_key_bounds(self):
+        def line(chromosome, start):
+            return chromosome + b"\tensembl\tgene\t" + str(start).encode() + b"\t" + str(start).encode() + b"\n"
+        for chromosome, next_chromosome in [(b"1", b"2"), (b"MT", b"GL000009.2"), (b"KI270728.1", b"scaffold_7")]:
+            rank = generate_igv_genome.chromosome_rank(chromosome)
+            key = generate_igv_genome.gff3_sort_key(line(chromosome, (1 << 32) - 1))
+            # the start does not overflow into the rank bits
+            self.assertEqual(key >> 32, rank)
+            self.assertLess(key, generate_igv_genome.gff3_sort_key(line(next_chromosome, 1)))
+            self.assertLess(generate_igv_genome.gff3_sort_key(line(chromosome, (1 << 32) - 2)), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+    Tests of the gff3ToGenePred handling of the legacy converter (cache lookup, download, checksum verification and the
+    pipe through the tool) with stand-in tools (shell scripts) instead of the UCSC binary
+"""
+import hashlib
+import io
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import unittest
+
+from http_stand_in import StandInServer
+
+try:
+    import gff_to_genepred_converter as converter
+except ImportError:
+    converter = None
+
+"""
+test data folder
+"""
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+"""
+stand-in tools: copies its input to its output, fails without reading its input, fails after reading its input
+"""
+ECHO_TOOL = "#!/bin/sh\ncat \"$1\" > \"$2\"\n"
+FAILING_TOOL = "#!/bin/sh\nexit 3\n"
+FAILING_READING_TOOL = "#!/bin/sh\ncat \"$1\" > /dev/null\nexit 2\n"
+
+
+@unittest.skipIf(converter is None, "dependencies of gff_to_genepred_converter not installed")
+class GffConverterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.header, content, _ = converter.read_gff_file(os.path.join(DATA_DIR, "ensembl_slice.gff3"), set(), {})
+        self.content = converter.sort_gff(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_tool(self, folder, script):
+        os.makedirs(folder, exist_ok=True)
+        tool_path = os.path.join(folder, converter.gff_converter_name)
+        with open(tool_path, 'w') as tool_file:
+            tool_file.write(script)
+        os.chmod(tool_path, os.stat(tool_path).st_mode | stat.S_IEXEC)
+        return tool_path
+
+    def test_pipe(self):
+        tool_path = self.write_tool(self.folder, ECHO_TOOL)
+        expected = io.StringIO()
+        converter.write_gff(expected, self.header, self.content)
+        lines = list(converter.run_gff_converter(tool_path, self.header, self.content))
+        self.assertEqual("".join(lines), expected.getvalue())
+        rows = list(converter.read_gene_pred_file(lines))
+        self.assertEqual(rows[-1], lines[-1].split('\t'))
+
+    def test_stop_reading_early(self):
+        tool_path = self.write_tool(self.folder, ECHO_TOOL)
+        lines = converter.run_gff_converter(tool_path, self.header, self.content * 1000)
+        next(lines)
+        # the tool and the writer thread are stopped
+        lines.close()
+
+    def test_failing_tool(self):
+        for script in [FAILING_TOOL, FAILING_READING_TOOL]:
+            tool_path = self.write_tool(self.folder, script)
+            with self.assertRaises(subprocess.CalledProcessError):
+                list(converter.run_gff_converter(tool_path, self.header, self.content))
+
+    def test_cached_tool(self):
+        cache_dir = os.path.join(self.folder, "cache")
+        tool_path = self.write_tool(cache_dir, ECHO_TOOL)
+        with open(tool_path + ".sha256", 'w') as checksum_file:
+            checksum_file.write(converter.file_sha256(tool_path) + "\n")
+        self.assertEqual(converter.resolve_gff_converter(cache_dir, download=False), tool_path)
+        self.assertEqual(converter.resolve_gff_converter(cache_dir, converter.file_sha256(tool_path).upper(),
+                                                         download=False), tool_path)
+
+    def test_modified_cached_tool(self):
+        cache_dir = os.path.join(self.folder, "cache")
+        tool_path = self.write_tool(cache_dir, ECHO_TOOL)
+        with open(tool_path + ".sha256", 'w') as checksum_file:
+            checksum_file.write(converter.file_sha256(tool_path) + "\n")
+        self.write_tool(cache_dir, FAILING_TOOL)
+        path = os.environ["PATH"]
+        os.environ["PATH"] = os.path.join(self.folder, "empty")
+        try:
+            self.assertIsNone(converter.resolve_gff_converter(cache_dir, download=False))
+        finally:
+            os.environ["PATH"] = path
+
+    def test_tool_in_path(self):
+        tool_path = self.write_tool(os.path.join(self.folder, "bin"), ECHO_TOOL)
+        path = os.environ["PATH"]
+        os.environ["PATH"] = os.path.dirname(tool_path)
+        try:
+            cache_dir = os.path.join(self.folder, "cache")
+            self.assertEqual(converter.resolve_gff_converter(cache_dir, download=False), tool_path)
+            # a tool which does not match the expected checksum is not used
+            self.assertIsNone(converter.resolve_gff_converter(cache_dir, "0" * 64, download=False))
+        finally:
+            os.environ["PATH"] = path
+
+
+@unittest.skipIf(converter is None, "dependencies of gff_to_genepred_converter not installed")
+class GffConverterDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.folder, "cache")
+        self.server = StandInServer({"/gff3ToGenePred": ECHO_TOOL.encode()}).__enter__()
+        self.url = converter.gff_converter_url
+        self.path = os.environ["PATH"]
+        converter.gff_converter_url = self.server.url("/gff3ToGenePred")
+        # no tool in $PATH
+        os.environ["PATH"] = os.path.join(self.folder, "empty")
+
+    def tearDown(self):
+        os.environ["PATH"] = self.path
+        converter.gff_converter_url = self.url
+        self.server.__exit__(None, None, None)
+        shutil.rmtree(self.folder)
+
+    def test_verified_download(self):
+        expected = hashlib.sha256(ECHO_TOOL.encode()).hexdigest()
+        tool_path = converter.resolve_gff_converter(self.cache_dir, expected)
+        self.assertEqual(converter.file_sha256(tool_path), expected)
+        # the cached tool is used by later runs
+        self.assertEqual(converter.resolve_gff_converter(self.cache_dir), tool_path)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_corrupt_download(self):
+        self.server.corrupt.add("/gff3ToGenePred")
+        with self.assertRaises(ValueError):
+            converter.resolve_gff_converter(self.cache_dir, hashlib.sha256(ECHO_TOOL.encode()).hexdigest())
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_unverified_download(self):
+        # without an expected checksum the download is trusted and its checksum is recorded for later runs
+        self.server.corrupt.add("/gff3ToGenePred")
+        tool_path = converter.resolve_gff_converter(self.cache_dir)
+        with open(tool_path + ".sha256", 'r') as checksum_file:
+            self.assertEqual(checksum_file.read().strip(), converter.file_sha256(tool_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+    Tests of the memory-mapped HGNC snapshot: same mapping as parsing the HGNC TSV file, invalidation when the TSV file
+    changes
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import generate_igv_genome
+import hgnc_snapshot
+
+"""
+HGNC TSV file (incl. non-ASCII symbols, genes with alias and previous symbols, ids not in ascending order)
+"""
+HGNC_HEADER = ("hgnc_id\tsymbol\tname\tlocus_group\tlocus_type\tstatus\tlocation\tlocation_sortable\talias_symbol\t"
+               "alias_name\tprev_symbol\tprev_name\n")
+HGNC_ROWS = [
+    "HGNC:5\tA1BG\talpha-1-B glycoprotein\tprotein-coding gene\tgene with protein product\tApproved\t19q13.43\t"
+    "19q13.43\t\t\t\t\n",
+    "HGNC:37133\tA1BG-AS1\tA1BG antisense RNA 1\tnon-coding RNA\tRNA, long non-coding\tApproved\t19q13.43\t19q13.43\t"
+    "FLJ23569\t\t\"NCRNA00181|A1BGAS|A1BG-AS\"\t\"non-protein coding RNA 181\"\n",
+    "HGNC:24086\tA1CF\tAPOBEC1 complementation factor\tprotein-coding gene\tgene with protein product\tApproved\t"
+    "10q11.23\t10q11.23\t\"ACF|ASP|ACF64|ACF65|APOBEC1CF\"\t\t\t\n",
+    "HGNC:7\tA2M\talpha-2-macroglobulin\tprotein-coding gene\tgene with protein product\tApproved\t12p13.31\t"
+    "12p13.31\t\"FWP007|S863-7|CPAMD5\"\t\t\t\n",
+    "HGNC:99999\tTESTé中\ttest gene\tprotein-coding gene\tgene with protein product\tApproved\t1p36\t1p36\t"
+    "\t\t\t\n",
+]
+
+
+class HgncSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.hgnc_path = os.path.join(self.folder, "hgnc_complete_set.tsv")
+        self.write_hgnc_file(HGNC_ROWS)
+        self.n_parsed = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_hgnc_file(self, rows, mtime_ns=None):
+        with open(self.hgnc_path, 'w', encoding="utf8") as hgnc_file:
+            hgnc_file.write(HGNC_HEADER + "".join(rows))
+        if mtime_ns is not None:
+            os.utime(self.hgnc_path, ns=(mtime_ns, mtime_ns))
+
+    def parse(self, hgnc_filepath):
+        self.n_parsed += 1
+        return generate_igv_genome.load_hgnc_file(hgnc_filepath)
+
+    def load(self):
+        return hgnc_snapshot.load_snapshot(self.hgnc_path, self.parse)
+
+    def test_same_mapping_as_tsv(self):
+        parsed = generate_igv_genome.load_hgnc_file(self.hgnc_path)
+        for _ in range(2):
+            # built and loaded from the existing snapshot
+            snapshot = generate_igv_genome.load_hgnc_snapshot(self.hgnc_path)
+            self.assertEqual(dict(snapshot), parsed)
+            self.assertEqual(len(snapshot), len(parsed))
+            self.assertEqual(list(snapshot), sorted(parsed))
+            self.assertNotIn(1, snapshot)
+            self.assertIsNone(snapshot.get(100000))
+            with self.assertRaises(KeyError):
+                snapshot[6]
+            # bytes view used by the gene renaming
+            self.assertEqual(dict(generate_igv_genome.encode_hgnc_mapping(snapshot)),
+                             generate_igv_genome.encode_hgnc_mapping(parsed))
+            # worker processes get the file path only
+            self.assertEqual(dict(pickle.loads(pickle.dumps(snapshot.raw_view()))),
+                             generate_igv_genome.encode_hgnc_mapping(parsed))
+
+    def test_aliases_match_symbols(self):
+        # the name index looks up the aliases by the symbols of the snapshot
+        snapshot = generate_igv_genome.encode_hgnc_mapping(generate_igv_genome.load_hgnc_snapshot(self.hgnc_path))
+        aliases = generate_igv_genome.load_hgnc_aliases(self.hgnc_path)
+        self.assertEqual(aliases, {b"A1BG-AS1": [b"FLJ23569", b"NCRNA00181", b"A1BGAS", b"A1BG-AS"],
+                                   b"A1CF": [b"ACF", b"ASP", b"ACF64", b"ACF65", b"APOBEC1CF"],
+                                   b"A2M": [b"FWP007", b"S863-7", b"CPAMD5"]})
+        self.assertTrue(set(aliases) <= set(snapshot.values()))
+
+    def test_unchanged_source(self):
+        self.load()
+        self.load()
+        self.assertEqual(self.n_parsed, 1)
+
+    def test_changed_size(self):
+        self.load()
+        self.write_hgnc_file(HGNC_ROWS[:2])
+        self.assertEqual(dict(self.load()), {5: "A1BG", 37133: "A1BG-AS1"})
+        self.assertEqual(self.n_parsed, 2)
+
+    def test_changed_content_same_size(self):
+        mtime_ns = os.stat(self.hgnc_path).st_mtime_ns
+        self.load()
+        # same size, content changed (detected by the hash, the modification time differs)
+        self.write_hgnc_file([row.replace("A2M", "B2M") for row in HGNC_ROWS], mtime_ns + 10 ** 9)
+        self.assertEqual(self.load()[7], "B2M")
+        self.assertEqual(self.n_parsed, 2)
+
+    def test_touched_source(self):
+        mtime_ns = os.stat(self.hgnc_path).st_mtime_ns
+        self.load()
+        # same content, only the modification time changed: the snapshot is kept (and its signature updated)
+        os.utime(self.hgnc_path, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+        self.assertEqual(self.load()[7], "A2M")
+        self.assertEqual(hgnc_snapshot.read_header(self.hgnc_path + ".snapshot"),
+                         hgnc_snapshot.source_signature(self.hgnc_path))
+        self.assertEqual(self.n_parsed, 1)
+
+    def test_incompatible_snapshot(self):
+        self.load()
+        with open(self.hgnc_path + ".snapshot", 'r+b') as snapshot_file:
+            snapshot_file.write(b"OLDSNAP!")
+        self.assertIsNone(hgnc_snapshot.read_header(self.hgnc_path + ".snapshot"))
+        self.assertEqual(self.load()[7], "A2M")
+        self.assertEqual(self.n_parsed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+    Tests of the stage instrumentation: repeated runs of the profiled stage
+"""
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+
+import profiling
+
+
+def first_function():
+    return sum(range(1000))
+
+
+def second_function():
+    return sorted(range(1000), reverse=True)
+
+
+class StageProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.report_path = os.path.join(self.folder, "report.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_repeated_stage(self):
+        # every run of the profiled stage (e.g. one per gff3 file) keeps its own profile
+        profiler = profiling.StageProfiler(self.report_path, "sort_gff3")
+        for function in [first_function, second_function]:
+            with profiler.stage("sort_gff3", function.__name__):
+                function()
+        profiler.write_report("test", {})
+        with open(self.report_path, 'r') as report_file:
+            stages = json.load(report_file)["stages"]
+        profile_files = [stage["profile"]["file"] for stage in stages]
+        self.assertEqual(profile_files, [self.report_path + ".sort_gff3.1.prof",
+                                         self.report_path + ".sort_gff3.2.prof"])
+        for profile_file, function in zip(profile_files, [first_function, second_function]):
+            function_names = {function_name for _, _, function_name in pstats.Stats(profile_file).stats}
+            self.assertIn(function.__name__, function_names)
+            self.assertEqual(function_names & {"first_function", "second_function"}, {function.__name__})
+
+
+if __name__ == '__main__':
+    unittest.main()
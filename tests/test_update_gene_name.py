@@ -0,0 +1,143 @@
+"""
+    Tests of the HGNC gene renaming of the gff3 lines: the bytes-level update_gene_name() against the original str based
+    implementation
+"""
+import random
+import unittest
+
+import generate_igv_genome
+
+"""
+HGNC mapping of the test lines (HGNC:7 is not in the mapping)
+"""
+HGNC_MAPPING = {hgnc_id: "GENE" + str(hgnc_id) for hgnc_id in range(1, 7)}
+
+
+def baseline_update_gene_name(line, hgnc_mapping, stats):
+    """
+                original implementation of the gene renaming (str based, from update_gene_file())
+
+    :return:    modified line, None if the line was dropped
+    """
+    annotation_column = line.split('\t')[8]
+    if "[Source:HGNC Symbol%3BAcc:" in annotation_column:
+        kv_list = annotation_column.split(';')
+        idx_name = -1
+        idx_description = -1
+        for idx in range(len(kv_list)):
+            if kv_list[idx].startswith("Name="):
+                idx_name = idx
+            elif kv_list[idx].startswith("description="):
+                idx_description = idx
+        if idx_description > -1:
+            hgnc_id = int(kv_list[idx_description].split('[')[1].split(']')[0].split(':')[-1])
+            if hgnc_id not in hgnc_mapping.keys():
+                stats["unmodified"] += 1
+                return line
+            if idx_name > -1:
+                kv_list[idx_name] = "Name=" + hgnc_mapping[hgnc_id]
+            else:
+                kv_list.append("Name=" + hgnc_mapping[hgnc_id])
+            split_line = line.split('\t')
+            split_line[8] = ";".join(kv_list)
+            stats["modified"] += 1
+            return "\t".join(split_line)
+        return None
+    stats["unmodified"] += 1
+    return line
+
+
+def gff3_line(attributes):
+    return "\t".join(["1", "ensembl_havana", "gene", "65419", "71585", ".", "+", ".", ";".join(attributes)]) + "\n"
+
+
+class UpdateGeneNameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hgnc_symbols = generate_igv_genome.encode_hgnc_mapping(HGNC_MAPPING)
+
+    def assert_baseline(self, line, expected=None):
+        """
+                    checks update_gene_name() against the original implementation (and the expected line if given)
+
+        The original implementation split the attributes incl. the line break: with 'Name' as last attribute or
+        without 'Name' the line break was lost or ended up before the appended name, so these lines are compared
+        without line break.
+        """
+        stats = {"unmodified": 0, "modified": 0}
+        baseline_stats = {"unmodified": 0, "modified": 0}
+        result = generate_igv_genome.update_gene_name(line.encode('utf-8'), self.hgnc_symbols, stats)
+        baseline = baseline_update_gene_name(line.rstrip("\n"), HGNC_MAPPING, baseline_stats)
+        if baseline is None:
+            self.assertIsNone(result)
+        else:
+            self.assertEqual(result, (baseline + "\n").encode('utf-8'))
+        self.assertEqual(stats, baseline_stats)
+        if expected is not None:
+            self.assertEqual(result, expected.encode('utf-8'))
+        return stats
+
+    def test_name_first(self):
+        self.assert_baseline(gff3_line(["Name=OLD", "ID=gene:ENSG00000186092", "biotype=protein_coding",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:3]"]),
+                             gff3_line(["Name=GENE3", "ID=gene:ENSG00000186092", "biotype=protein_coding",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:3]"]))
+
+    def test_name_in_the_middle(self):
+        # attribute order of the Ensembl gff3 files
+        self.assert_baseline(gff3_line(["ID=gene:ENSG00000186092", "Name=OR4F5", "biotype=protein_coding",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:1]",
+                                        "gene_id=ENSG00000186092", "version=7"]),
+                             gff3_line(["ID=gene:ENSG00000186092", "Name=GENE1", "biotype=protein_coding",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:1]",
+                                        "gene_id=ENSG00000186092", "version=7"]))
+
+    def test_name_last(self):
+        self.assert_baseline(gff3_line(["ID=gene:ENSG00000186092",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:2]",
+                                        "Name=OLD"]),
+                             gff3_line(["ID=gene:ENSG00000186092",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:2]",
+                                        "Name=GENE2"]))
+
+    def test_name_missing(self):
+        self.assert_baseline(gff3_line(["ID=gene:ENSG00000186092",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:4]"]),
+                             gff3_line(["ID=gene:ENSG00000186092",
+                                        "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:4]",
+                                        "Name=GENE4"]))
+
+    def test_unknown_hgnc_id(self):
+        line = gff3_line(["ID=gene:ENSG00000186092", "Name=OR4F5",
+                          "description=olfactory receptor [Source:HGNC Symbol%3BAcc:HGNC:7]"])
+        self.assertEqual(self.assert_baseline(line, line), {"unmodified": 1, "modified": 0})
+
+    def test_hgnc_marker_outside_description(self):
+        # the line is dropped (as by the original implementation)
+        self.assert_baseline(gff3_line(["ID=gene:ENSG00000186092", "Name=OR4F5",
+                                        "Note=see [Source:HGNC Symbol%3BAcc:HGNC:1]"]))
+        # (the original implementation failed on a description without HGNC reference)
+        self.assertIsNone(generate_igv_genome.update_gene_name(
+            gff3_line(["ID=gene:ENSG00000186092", "Note=see [Source:HGNC Symbol%3BAcc:HGNC:1]",
+                       "description=olfactory receptor"]).encode('utf-8'), self.hgnc_symbols,
+            {"unmodified": 0, "modified": 0}))
+
+    def test_no_hgnc_reference(self):
+        line = gff3_line(["ID=transcript:ENST00000641515", "Parent=gene:ENSG00000186092", "Name=OR4F5-201"])
+        self.assertEqual(self.assert_baseline(line, line), {"unmodified": 1, "modified": 0})
+
+    def test_random_attribute_order(self):
+        rng = random.Random(9)
+        for idx in range(2000):
+            attributes = ["ID=gene:ENSG%011d" % idx, "biotype=protein_coding", "gene_id=ENSG%011d" % idx]
+            if rng.random() < 0.8:
+                attributes.append("Name=OLD" + str(idx))
+            if rng.random() < 0.8:
+                attributes.append("description=synthetic gene [Source:HGNC Symbol%%3BAcc:HGNC:%d]"
+                                  % rng.randint(1, 8))
+            rng.shuffle(attributes)
+            self.assert_baseline(gff3_line(attributes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+    Transcripts of a gff3 track as bigBed (BED12 with exon blocks and coding region): IGV reads only the records of the
+    visible region from compressed blocks instead of parsing the full gff3 attributes of every feature
+"""
+import array
+
+import bbi_utils
+import locus_index
+
+"""
+file extension of the bigBed file written next to a gff3 track
+"""
+BIGBED_EXTENSION = ".bb"
+
+"""
+field definitions of the records: BED12 (name is the gene symbol) + Ensembl gene and transcript id
+"""
+AUTOSQL = b"""table transcripts
+"Transcripts of a GFF3 gene track"
+    (
+    string chrom;          "Chromosome"
+    uint   chromStart;     "Start position (0-based)"
+    uint   chromEnd;       "End position"
+    string name;           "Gene symbol"
+    uint   score;          "Score (unused)"
+    char[1] strand;        "Strand"
+    uint   thickStart;     "Start of the coding region"
+    uint   thickEnd;       "End of the coding region"
+    uint   reserved;       "Item RGB (unused)"
+    int    blockCount;     "Number of exons"
+    int[blockCount] blockSizes;  "Exon sizes"
+    int[blockCount] chromStarts; "Exon starts relative to chromStart"
+    string geneId;         "Ensembl gene id"
+    string transcriptId;   "Ensembl transcript id"
+    )
+"""
+FIELD_COUNT = 14
+DEFINED_FIELD_COUNT = 12
+
+
+class TranscriptBedBuilder:
+    """
+                collects the transcripts and their exons/CDS while a sorted gff3 file is written (the features of a
+                transcript are linked by their ID/Parent attributes, so their order does not matter)
+    """
+
+    def __init__(self):
+        # gene ID attribute -> (name, gene id)
+        self.genes = {}
+        # chromosome (bytes) -> size (largest end of a transcript)
+        self.chromosomes = {}
+        # transcript ID attribute -> [chromosome, start, end, strand, parent, transcript id]
+        self.transcripts = {}
+        # transcript ID attribute -> array of exon starts and ends (start0, end0, start1, ...)
+        self.exons = {}
+        # transcript ID attribute -> [start, end] of the coding region
+        self.coding_regions = {}
+
+    def add_feature(self, chromosome, start, end, feature_type, fields):
+        """
+                adds a gff3 content line
+
+        :param chromosome:      chromosome (bytes)
+        :param start:           start position (1-based)
+        :param end:             end position (inclusive)
+        :param feature_type:    feature type (bytes)
+        :param fields:          part of the line starting with the score column (bytes)
+        """
+        if feature_type == b"exon":
+            for parent in (locus_index.attribute_value(fields, b"Parent=") or b"").split(b","):
+                exons = self.exons.get(parent)
+                if exons is None:
+                    exons = array.array('I')
+                    self.exons[parent] = exons
+                exons.append(start - 1)
+                exons.append(end)
+        elif feature_type == b"CDS":
+            for parent in (locus_index.attribute_value(fields, b"Parent=") or b"").split(b","):
+                coding_region = self.coding_regions.get(parent)
+                if coding_region is None:
+                    self.coding_regions[parent] = [start - 1, end]
+                else:
+                    coding_region[0] = min(coding_region[0], start - 1)
+                    coding_region[1] = max(coding_region[1], end)
+        elif b"gene_id=" in fields:
+            gene_id = locus_index.attribute_value(fields, b"gene_id=")
+            self.genes[locus_index.attribute_value(fields, b"ID=")] = (
+                locus_index.attribute_value(fields, b"Name=") or gene_id, gene_id)
+        elif b"transcript_id=" in fields:
+            self.transcripts[locus_index.attribute_value(fields, b"ID=")] = [
+                chromosome, start - 1, end, fields.split(b"\t", 2)[1], locus_index.attribute_value(fields, b"Parent="),
+                locus_index.attribute_value(fields, b"transcript_id=")]
+            self.chromosomes[chromosome] = max(self.chromosomes.get(chromosome, 0), end)
+
+    def records(self, chromosome_ids):
+        """
+                creates the BED12 records of the transcripts
+
+        :param chromosome_ids:  dict mapping the chromosomes to their ids
+        :return:                list of tuples (chromosome id, start, end, remaining fields) sorted by chromosome id and
+                                start
+        """
+        records = []
+        for transcript, (chromosome, start, end, strand, parent, transcript_id) in self.transcripts.items():
+            exons = self.exons.get(transcript)
+            if exons:
+                blocks = sorted(zip(exons[::2], exons[1::2]))
+            else:
+                blocks = [(start, end)]
+            thick_start, thick_end = self.coding_regions.get(transcript, (start, start))
+            name, gene_id = self.genes.get(parent, (transcript_id, b""))
+            rest = b"\t".join([name, b"0", strand, str(thick_start).encode(), str(thick_end).encode(), b"0",
+                               str(len(blocks)).encode(),
+                               b",".join(str(block_end - block_start).encode() for block_start, block_end in blocks)
+                               + b",",
+                               b",".join(str(block_start - start).encode() for block_start, _ in blocks) + b",",
+                               gene_id, transcript_id])
+            records.append((chromosome_ids[chromosome], start, end, rest))
+        records.sort(key=lambda record: record[:3])
+        return records
+
+    def write(self, file_path):
+        """
+                writes the bigBed file
+
+        :param file_path:   file path of the bigBed file
+        :return:            number of records
+        """
+        chromosomes = list(self.chromosomes.items())
+        records = self.records({chromosome: chromosome_id for chromosome_id, (chromosome, _) in enumerate(chromosomes)})
+        return bbi_utils.write_bigbed(file_path, chromosomes, records, AUTOSQL, FIELD_COUNT, DEFINED_FIELD_COUNT)